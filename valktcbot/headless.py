@@ -0,0 +1,197 @@
+"""Runs the bot without a display. PySide is never imported in this mode.
+
+Usage: python headless.py USERNAME [--config config.ini] [--record FILE] [--parse-process] [--metrics-port PORT]
+                          [--publish-book NAME | --read-book NAME]
+                          [--sample-profile] [--profile-dir DIR] [--profile-startup]
+The password is read from the ROBLOX_PASSWORD environment variable or prompted for, unless the
+cookies saved by the last run (session.cookies, see [Bot] remember_login) are still valid.
+Send SIGUSR1 to start or stop the sampling profiler while the bot runs."""
+import time
+start_time = time.perf_counter()
+
+from rbxAPI import *
+from rbxAPI.actions import default_account
+from rbxAPI.bus import Snapshot
+from rbxAPI.checkpoint import Checkpointer, restore_state
+from rbxAPI.cookies import save_cookies
+from rbxAPI.config import read_config, apply_trader_config, trader_settings, bot_settings, apply_engine_config, \
+    ConfigWatcher
+from rbxAPI.exchange import ProcessParser
+from rbxAPI.log import setup_logging, levels_from_config
+from rbxAPI.metrics import start_metrics_server, watch_rates, watch_lag
+from rbxAPI.market import MarketRecorder
+from rbxAPI.sampler import profiler, toggle_on_signal
+from rbxAPI.sharedbook import share_book
+from rbxAPI.shutdown import shutdown, SHUTDOWN_DEADLINE
+from rbxAPI.speculate import Speculator
+from rbxAPI.utils import profile_startup, STARTUP_PROFILE_ENV
+
+import argparse
+import getpass
+import os
+import signal
+import sys
+import threading
+
+import_time = time.perf_counter() - start_time
+
+
+class HeadlessBot:
+
+    def __init__(self, config):
+        self.trade_log = TradeLog()
+        self.tix_trader = TixTrader(self.trade_log)
+        self.robux_trader = RobuxTrader(self.trade_log)
+        self.traders = (self.tix_trader, self.robux_trader)
+        for trader in self.traders:
+            apply_trader_config(trader, config)
+        self.threads = []
+        self.trade_log.trade_added.connect(self.on_trade_added)
+        self.trade_log.trade_completed.connect(self.on_trade_completed)
+
+    def on_trade_added(self, trade):
+        print("Trading {} {} @ {:.3f}".format(trade.amount1, abbr[trade.type1], display_rate(trade.current_rate)))
+
+    def on_trade_completed(self, trade):
+        if trade.amount1 != trade.remaining1:
+            print(trade)
+
+    def apply_config(self, config):
+        """Applies a changed config.ini to the running traders"""
+        options = [trader_settings(config, trader.currency) for trader in self.traders] # Raises before any change
+        levels_from_config(config) # So does a bad level
+        apply_engine_config(default_account, config)
+        for trader, settings in zip(self.traders, options):
+            trader.set_configs(settings)
+        setup_logging(config)
+
+    def start(self):
+        print("Starting bot trading")
+        default_account.fetch_warm_page()
+        for trader in self.traders:
+            thread = threading.Thread(target=trader.start, name=trader.currency, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self, deadline=SHUTDOWN_DEADLINE):
+        print("Stopping bot trading")
+        end = time.time() + deadline
+        report = shutdown(self.traders, deadline)
+        print(report)
+        for thread in self.threads:
+            thread.join(max(end - time.time(), 0))
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Valk TC Bot without the GUI")
+    parser.add_argument('username')
+    parser.add_argument('--config', default='config.ini')
+    parser.add_argument('--record', metavar='FILE', help="Append market snapshots to FILE for backtesting")
+    parser.add_argument('--parse-process', action='store_true', help="Parse pages in a worker process")
+    parser.add_argument('--metrics-port', type=int, help="Serve metrics on http://127.0.0.1:PORT/metrics")
+    books = parser.add_mutually_exclusive_group()
+    books.add_argument('--publish-book', metavar='NAME', help="Share the market data this bot parses with "
+                                                             "bots in other processes under NAME")
+    books.add_argument('--read-book', metavar='NAME', help="Use the market data a bot shares under NAME")
+    parser.add_argument('--sample-profile', action='store_true',
+                        help="Run the sampling profiler from the start (SIGUSR1 toggles it)")
+    parser.add_argument('--profile-dir', default='.', help="Where the sampling profiler writes its files")
+    parser.add_argument('--profile-startup', action='store_true', help="Report import times and exit")
+    args = parser.parse_args()
+    if args.profile_startup:
+        return profile_startup(__file__, [args.username, '--config', args.config])
+
+    config = read_config(args.config)
+    try:
+        setup_logging(config)
+    except ValueError as e:
+        setup_logging()
+        print("{}: {}. Using the default logging levels.".format(args.config, e))
+    try:
+        apply_engine_config(default_account, config)
+    except ValueError as e:
+        print("{}: {}".format(args.config, e))
+        return 1
+    bot = HeadlessBot(config)
+    ready_time = time.perf_counter() - start_time
+    if os.environ.get(STARTUP_PROFILE_ENV):
+        print("Startup took {:.3f} seconds ({:.3f} importing)".format(ready_time, import_time))
+        return 0
+    default_account.prewarm() # Build the session while the password is entered
+    settings = bot_settings(config)
+    if args.parse_process or settings['parse_process']:
+        default_account.parser = ProcessParser()
+    if settings['speculate']:
+        default_account.speculator = Speculator()
+    publish_book = args.publish_book or (None if args.read_book else settings['publish_book'])
+    read_book = args.read_book or (None if args.publish_book else settings['read_book'])
+    try:
+        book = share_book(default_account, publish_book, read_book)
+    except OSError as e:
+        print("Could not share the market data: {}".format(e))
+        return 1
+    metrics_port = args.metrics_port or settings['metrics_port']
+    if metrics_port:
+        start_metrics_server(metrics_port)
+        watch_rates(default_account)
+        watch_lag(default_account)
+    remember = settings['remember_login']
+    if remember and resume_login(args.username):
+        print("Resumed the saved session of {}".format(args.username))
+    else:
+        password = os.environ.get('ROBLOX_PASSWORD') or getpass.getpass()
+        try:
+            test_login(args.username, password)
+        except LoginError as e:
+            print(e)
+            return 1
+        if remember:
+            save_cookies(default_account)
+    print("Startup took {:.3f} seconds ({:.3f} importing), excluding login".format(ready_time, import_time))
+
+    stopping = threading.Event()
+    def on_signal(signum, frame):
+        stopping.set()
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+    profiler.directory = args.profile_dir
+    toggle_on_signal()
+    if args.sample_profile:
+        profiler.start()
+
+    if args.record:
+        recorder = MarketRecorder(args.record)
+        recording = default_account.bus.subscribe(recorder.on_snapshot, Snapshot)
+    watcher = ConfigWatcher(bot.apply_config, args.config).start() if settings['watch_config'] else None
+    checkpointer = None
+    if settings['remember_state']:
+        restore_state(default_account)
+        checkpointer = Checkpointer(default_account).start()
+    bot.start()
+    while not stopping.wait(.5):
+        pass
+    if watcher:
+        watcher.stop()
+    report = bot.stop(settings['shutdown_deadline'])
+    if checkpointer:
+        checkpointer.stop()
+    if remember:
+        save_cookies(default_account) # Roblox may have renewed them
+    profiler.stop() # Writes the profile if one is running
+    if default_account.parser:
+        default_account.parser.close()
+    if book:
+        book.close()
+    if args.record:
+        recording.close() # Writes what is still queued
+        recorder.close()
+        print("Recorded {} snapshots to {}".format(recorder.count, args.record))
+        if recording.dropped:
+            print("{} snapshots were dropped since the recorder fell behind".format(recording.dropped))
+    print('Ending bot')
+    return 0 if report.ok else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,28 +1,48 @@
+import time
+start_time = time.perf_counter()
+import sys
+
+if __name__ == '__main__' and '--profile-startup' in sys.argv:
+    from rbxAPI.utils import profile_startup
+    sys.exit(profile_startup(__file__))
+
 from PySide import QtCore, QtGui
 from functools import partial
 from rbxAPI import *
+from rbxAPI.actions import default_account
+from rbxAPI.checkpoint import Checkpointer, restore_state
+from rbxAPI.cookies import save_cookies, saved_username
+from rbxAPI.config import new_config, bot_settings, apply_engine_config, ConfigWatcher
+from rbxAPI.exchange import ProcessParser
+from rbxAPI.log import setup_logging, levels_from_config
+from rbxAPI.metrics import start_metrics_server, watch_rates, watch_lag
+from rbxAPI.sampler import profiler
+from rbxAPI.shutdown import shutdown, SHUTDOWN_DEADLINE
+from rbxAPI.sharedbook import share_book
+from rbxAPI.speculate import Speculator
+from rbxAPI.utils import STARTUP_PROFILE_ENV
 
 import guifiles.mainGui as gui
 
 import configparser
-import logging
-import sys
-import time
-
-logging.basicConfig(
-    level=logging.DEBUG, format="%(asctime)s -%(levelname)s %(funcName)s %(message)s  %(module)s: <Line %(lineno)s>"
-)
-# For Debugging:
-# logging.disable(logging.CRITICAL)
+import os
+import threading
 
 
 class MainDialog(QtGui.QMainWindow, gui.Ui_MainWindow):
 
+    session_resumed = QtCore.Signal(str)
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setupUi(self)
 
         self.started = False
+        self.shutdown_deadline = SHUTDOWN_DEADLINE # Seconds to stop the traders and cancel their bids
+        self.remember_login = True # Save the session cookies to skip the login next time
+        self.remember_state = True # Checkpoint the rates and trades to carry on after a restart
+        self.checkpointer = None
+        self.shared_book = None # SharedBookWriter or SharedBookReader of [Bot] publish_book or read_book
     # Traders
         self.trade_log = TradeLog()
         self.tix_trader = TixTrader(self.trade_log)
@@ -33,6 +53,7 @@ class MainDialog(QtGui.QMainWindow, gui.Ui_MainWindow):
         self.usernameField.returnPressed.connect(self.login_pressed)
         self.passwordField.returnPressed.connect(self.login_pressed)
         self.loginButton.clicked.connect(self.login_pressed)
+        self.session_resumed.connect(self.on_session_resumed)
     # Options
         # Check box
         self.tixSplitTrades.stateChanged.connect(partial(self.split_pressed, self.tix_trader))
@@ -52,6 +73,9 @@ class MainDialog(QtGui.QMainWindow, gui.Ui_MainWindow):
         self.initialize_config()
         # Start
         self.startButton.clicked.connect(self.start_pressed)
+        # Sampling profiler
+        self.profile_shortcut = QtGui.QShortcut(QtGui.QKeySequence('Ctrl+Shift+P'), self)
+        self.profile_shortcut.activated.connect(self.profile_pressed)
     # Trade Log
         self.last_tix_traded = self.last_robux_traded = 0
         self.trade_log.trade_added.connect(self.on_trade_added)
@@ -59,7 +83,7 @@ class MainDialog(QtGui.QMainWindow, gui.Ui_MainWindow):
         print("Starting bot")
 
     def initialize_config(self):
-        config = configparser.ConfigParser()
+        config = new_config()
         try:
             with open('config.ini', 'r+'):
                 config.read('config.ini')
@@ -86,7 +110,7 @@ class MainDialog(QtGui.QMainWindow, gui.Ui_MainWindow):
                 self.threshold_rate_changed(self.robux_trader, float(robux_settings['threshold_rate']))
 
     def save_config(self):
-        config = configparser.ConfigParser()
+        config = new_config()
         with open('config.ini', 'a+'): # Creates the file if it does not exist
             try:
                 config.read('config.ini')
@@ -119,13 +143,13 @@ class MainDialog(QtGui.QMainWindow, gui.Ui_MainWindow):
 
     def on_trade_added(self, trade):
         target = self.currentTradeTable
-        tup = (trade.amount1, abbr[trade.type1], round_down(trade.current_rate))
+        tup = (trade.amount1, abbr[trade.type1], display_rate(trade.current_rate))
         text = "{} {} @ {:.3f}".format(*tup)
         trade.row = self.add_trade_gui(text, target)
         trade.trade_updated.connect(self.on_trade_updated)
 
     def on_trade_updated(self, trade):
-        tup = (trade.remaining1, abbr[trade.type1], round_down(trade.current_rate))
+        tup = (trade.remaining1, abbr[trade.type1], display_rate(trade.current_rate))
         text = "{} {} @ {:.3f}".format(*tup)
         row = trade.row
         if row:
@@ -154,10 +178,10 @@ class MainDialog(QtGui.QMainWindow, gui.Ui_MainWindow):
             print(trade)
             if all_traded:  # Trade is fully completed
                 tup = (amount_traded, abbr[trade.type1],
-                       round_down(trade.start_rate), trade.amount2, abbr[trade.type2])
+                       display_rate(trade.start_rate), trade.amount2, abbr[trade.type2])
                 text = "{} {} @ {:.3f} for {} {} ".format(*tup)
             else:
-                tup = (amount_traded, abbr[trade.type1], round_down(trade.start_rate))
+                tup = (amount_traded, abbr[trade.type1], display_rate(trade.start_rate))
                 text = "{} {} @ {:.3f} (Semi-complete)".format(*tup)
             trade.row = self.add_trade_gui(text, target)
 
@@ -191,6 +215,33 @@ class MainDialog(QtGui.QMainWindow, gui.Ui_MainWindow):
         except LoginError as e:
             self.errorMessage.show()
             self.passwordField.clear()
+        else:
+            if self.remember_login:
+                save_cookies(default_account)
+            self.logged_in()
+
+    def logged_in(self):
+        """Picks up the rates and trades of the last run, before the traders start"""
+        if self.remember_state and self.checkpointer is None:
+            restore_state(default_account)
+            self.checkpointer = Checkpointer(default_account).start()
+
+    def try_resume_session(self):
+        """Skips the login screen, from a background thread, if the saved cookies are still valid"""
+        username = saved_username()
+        if not username:
+            return
+        def resume():
+            if resume_login(username):
+                self.session_resumed.emit(username)
+        threading.Thread(target=resume, name='resume_login', daemon=True).start()
+
+    def on_session_resumed(self, username):
+        if self.stackedWidget.currentIndex() == 0:
+            print("Resumed the saved session of {}".format(username))
+            self.usernameField.setText(username)
+            self.stackedWidget.setCurrentIndex(1)
+            self.logged_in()
 
     def split_pressed(self, trader, state):
         # State:0 if unchecked, 2 is checked
@@ -212,7 +263,7 @@ class MainDialog(QtGui.QMainWindow, gui.Ui_MainWindow):
         trader.set_config('early_cancel', state == 2)
 
     def threshold_rate_changed(self, trader, rate):
-        trader.set_config('threshold_rate', rate)
+        trader.set_config('threshold_rate', to_units(rate))
 
     def assign_thread(self, obj):
         thread = QtCore.QThread()
@@ -223,19 +274,24 @@ class MainDialog(QtGui.QMainWindow, gui.Ui_MainWindow):
     def start_bots(self):
         print("Starting bot trading")
         self.clear_gui_log()
+        default_account.fetch_warm_page() # Now, so the traders' first refreshes get a fresh page
         self.tix_thread.start()
         self.robux_thread.start()
 
-    def stop_thread(self, thread):
+    def stop_thread(self, thread, timeout):
         thread.quit()
-        thread.wait()
+        if not thread.wait(max(int(timeout*1000), 0)):
+            print("A trader thread did not stop in time")
 
     def stop_bots(self):
         print("Stopping bot trading")
-        self.tix_trader.stop()
-        self.robux_trader.stop()
-        self.stop_thread(self.tix_thread)
-        self.stop_thread(self.robux_thread)
+        end = time.time() + self.shutdown_deadline
+        report = shutdown([self.tix_trader, self.robux_trader], self.shutdown_deadline)
+        print(report)
+        self.stop_thread(self.tix_thread, end - time.time())
+        self.stop_thread(self.robux_thread, end - time.time())
+        if not report.ok:
+            self.statusbar.showMessage(str(report).splitlines()[-1])
 
     def start_pressed(self):
         # Cancel trades on end
@@ -251,17 +307,79 @@ class MainDialog(QtGui.QMainWindow, gui.Ui_MainWindow):
             button.setText('Stop')
             self.start_bots()
 
+    def profile_pressed(self):
+        path = profiler.toggle()
+        self.statusbar.showMessage("Profile written to {}".format(path) if path else "Profiling...")
+
     def closeEvent(self, event):
         """Builtin method executed when GUI is closed."""
         if self.started:
             self.stop_bots()
+        if self.checkpointer:
+            self.checkpointer.stop()
         self.save_config()
+        if self.remember_login and default_account.username:
+            save_cookies(default_account) # Roblox may have renewed them
+        profiler.stop()
+        if default_account.parser:
+            default_account.parser.close()
+        if self.shared_book:
+            self.shared_book.close()
         print('Ending bot')
 
 
+def apply_watched_config(config):
+    """Applies a changed config.ini's engine settings and logging levels"""
+    levels_from_config(config) # Raises for a bad level before any change, as apply_engine_config does
+    apply_engine_config(default_account, config)
+    setup_logging(config)
+
+
 if __name__ == '__main__':
+    if getattr(sys, 'frozen', False): # Lets a ProcessParser start workers from the frozen executable
+        import multiprocessing
+        multiprocessing.freeze_support()
+    config = new_config()
+    try:
+        config.read('config.ini')
+    except configparser.Error:
+        pass # initialize_config rewrites a broken file
+    try:
+        setup_logging(config)
+    except ValueError as e:
+        setup_logging()
+        print("config.ini: {}. Using the default logging levels.".format(e))
     QtGui.QApplication.setDesktopSettingsAware(False)
     app = QtGui.QApplication(sys.argv)
     form = MainDialog()
     form.show()
+    app.processEvents() # Draw the login window before reporting
+    print("Startup took {:.3f} seconds".format(time.perf_counter() - start_time))
+    if os.environ.get(STARTUP_PROFILE_ENV):
+        sys.exit(0)
+    default_account.prewarm() # Build the session while the user types their login
+    settings = bot_settings(config)
+    form.shutdown_deadline = settings['shutdown_deadline']
+    form.remember_login = settings['remember_login']
+    form.remember_state = settings['remember_state']
+    if settings['parse_process']:
+        default_account.parser = ProcessParser()
+    if settings['speculate']:
+        default_account.speculator = Speculator()
+    try:
+        form.shared_book = share_book(default_account, settings['publish_book'], settings['read_book'])
+    except OSError as e:
+        print("Could not share the market data: {}".format(e))
+    if settings['metrics_port']:
+        start_metrics_server(settings['metrics_port'])
+        watch_rates(default_account)
+        watch_lag(default_account)
+    try:
+        apply_engine_config(default_account, config)
+    except ValueError as e:
+        print("config.ini: {}. Using the default engine settings.".format(e))
+    if settings['watch_config']: # Engine settings and logging only; the trader options belong to the GUI's widgets
+        ConfigWatcher(apply_watched_config).start()
+    if form.remember_login:
+        form.try_resume_session()
     sys.exit(app.exec_())
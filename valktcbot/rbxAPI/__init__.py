@@ -2,5 +2,19 @@ from .errors import *
 
 from .trade_log import Trade, TradeLog, abbr
 
-from .actions import test_login, Trader, TixTrader, RobuxTrader, round_down, round_up
+from .actions import test_login, resume_login, Trader, TixTrader, RobuxTrader
 
+from .utils import round_down, round_up
+
+from .units import RATE_SCALE, display_rate, parse_rate, to_float, to_units
+
+from .account import Account
+
+from .market import MarketFeed, MarketSnapshot, parse_market
+
+from .kernel import TraderState, decide
+
+from .pool import TraderPool
+
+
+from .bus import EventBus
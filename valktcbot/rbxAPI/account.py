@@ -0,0 +1,224 @@
+"""Per-account state so several accounts can trade from one process"""
+from collections import deque
+from easydict import EasyDict as DottedDict
+from .retry import PolicySession
+from .bus import EventBus, Snapshot, TopOfBook
+from .clock import real_clock
+from .exchange import LiveExchange, load_parser
+from .lag import LagEstimator
+from .market import FEED_MAX_AGE
+from .params import DEQUE_SIZE, default_params
+from .rbx_data import TC_URL
+from .utils import find_data_file
+
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = 15 # Max number of concurrent requests per account session
+WARM_CONNECTIONS = 4 # Connections opened at login, enough for a refresh, submit and cancel at once
+WARM_TIMEOUT = 5 # Seconds each warm up request may take
+
+# Initializing requests.Session for frozen application
+os.environ["REQUESTS_CA_BUNDLE"] = find_data_file('cacert.pem')
+
+
+def make_session(max_workers=MAX_WORKERS):
+    # Imported here since requests is by far the slowest import of the bot
+    from requests_futures.sessions import FuturesSession
+    import requests
+
+    session = FuturesSession(max_workers=max_workers)
+    # Retries are done by PolicySession, which knows each request's deadline
+    adapter = requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=max_workers, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def make_rates(deque_size=DEQUE_SIZE):
+    """Rate memory shared by the tix and robux trader of one account"""
+    return DottedDict(
+        dict(
+            last_tix_rate = 0,
+            last_robux_rate = 0,
+            current_tix_rate = 0,
+            current_robux_rate = 0,
+            past_tix_rates = deque(maxlen=deque_size),
+            past_robux_rates = deque(maxlen=deque_size),
+        )
+    )
+
+
+class Account:
+
+    """Holds everything one logged in account trades with: its session, its rates and its trader pair.
+       Traders register themselves here when they are created with this account.
+       The session is only built when first used, or in the background by prewarm()."""
+
+    def __init__(self, username=None, max_workers=MAX_WORKERS, clock=None, exchange=None, params=None, bus=None):
+        self.username = username
+        self.params = params or default_params # TraderParams for traders created without their own
+        self.clock = clock or real_clock
+        self.max_workers = max_workers
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._http = None
+        self.request_settings = None # (policies, failure_threshold, cooldown) given to set_request_policies
+        self.rates = make_rates(self.params.deque_size)
+        self.traders = {}
+        self.feed = None # MarketFeed shared with other accounts, if any
+        self.exchange = exchange or LiveExchange(self) # Where traders get snapshots from and send trades to
+        self.parser = None # ProcessParser for the pages of this account, or None to parse on the trader's thread
+        self.warm_snapshots = {} # Currency -> (market, panel) kept for that trader's first refresh, used once
+        self.warm_fetch = None # Thread fetching the page for the traders' first refreshes, see fetch_warm_page
+        self.bus = bus or EventBus() # Where the traders publish market data and what they do
+        self.speculator = None # Speculator that balances the traders' likely next orders while they refresh
+        self.lag = LagEstimator() # How long Roblox takes to show our submits and cancels, shared by both traders
+        self.tops = {} # Column -> top (amount, rate) of the last snapshot published, for TopOfBook
+        self._tops_lock = threading.Lock()
+
+    def __repr__(self):
+        return "Account({!r})".format(self.username)
+
+    def set_params(self, params):
+        """Gives params to this account's traders from their next tick on, and to traders created later"""
+        self.params = params
+        for trader in self.traders.values():
+            trader.set_params(params)
+
+    def resize_rates(self, deque_size):
+        """Keeps deque_size past rates of each currency from now on"""
+        rates = self.rates
+        for name in ('past_tix_rates', 'past_robux_rates'):
+            if rates[name].maxlen != deque_size:
+                rates[name] = deque(rates[name], maxlen=deque_size)
+
+    def set_max_workers(self, max_workers):
+        """Changes how many requests may run at once. Requests already queued still run."""
+        if max_workers == self.max_workers:
+            return
+        self.max_workers = max_workers
+        with self._session_lock:
+            session = self._session
+            if session is not None:
+                from concurrent.futures import ThreadPoolExecutor
+                old, session.executor = session.executor, ThreadPoolExecutor(max_workers=max_workers)
+                old.shutdown(wait=False)
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = make_session(self.max_workers)
+        return self._session
+
+    @session.setter
+    def session(self, session):
+        self._session = session
+        self._http = None
+
+    @property
+    def http(self):
+        """The session wrapped in the request policies, retries and circuit breaker of rbxAPI.retry"""
+        if self._http is None:
+            session = self.session
+            with self._session_lock:
+                if self._http is None:
+                    http = PolicySession(session, clock=self.clock)
+                    if self.request_settings:
+                        http.set_policies(*self.request_settings)
+                    self._http = http
+        return self._http
+
+    def set_request_policies(self, policies, failure_threshold=None, cooldown=None):
+        """Request policies for requests started from now on. Does not build the session."""
+        with self._session_lock:
+            self.request_settings = (policies, failure_threshold, cooldown)
+            if self._http is not None:
+                self._http.set_policies(policies, failure_threshold, cooldown)
+
+    def prewarm(self):
+        """Builds the session and loads the page parser on a background thread"""
+        def warm():
+            load_parser()
+            self.http
+        thread = threading.Thread(target=warm, name='prewarm', daemon=True)
+        thread.start()
+        return thread
+
+    def warm_up(self, connections=WARM_CONNECTIONS):
+        """After login, opens connections to the trade currency page on a background thread, so the
+           first tick does not pay for DNS, TCP and TLS. The page itself is fetched by fetch_warm_page."""
+        def warm():
+            start = time.perf_counter()
+            try:
+                session = self.session
+                # At once, so each request takes its own connection and leaves it open in the pool
+                heads = [session.head(TC_URL, timeout=WARM_TIMEOUT) for _ in range(connections)]
+                for head in heads:
+                    head.result()
+            except Exception as e: # Only a head start; the first tick fetches as usual
+                logger.warning("Warming up %s failed: %s", self, e)
+                return
+            logger.info("Warmed up %s connections in %.3f seconds", connections, time.perf_counter() - start)
+        thread = threading.Thread(target=warm, name='warm_up', daemon=True)
+        thread.start()
+        return thread
+
+    def fetch_warm_page(self):
+        """Fetches the page on a background thread as the traders start, so both of their first refreshes
+           use this one fetch. take_warm_snapshot waits for it."""
+        def fetch():
+            try:
+                self.keep_snapshot(*self.exchange.fetch())
+            except Exception as e: # The traders fetch their own
+                logger.warning("Fetching the first page of %s failed: %s", self, e)
+            finally:
+                self.warm_fetch = None
+        thread = self.warm_fetch = threading.Thread(target=fetch, name='warm_page', daemon=True)
+        thread.start()
+        return thread
+
+    def keep_snapshot(self, market, panel):
+        """Lets each trader's first refresh use this (market, panel) while it is fresh"""
+        self.warm_snapshots = {currency: (market, panel) for currency in ('Tickets', 'Robux')}
+
+    def take_warm_snapshot(self, currency, max_age=FEED_MAX_AGE):
+        """The (market, panel) kept for currency's trader, once, if its page was requested at most max_age
+           seconds ago, else None. Waits for a fetch_warm_page still running."""
+        fetching = self.warm_fetch
+        if fetching is not None:
+            fetching.join(WARM_TIMEOUT)
+        snapshot = self.warm_snapshots.pop(currency, None)
+        if snapshot and self.clock.time() - snapshot[0].time <= max_age:
+            return snapshot
+        return None
+
+    def publish_snapshot(self, currency, market, panel):
+        """Publishes the snapshot currency's trader refreshed to, and the columns whose top it changed"""
+        bus = self.bus
+        now = self.clock.time()
+        if bus.wants(Snapshot):
+            bus.publish(Snapshot(currency, now, market, panel))
+        if bus.wants(TopOfBook):
+            with self._tops_lock: # Both traders refresh, so their changes are taken one at a time
+                for column in ('Tickets', 'Robux'):
+                    entries = market.column(column)
+                    top = entries[0] if entries else None # None also for a market trader on top
+                    previous = self.tops.get(column)
+                    if top != previous:
+                        self.tops[column] = top
+                        bus.publish(TopOfBook(column, now, top, previous))
+
+    @property
+    def tix_trader(self):
+        return self.traders.get('Tickets')
+
+    @property
+    def robux_trader(self):
+        return self.traders.get('Robux')
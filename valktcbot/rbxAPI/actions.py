@@ -1,73 +1,60 @@
-from PySide import QtCore
-from lxml import html
-from requests.packages.urllib3.util import Retry
-from requests_futures.sessions import FuturesSession
 from functools import wraps
-from collections import deque
-from easydict import EasyDict as DottedDict
-from .rbx_data import data, LOGIN_URL, TC_URL
+from .rbx_data import LOGIN_URL
 from .errors import *
 from .trade_log import Trade
-from .utils import round_down, round_up, to_num, find_data_file, profile
-
-import time
+from .events import QObject
+from .account import Account
+from .cookies import COOKIE_FILE, load_cookies, forget_cookies
+from .bus import OrderSubmitted, CancelSent, TraderError
+from .fills import FillTracker, PartialFill, FullFill, RejectedBid, GhostBid
+from .kernel import TraderState, Hold, Replace, Complete, Cancel, CancelOthers, decide
+from .metrics import TICK_SECONDS, DECISIONS, TICK_ERRORS
+from .shutdown import shutdown, SHUTDOWN_DEADLINE
+from .speculate import OrderCache
+from .units import display_rate, floor_step
+from .utils import LazyModule, profile
+
+import datetime
 import logging
-import math
-import requests
-import os
-import sys
-
-
-logging.basicConfig(
-    level=logging.ERROR, format="%(asctime)s -%(levelname)s %(funcName)s %(message)s  %(module)s: <Line %(lineno)s>"
-)
-# Enable For Debugging:
-logging.disable(logging.INFO)
-
-DELAY = .05  # Second delay between calculating trades.
-RGAP = .005 # Max gap before cancelling a robux split trade
-TGAP = .0025 # Max gap before cancelling a tix split trade
-TRADE_LAG_TIME = 1.25 # Estimate of how long it takes for Roblox to process our requests
-RESET_TIME = 240 # Number of seconds the bot goes without trading before resetting last rates to be able to trade again (might result in loss)
-DEQUE_SIZE = 15 # Max number of past trade rates to keep track of to money prevent loss
-NUM_TRADES = 19 # Number of trades that display on the trade currency page
-# Initializing requests.Session for frozen application
-os.environ["REQUESTS_CA_BUNDLE"] = find_data_file('cacert.pem')
-session = FuturesSession(max_workers=15)
-adapter = requests.adapters.HTTPAdapter(max_retries=Retry(total=20,connect=10,read=10,backoff_factor=.5))
-session.mount("http://", adapter)
-session.mount("https://", adapter)
-# Storing variables since they can't be stored in QObject
-rates = DottedDict(
-    dict(
-        last_tix_rate = 0,
-        last_robux_rate = 0,
-        current_tix_rate = 0,
-        current_robux_rate = 0,
-        past_tix_rates = deque(maxlen=DEQUE_SIZE),
-        past_robux_rates = deque(maxlen=DEQUE_SIZE),
-    )
-)
-
-class Trader(QtCore.QObject):
-
-
-    def __init__(self, currency):
-        QtCore.QObject.__init__(self)
+import threading
+import time
+
+requests = LazyModule('requests')
+logger = logging.getLogger(__name__)
+
+RESULT_WAIT = 2 # Trade lag times after a submit before a trade whose bid is gone is completed without a result
+
+# Account used when a trader is created without one (the GUI trades a single account)
+default_account = Account()
+rates = default_account.rates
+
+class Trader(QObject):
+
+    holds_top_trade = False
+
+    def __init__(self, currency, account=None, params=None):
+        QObject.__init__(self)
         self.started = False
         self.currency = currency
+        self.account = account or default_account
+        self.account.traders[currency] = self
+        self.params = params or self.account.params # TraderParams with the strategy's constants
+        self.next_params = None # Set by set_params, swapped in at the start of the next tick
+        self.next_config = None # Set by set_configs, swapped in at the start of the next tick
+        self.saved_trade = None # Current trade from a checkpoint, checked against the first refresh
+        self.fills = FillTracker(currency, self.account.lag) # Turns each refresh's open bids into fill events and lags
+        self.unapplied_fill = False # Whether the current trade's bid filled some since the trade was last updated
+        self.bid_result = None # FullFill or RejectedBid that ended the current trade's bid
+        self.orders = OrderCache(currency) # Balanced amounts for the kernel, some worked out during refreshes
+        self.idle = threading.Event() # Clear while a tick runs
+        self.idle.set()
+        self.tick_seconds = TICK_SECONDS.labels(currency)
         self._current_trade = None
-        self.last_tree = None
-        self.last_trade_start_time = time.time() # Time when last trade was submitted
-        self.last_traded_time = time.time() # Time when some currency actually went through
+        self.market = None # MarketSnapshot of the last refresh
+        self.panel = None # AccountSnapshot of the last refresh
+        self.last_trade_start_time = self.clock.time() # Time when last trade was submitted
+        self.last_traded_time = self.clock.time() # Time when some currency actually went through
         self.rate_updated = False
-        self.trade_payload = {
-            data['give_type']: self.currency,
-            data['receive_type']: self.other_currency,
-            data['limit_order']: 'LimitOrderRadioButton',
-            data['split_trades']: '',
-            '__EVENTTARGET': data['submit_trade_button'],
-        }
         self.config = {
             'split_trades': '',
             'trade_all': False,
@@ -76,6 +63,31 @@ class Trader(QtCore.QObject):
             'threshold_rate': 0
         }
 
+    @property
+    def session(self):
+        return self.account.session
+
+    @property
+    def http(self):
+        return self.account.http
+
+    @property
+    def exchange(self):
+        return self.account.exchange
+
+    @property
+    def clock(self):
+        return self.account.clock
+
+    @property
+    def rates(self):
+        return self.account.rates
+
+    @property
+    def other_trader(self):
+        """The trader of the other currency on the same account"""
+        return self.account.traders[self.other_currency]
+
     @property
     def current_trade(self):
         return self._current_trade
@@ -84,8 +96,10 @@ class Trader(QtCore.QObject):
     def current_trade(self, value):
         old_trade = self._current_trade
         self._current_trade = value
-        if self.my_trader.holds_top_trade:
-            self.my_trader.holds_top_trade = False
+        self.unapplied_fill = False
+        self.bid_result = None
+        if self.holds_top_trade:
+            self.holds_top_trade = False
         if old_trade:
             self.trade_log.complete_trade(old_trade)
         if self.rate_updated:
@@ -94,77 +108,91 @@ class Trader(QtCore.QObject):
     def set_config(self, option, value):
         self.config[option] = value
 
+    def set_configs(self, options):
+        """Uses the trader options in options, all at once, from the next tick on. Safe to call from any thread."""
+        self.next_config = options
+
+    def swap_config(self):
+        options, self.next_config = self.next_config, None
+        if options is not None:
+            self.config = dict(self.config, **options) # One assignment, so a tick reads all old or all new options
+
+    def set_params(self, params):
+        """Uses params from the next tick on. Safe to call from any thread."""
+        self.next_params = params
+
+    def swap_params(self):
+        params, self.next_params = self.next_params, None
+        if params is None:
+            return
+        if params.deque_size != self.params.deque_size:
+            self.account.resize_rates(params.deque_size)
+        self.params = params
+
     def refresh(self):
-        r = session.get(TC_URL).result()
-        self.last_tree = html.fromstring(r.text)
-
-    def get_raw_data(self, d, unpack=True):
-        tree = self.last_tree
-        data = tree.xpath(d)
-        if len(data) == 1 and unpack:
-            return data[0]
-        return data
-
-    def get_auth_tools(self):
-        # VIEWSTATE and EVENTVALIDATION must be from the same session
-        vsd = self.get_raw_data(data['VIEWSTATE'])
-        evd = self.get_raw_data(data['EVENTVALIDATION'])
-        if vsd == [] or evd == []:
-            raise requests.exceptions.ConnectionError
-        viewstate = vsd.attrib['value']
-        eventvalidation = evd.attrib['value']
-        return viewstate, eventvalidation
-
-    def get_tolerance(self, amount):
-        """A magical method that determines the minimum % (in decimal) to trade"""
-        if amount//10 == 0:
-            return .9
-        return min(.9 + .015*math.floor(math.log(amount//10, 10)), .975)
+        speculator = self.account.speculator
+        if speculator and self.market is not None: # Balance the likely next orders while we wait for the page
+            speculator.speculate(self.orders, self.state(), self.market, self.panel)
+        account = self.account
+        snapshot = (account.warm_snapshots or account.warm_fetch) and account.take_warm_snapshot(self.currency)
+        self.market, self.panel = snapshot or self.exchange.fetch()
+        self.account.publish_snapshot(self.currency, self.market, self.panel)
+        for event in self.fills.observe(self.panel.open_bids[self.currency], self.panel.balances[self.currency],
+                                        self.clock.time(), self.trade_lag_time):
+            self.trade_log.record_fill(event)
+            self.account.bus.publish(event)
+            self.on_fill(event)
+
+    def on_fill(self, event):
+        """Notes a fill event of the current trade's bid for update_current_trade and fully_complete_trade"""
+        if not self.current_trade:
+            return
+        if isinstance(event, PartialFill):
+            self.unapplied_fill = True
+        elif isinstance(event, (FullFill, RejectedBid)):
+            self.bid_result = event
+        elif isinstance(event, GhostBid): # The bid taken as filled was a duplicate, and ours is still open
+            self.bid_result = None
+
+    @property
+    def trade_lag_time(self):
+        """Seconds Roblox takes to show our requests, as measured by the account (see lag.py)"""
+        return self.account.lag.estimate(self.params.lag_quantile, self.params.trade_lag_time)
 
     def get_spread(self):
-        spread = self.get_raw_data(data['spread'])
-        return float(spread)
+        return self.market.spread
 
     def get_trade_remainder(self, index=1):
         """Gets remainder of our trade at index (Starting at index = 1)"""
-        rem_str = self.get_raw_data(data[self.currency]['trade_remainder'](index))
-        if rem_str:
-            return to_num(rem_str)
-        return 0
+        return self.panel.remainder(self.currency, index)
 
     def get_currency(self):
-        currency = self.get_raw_data(data[self.currency]['current'])
-        amount = to_num(currency)
-        return amount
+        return self.panel.balances[self.currency]
 
     def get_rates(self):
-        rates = self.get_raw_data(data['rates'])
-        tix_rates, robux_rates = rates.split('/')
-        return float(tix_rates), float(robux_rates)
-
-    def get_currency_rate(self, currency=None):
-        """Rate from currency to the other currency"""
-        if currency is None:
-            currency = self.currency
-        if currency == 'Tickets':
-            return self.get_rates()[0]
-        return self.get_rates()[1]
+        return self.market.tix_rate, self.market.robux_rate
 
-    def get_other_rate(self):
-        return self.get_currency_rate(self.other_currency)
+    def state(self):
+        """TraderState for the kernel's decisions"""
+        return TraderState(self.currency, self.rates, self.config, self.params, self.current_trade,
+                           self.holds_top_trade, self.other_trader.holds_top_trade, self.clock.time(),
+                           self.last_trade_start_time, self.trade_lag_time, self.orders)
 
-    def get_other_next_rate(self):
-        """Returns the rate of the second top trade in the category of the other currency"""
-        return self.other_trader.get_available_trade_info(self, 2)[1]
+    def has_remainder(self, amount):
+        """Whether amount, read as our bid's remainder, means we have a bid to track"""
+        return bool(amount)
 
     def get_trade_count(self):
-        trades = list(self.get_raw_data(data[self.currency]['open_trades'], False))
-        return len(trades)
+        return len(self.panel.open_bids[self.currency])
 
     def get_trade_info(self, index):
-        """Gets the trade info starting from the top (index = 0)"""
+        """Gets the trade info starting from the top (index = 1)"""
         return self.get_available_trade_info(index)
 
+    def get_available_trade_info(self, i):
+        """Gets the amount and rate of the ith trade in the available column of our currency"""
+        return self.market.trade_info(self.currency, i)
+
     # All lambda data functions starts at index 1
     def get_ith_trade_amount(self, index):
         return self.get_trade_info(index)[0]
@@ -172,51 +200,9 @@ class Trader(QtCore.QObject):
     def get_ith_trade_rate(self, index):
         return self.get_trade_info(index)[1]
 
-    def get_ith_trade_path(self, index, currency=None):
-        if not currency:
-            currency = self.currency
-        return data[currency]['trade_info_path'](index)
-
-    def get_ith_cancel_bid(self, index):
-        return data[self.currency]['cancel_bid'](index)
-
-    def get_amount_to_trade(self):
-        our_money = self.get_currency()
-        if self.config['trade_all']:
-            if self.check_trades():
-                remainder = self.get_trade_remainder()
-                amount = our_money + remainder
-            else:
-                amount = our_money
-        else:
-            amount = self.config['amount']
-            if not amount or amount > our_money + self.get_trade_remainder():
-                raise NoMoneyError(self.currency)
-        return amount
-
-    def get_threshold_rate(self):
-        """Gets the worst possible rate to trade at, so we don't go beyond it"""
-        spread = self.get_spread()
-        other_top_rate, other_second_top_rate = self.get_other_rate(), self.get_other_next_rate()
-        if self.my_trader.holds_top_trade:
-            other_threshold_rate = other_top_rate
-        elif spread >= 0:
-            other_threshold_rate = other_top_rate
-        else:
-            if self.other_trader.holds_top_trade:
-                # The spread is forcibly negative due to your split trade
-                # In this case, get the second highest trade rate of the other currency.
-                other_threshold_rate = other_second_top_rate
-            else:
-                if self.current_trade: # A better rate exists on our currency and goes below spread
-                    other_threshold_rate = other_top_rate # Use the top rate on the other currency, since our trade may be the 2nd best
-                else: # No trades exist and spread is negative. Match the second best trade in this category.
-                    other_threshold_rate = other_second_top_rate
-        return other_threshold_rate
-
     def check_trades(self):
         """Returns True if a trade is still active"""
-        return self.get_raw_data(data[self.currency]['trades']) == []
+        return self.panel.active[self.currency]
 
     def check_bot_stopped(func):
         """Decorator that checks if bot has been stopped by user"""
@@ -227,75 +213,41 @@ class Trader(QtCore.QObject):
             return func(inst, *args, **kwargs)
         return raise_if_stopped
 
-    @check_bot_stopped
-    def calculate_trade(self, amount):
-        """Determines which trade rate to match and returns the amount to trade and the amount to receive.
-           If none of the trade rates currently displayed are better than the threshold rate setting, we trade at the
-           threshold rate instead."""
-        spread = self.get_spread()
-        this_top_rate = self.get_ith_trade_rate(1)
-        other_threshold_rate = self.get_threshold_rate()
-        our_amount = self.get_trade_remainder()
-        if spread > 10000 or spread < -10000:
-            raise BadSpreadError
-        if this_top_rate <= 10:
-            raise LowRateError
-
-        for i in range(1, NUM_TRADES + 1):
-            try:
-                cur_amount, cur_rate = self.get_trade_info(i)
-                if self.current_trade and not self.holds_top_trade:
-                    if (
-                        our_amount == cur_amount and 
-                        round_down(self.current_trade.current_rate == cur_rate) or
-                        our_amount == 0
-                        ):
-                        raise OurTradeError
-                    elif (round_down(self.current_trade.current_rate == cur_rate) and our_amount != cur_amount):
-                        cur_rate = self.get_better_rate(cur_rate)
-                self.test_rate(cur_rate, this_top_rate, other_threshold_rate)
-                return self.balance_rate(amount, cur_rate, this_top_rate, other_threshold_rate)
-            except (WorseRateError, BadSpreadError, TradeGapError, ThresholdRateError) as e:
-                continue
-        if self.config['threshold_rate']:
-            if (
-                not self.current_trade or 
-                abs(self.current_trade.current_rate - self.config['threshold_rate']) > .005
-                ):
-                return self.balance_rate(amount, self.other_trader.get_better_rate(self.config['threshold_rate']), 
-                                         this_top_rate, other_threshold_rate)
-        raise ThresholdRateError
-
     @check_bot_stopped
     def submit_trade(self, amount_to_give, amount_to_receive):
-        vs, ev = self.get_auth_tools()
-        self.trade_payload[data['split_trades']] = self.config['split_trades']
-        self.trade_payload[data['give_box']] = str(amount_to_give)
-        self.trade_payload[data['receive_box']] = str(amount_to_receive)
-        self.trade_payload['__EVENTVALIDATION'] = ev
-        self.trade_payload['__VIEWSTATE'] = vs
-        session.post(TC_URL, data=self.trade_payload)
-        self.last_trade_start_time = time.time()
-
-    def _iter_trades_cancel(self, filt=lambda i: True):
+        self.exchange.submit_trade(self.panel, self.currency, self.other_currency,
+                                   amount_to_give, amount_to_receive, self.config['split_trades'])
+        self.last_trade_start_time = self.clock.time()
+        # Any open bids were cancelled just before this submit, so their remainders come back to us
+        available = self.panel.balances[self.currency] + sum(self.panel.open_bids[self.currency])
+        self.fills.expect_bid(amount_to_give, self.last_trade_start_time, available)
+        self.account.bus.publish(OrderSubmitted(self.currency, self.last_trade_start_time, amount_to_give,
+                                                amount_to_receive))
+
+    def _iter_trades_cancel(self, filt=None):
+        """Cancels our bids for which filt(index) is true, or all of them without a filt"""
         trade_count = self.get_trade_count()
+        if trade_count and filt is None: # Otherwise the bid of the current trade stays
+            self.fills.expect_cancel(self.clock.time())
+        cancelled = []
         for i in range(trade_count, 0, -1):
-            if not filt(i): 
+            if filt and not filt(i): 
                 continue
-            vs, ev = self.get_auth_tools() # Cancel ith trade if condition is met
-            payload = {
-                '__EVENTTARGET': self.get_ith_cancel_bid(i),
-                '__EVENTVALIDATION': ev,
-                '__VIEWSTATE': vs
-            }
-            session.post(TC_URL, data=payload)
+            self.exchange.cancel_bid(self.panel, self.currency, i) # Cancel ith trade if condition is met
+            cancelled.append(self.get_trade_remainder(i))
+        if cancelled:
+            self.account.bus.publish(CancelSent(self.currency, self.clock.time(), cancelled))
 
-    def cancel_trades(self):
-        """Cancels all existing trades. Useful if we accidentally submit multiple trades due to server lag."""
+    def close_current_trade(self):
+        """Logs the current trade as the last refresh shows it and forgets it, before its bid is cancelled"""
         if self.current_trade:
             self.update_current_trade()
             self.current_trade = None
             self.set_current_rate(0)
+
+    def cancel_trades(self):
+        """Cancels all existing trades. Useful if we accidentally submit multiple trades due to server lag."""
+        self.close_current_trade()
         self._iter_trades_cancel()
 
     def cancel_other_trades(self):
@@ -316,366 +268,297 @@ class Trader(QtCore.QObject):
     def check_no_recent_trades(self):
         """If the trader hasn't traded in a while, reset both rates so the bot 
         could possibly trade at a worse rate but gain in the long run."""
-        now = time.time()
-        if now - self.last_traded_time > RESET_TIME:
+        now = self.clock.time()
+        if now - self.last_traded_time > self.params.reset_time:
             self.last_traded_time = now
-            if not self.my_trader.holds_top_trade:
+            if not self.holds_top_trade:
                 print('No recent')
                 return True
         return False
 
     @check_bot_stopped
-    def do_trade(self):
-        amount = self.get_amount_to_trade()
-        to_trade, receive, rate = self.calculate_trade(amount)
+    def do_trade(self, action):
+        """Replaces our bid with the one in a Replace action"""
         if self.check_trades():
             self.cancel_trades()
-        self.submit_trade(to_trade, receive)
-        self.set_current_rate(rate)
+        self.submit_trade(action.give, action.receive)
+        self.set_current_rate(action.rate)
 
-        new_trade = Trade(to_trade, receive, self.currency, self.other_currency, rate)
+        new_trade = Trade(action.give, action.receive, self.currency, self.other_currency, action.rate, self.clock)
         self.current_trade = new_trade
         self.trade_log.add_trade(new_trade)
 
-    # Uncomment below for testing speed/optimization
+    def resume_trade(self):
+        """Takes back the current trade of a checkpoint if its bid is still our only open bid of this currency.
+           If we have no open bid, the balance tells what became of it while the bot was stopped: a bid
+           whose remainder came back was cancelled, and one whose remainder did not was filled."""
+        saved, self.saved_trade = self.saved_trade, None
+        trade = Trade(saved['amount1'], saved['amount2'], saved['type1'], saved['type2'], saved['start_rate'],
+                      self.clock)
+        trade.time = trade.seconds_time = saved['seconds_time']
+        trade.start_time = datetime.datetime.fromtimestamp(saved['seconds_time'])
+        bids = self.panel.open_bids[self.currency]
+        if len(bids) == 1 and bids[0] <= saved['remaining1']:
+            trade.update(bids[0], saved['current_rate'])
+            self.current_trade = trade
+            self.fills.track(bids[0])
+            self.set_current_rate(saved['current_rate'])
+            self.trade_log.add_trade(trade)
+            logger.info("Resumed trading %s %s @ %.3f", bids[0], self.currency, display_rate(saved['current_rate']))
+            return
+        self.set_current_rate(0)
+        if bids or saved.get('balance') is None: # Not ours, or checkpointed without the balance to tell
+            logger.info("The saved %s trade is no longer open", self.currency)
+            return
+        remaining = saved['remaining1']
+        returned = self.panel.balances[self.currency] - saved['balance']
+        if returned > remaining/2: # Same test as FillTracker.observe for a bid that never showed
+            trade.update(min(returned, remaining), saved['current_rate'])
+            self.trade_log.add_trade(trade)
+            self.trade_log.complete_trade(trade)
+            logger.info("The saved %s bid was cancelled with %s left", self.currency, trade.remaining1)
+            return
+        trade.update(remaining, saved['current_rate'])
+        self.current_trade = trade
+        self.trade_log.add_trade(trade)
+        event = FullFill(self.currency, self.clock.time(), remaining)
+        self.trade_log.record_fill(event)
+        self.account.bus.publish(event)
+        self.on_fill(event)
+        self.fully_complete_trade()
+        logger.info("The saved %s bid filled while the bot was stopped", self.currency)
+
+    def track_top_trade(self):
+        """Brings holds_top_trade and the current trade up to date with the last refresh"""
+        our_amount = self.get_trade_remainder()
+        top_amount, top_rate = self.get_trade_info(1)
+        if our_amount and our_amount != top_amount:
+            self.update_current_trade() # Update the remaining amount first
+            self.holds_top_trade = False
+        elif self.has_remainder(our_amount):
+            self.holds_top_trade = True
+            self.update_current_trade(top_rate)
+
+    def update_current_trade(self, rate=None):
+        """Brings the current trade up to date with the fill tracker for the trade log, and moves it to rate
+           if that is better. A trade whose bid is gone is completed instead."""
+        trade = self.current_trade
+        if not trade:
+            return
+        remaining = self.fills.tracked
+        if not remaining: # Trade is complete.
+            self.fully_complete_trade()
+            return
+        if self.unapplied_fill:
+            self.unapplied_fill = False
+            now = self.clock.time()
+            if not self.rate_updated and now - self.last_traded_time > self.trade_lag_time:
+                self.remember_fill_rate(trade.start_rate)
+                self.rate_updated = True
+                self.last_traded_time = now
+            trade.update(remaining)
+        if rate and self.is_better_rate(rate, floor_step(trade.current_rate)):
+            trade.update(remaining, rate)
+            self.set_current_rate(trade.current_rate)
+
+    def fully_complete_trade(self):
+        """Completes the current trade once the fill tracker has seen its bid fill or be rejected.
+           A rejected bid keeps its remainder in the trade log, but its rate is remembered all the same.
+           If the bid is gone and no result came within RESULT_WAIT trade lag times, the trade is completed
+           with the remainder last tracked, so a missed event cannot leave the trader holding it forever.
+           Returns whether the current trade is gone."""
+        trade, result = self.current_trade, self.bid_result
+        if not trade:
+            return False
+        if result is None:
+            if self.fills.tracked or self.fills.submitted is not None or \
+                    self.clock.time() - self.last_trade_start_time <= RESULT_WAIT*self.trade_lag_time:
+                return False
+            logger.warning("No fill event for the %s bid of %s, completing its trade", self.currency, trade.amount1)
+        if isinstance(result, FullFill):
+            trade.update(0)
+        self.remember_completed_rate(trade.start_rate)
+        self.set_current_rate(0)
+        self.current_trade = None
+        return True
+
+    def next_action(self):
+        """Updates our view of the current trade, then asks the kernel what to do"""
+        if self.check_trades() and self.get_trade_count() == 1 and self.current_trade:
+            self.track_top_trade()
+            if not self.current_trade: # Completed while tracking it
+                return Hold()
+        return decide(self.state(), self.market, self.panel)
+
+    def apply(self, action):
+        if isinstance(action, Replace):
+            self.do_trade(action)
+        elif isinstance(action, Complete):
+            if self.fully_complete_trade():
+                self.apply(self.next_action())
+        elif isinstance(action, CancelOthers):
+            self.cancel_other_trades()
+        elif isinstance(action, Cancel):
+            self.cancel_trades()
+
+    # Uncomment below for testing speed/optimization. To profile a running bot, use rbxAPI.sampler instead.
     # @profile
     def start(self):
         self.started = True
         while self.started:
-            time.sleep(DELAY)
-            try:
-                self.refresh()
-                self.check_no_recent_trades()
-                if not self.check_trades():
-                    if self.current_trade:
-                        if self.fully_complete_trade():
-                            self.do_trade()
-                    else:
-                        self.do_trade()
-                elif self.get_trade_count() > 1: # Lag error? Better clean it up.
-                    self.cancel_other_trades()
-                elif self.current_trade:
-                    if self.check_better_rate():
-                        self.do_trade()
-                    elif self.check_trade_gap():
-                        self.do_trade()
-                else:
-                    self.cancel_trades()
-            except BotStoppedError:
+            self.clock.sleep(self.params.delay)
+            if not self.tick():
                 break
-            except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
-                print(e)
-                print("Connection interrupted")
-            except (WorseRateError, LowRateError, BadSpreadError, MarketTraderError,
-                    TradeGapError,  NoMoneyError, OurTradeError, ZeroDivisionError,
-                    ThresholdRateError) as e:
-                logging.debug(e)
-            except Exception as e:
-                logging.error(e)
-                raise e
-        self.cancel_trades()
-
-    def stop(self):
+        # Bids are cancelled by whoever stopped the trader (stop() or shutdown()), not here a second time
+
+    def tick(self):
+        """Runs one refresh and trade decision. Returns False once the bot has been stopped."""
+        if not self.started:
+            return False
+        self.idle.clear()
+        start = time.perf_counter()
+        if self.next_params is not None:
+            self.swap_params()
+        if self.next_config is not None:
+            self.swap_config()
+        try:
+            self.refresh()
+            if self.saved_trade is not None:
+                self.resume_trade()
+            self.check_no_recent_trades()
+            action = self.next_action()
+            DECISIONS.labels(self.currency, type(action).__name__).inc()
+            self.apply(action)
+        except BotStoppedError:
+            return False
+        except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                requests.exceptions.Timeout, CircuitOpenError) as e:
+            TICK_ERRORS.labels(self.currency, type(e).__name__).inc()
+            self.account.bus.publish(TraderError(self.currency, self.clock.time(), e))
+            print(e)
+            print("Connection interrupted")
+        except (WorseRateError, LowRateError, BadSpreadError, MarketTraderError,
+                TradeGapError,  NoMoneyError, OurTradeError, ZeroDivisionError,
+                ThresholdRateError) as e:
+            TICK_ERRORS.labels(self.currency, type(e).__name__).inc()
+            logger.debug('%s', e)
+        except Exception as e:
+            TICK_ERRORS.labels(self.currency, type(e).__name__).inc()
+            self.account.bus.publish(TraderError(self.currency, self.clock.time(), e))
+            logger.error('%s', e)
+            raise e
+        finally:
+            self.tick_seconds.observe(time.perf_counter() - start)
+            self.idle.set()
+        return True
+
+    def wait_idle(self, timeout=None):
+        """Waits for a tick in progress to finish. Returns False if it was still running after timeout."""
+        return self.idle.wait(timeout)
+
+    def stop(self, deadline=SHUTDOWN_DEADLINE):
+        """Stops trading and cancels our open bids. Returns a ShutdownReport; see shutdown() to stop both traders."""
         print("Stopping {} trader".format(self.currency))
-        self.started = False
-        self.cancel_trades()
+        report = shutdown([self], deadline)
+        print(report)
+        return report
 
 
 class TixTrader(Trader):
 
     """Trades from tix to robux"""
-    holds_top_trade = False
     currency = 'Tickets'
     other_currency = 'Robux'
    
 
-    def __init__(self, trade_log):
-        super().__init__(self.currency)
+    def __init__(self, trade_log, account=None, params=None):
+        super().__init__(self.currency, account, params)
         self.trade_log = trade_log
-        self.my_trader = TixTrader
-        self.other_trader = RobuxTrader
-
-    @staticmethod
-    def get_better_rate(rate):
-        """Returns a rate higher than the best rate."""
-        return rate + .001
 
     def set_current_rate(self, rate):
-        rates.current_tix_rate = rate
+        self.rates.current_tix_rate = rate
 
     def check_no_recent_trades(self):
         if super().check_no_recent_trades():
-            rates.last_robux_rate = 0
-            rates.past_robux_rates.clear()
+            self.rates.last_robux_rate = 0
+            self.rates.past_robux_rates.clear()
 
-    def check_threshold_rate(self, rate):
-        our_threshold_rate = self.config['threshold_rate']
+    def is_better_rate(self, rate, than):
+        return rate > than
 
-    def get_available_trade_info(self, i):
-        """Parses the trade information string of the ith trade from the available tix column"""
-        # Format: '\r\n (bunch of spaces) Tix @ rate:1\r\n (bunch of spaces)'
-        trade_info = self.get_ith_trade_path(i, 'Tickets')
-        info = self.get_raw_data(trade_info) # May be None if connection is reset
-        if not info:
-            raise requests.exceptions.ConnectionError
-        rate_split = [x for x in info.split(' ') if x and x[0].isdigit()]
-        if len(rate_split) < 2:
-            raise MarketTraderError
-        tix, all_rate = to_num(rate_split[0]), rate_split[1]
-        rate = float(all_rate.split(':')[0])
-        return tix, rate
-
-    def update_current_trade(self, amount_remain=None, rate=None):
-        """If a current trade is active, update its information for the trade log."""
-        logging.info('Updating trade')
-        if amount_remain is None:
-            amount_remain = self.get_trade_remainder()
-        if amount_remain and self.current_trade:
-            if amount_remain < self.current_trade.remaining1:
-                if not self.rate_updated and time.time() - self.last_traded_time > TRADE_LAG_TIME:
-                    start_rate = self.current_trade.start_rate
-                    rates.past_tix_rates.append(start_rate)
-                    rates.last_tix_rate = max(rates.past_tix_rates)
-                    self.rate_updated = True
-                    self.last_traded_time = time.time()
-                self.current_trade.update(amount_remain)    
-            if rate and rate > round_down(self.current_trade.current_rate):
-                self.current_trade.update(amount_remain, rate)
-                rates.current_tix_rate = self.current_trade.current_rate
-        elif self.current_trade:  #  Trade is complete.
-            self.fully_complete_trade()
-
-    def check_trade_gap(self):
-        if self.config['early_cancel'] and self.current_trade and TixTrader.holds_top_trade:
-            next_rate = self.get_ith_trade_rate(2)
-            start_diff = self.current_trade.current_rate - self.current_trade.start_rate
-            nt_diff = self.current_trade.current_rate - next_rate
-            return start_diff >= TGAP - .00001 or nt_diff >= TGAP - .00001 # Float stuff
-
-    def check_better_rate(self):
-        """Check if a better rate for tix to robux exists, updates the GUI if our trade is top"""
-        our_tix = self.get_trade_remainder()
-        top_tix, top_rate = self.get_trade_info(1)
-        # Check if the top trade is not our trade
-        if our_tix and our_tix != top_tix:
-            self.update_current_trade(our_tix) # Update the remaining tix first
-            TixTrader.holds_top_trade = False
-            if top_rate < rates.last_robux_rate:
-                return True
-            elif rates.current_tix_rate and top_rate >= round_down(rates.current_tix_rate):
-                return True
-            elif not rates.last_robux_rate and not rates.current_robux_rate and top_rate < self.get_other_rate():
-                return True
-        elif our_tix:
-            TixTrader.holds_top_trade = True
-            self.update_current_trade(our_tix, top_rate)
-        return False
+    def remember_fill_rate(self, rate):
+        self.rates.past_tix_rates.append(rate)
+        self.rates.last_tix_rate = max(self.rates.past_tix_rates)
 
-    def test_rate(self, rate, this_top_rate, threshold_rate):
-        """Tests if the rate is better than the last rate"""
-        last_rate = rates.last_robux_rate
-        logging.debug("Last robux rate: ", str(last_rate))
-        if not TixTrader.holds_top_trade:
-            if rate - this_top_rate >= TGAP - .00001:
-                raise TradeGapError
-        if self.config['threshold_rate'] and rate > self.config['threshold_rate']:
-            raise ThresholdRateError
-        if last_rate and rate > round_up(last_rate): # Rounding up may cause loss at up to 4th decimal point
-            raise WorseRateError(self.currency, self.other_currency, rate, last_rate)
-        elif not last_rate:
-            if not threshold_rate:
-                raise BadSpreadError
-            if round_down(rate) > threshold_rate:
-                raise WorseRateError(self.currency, self.other_currency, rate, threshold_rate)
-
-    def balance_rate(self, amount, rate, this_top_rate, threshold_rate):
-        """Gives a trade amount nearest the exact rate, with the highest 4th decimal place and the corresponding robux to receive"""
-        x = amount
-        best_x = 0
-        closest_within_rate, closest_outside_rate = 0, sys.maxsize
-        # Trade within .001 of the top rate, or lower if the last robux rate is within .001 of this tix rate
-        # Add tolerance check
-        tolerance = self.get_tolerance(amount)# Lowest % to trade
-        while x > tolerance*amount:
-            diff = x/math.floor(x/rate) - rate # Difference between our actual rate and top tix rate.
-            if diff < .001:
-                if diff > closest_within_rate:
-                    closest_within_rate = diff
-                    best_x = x
-            elif not closest_within_rate and diff < closest_outside_rate: # diff >= .001
-                closest_outside_rate = diff
-                best_x = x
-            x -= 1
-        to_trade, receive = best_x, math.floor(best_x/rate)
-        actual_rate = to_trade/receive
-        self.test_rate(actual_rate, this_top_rate, threshold_rate)
-        return to_trade, receive, actual_rate
-
-    def fully_complete_trade(self):
-        completed_trade = self.current_trade
-        if completed_trade and time.time() - self.last_trade_start_time > TRADE_LAG_TIME: # Trades can be incorrectly completed due to Roblox's time to process a trade
-            completed_trade.update(0)
-            rates.last_tix_rate = max(completed_trade.start_rate, rates.last_tix_rate)
-            rates.current_tix_rate = 0
-            self.current_trade = None
-            return True
-        return False
+    def remember_completed_rate(self, rate):
+        self.rates.last_tix_rate = max(rate, self.rates.last_tix_rate)
 
 class RobuxTrader(Trader):
     """Trades from robux to tix"""
 
-    holds_top_trade = False
     currency = 'Robux'
     other_currency = 'Tickets'
    
 
-    def __init__(self, trade_log):
-        super().__init__(self.currency)
+    def __init__(self, trade_log, account=None, params=None):
+        super().__init__(self.currency, account, params)
         self.trade_log = trade_log
-        self.my_trader = RobuxTrader
-        self.other_trader = TixTrader
-
-    @staticmethod
-    def get_better_rate(rate):
-        """Returns a rate higher than the best rate"""
-        return rate - .001
 
     def set_current_rate(self, rate):
-        rates.current_robux_rate = rate
+        self.rates.current_robux_rate = rate
 
     def check_no_recent_trades(self):
         if super().check_no_recent_trades():
-            rates.last_tix_rate = 0
-            rates.past_tix_rates.clear()
+            self.rates.last_tix_rate = 0
+            self.rates.past_tix_rates.clear()
 
-    def get_available_trade_info(self, i):
-        """Parses the trade information string of the ith trade in the available robux column"""
-        if RobuxTrader.check_at_market(self): # Top trade is @ Market, real info is at index + 1
-            i += 1
-
-        trade_info = self.get_ith_trade_path(i, 'Robux')
-        amount_info = self.get_raw_data(trade_info[0])
-        # Format ['\r\n (bunch of spaces)', ' @ 1:rate\r\n']
-        rate_info = self.get_raw_data(trade_info[1])
-        if not amount_info or not rate_info:
-            raise requests.exceptions.ConnectionError
-        robux = to_num(amount_info)
-        # Gets the 1:rate\r\n part
-        all_rate = [x for x in rate_info[1].split(' ') if x and x[0].isdigit()]
-        # Gets the rate part
-        rate = (all_rate[0].split(':')[1]).split('\\')[0]
-        rate = float(rate)
-        return robux, rate
-
-    def update_current_trade(self, amount_remain=None, rate=None):
-        """If a current trade is active, update its information for the trade log."""
-        if amount_remain is None:
-            amount_remain = self.get_trade_remainder()
-        if amount_remain and self.current_trade:
-            if amount_remain < self.current_trade.remaining1:
-                if not self.rate_updated and time.time() - self.last_traded_time > TRADE_LAG_TIME:
-                    start_rate = self.current_trade.start_rate
-                    rates.past_robux_rates.append(start_rate) 
-                    rates.last_robux_rate = min(rates.past_robux_rates)
-                    self.rate_updated = True
-                    self.last_traded_time = time.time()
-                self.current_trade.update(amount_remain)
-            if rate and rate < round_down(self.current_trade.current_rate):
-                self.current_trade.update(amount_remain, rate)
-                rates.current_robux_rate = self.current_trade.current_rate
-        elif self.current_trade:
-            self.fully_complete_trade()
+    def is_better_rate(self, rate, than):
+        return rate < than
 
-    def check_at_market(self):
-        """Checks if the top robux trade is @ Market"""
-        trade_info_path = self.get_ith_trade_path(1, 'Robux') # Gets top robux trade xpath
-        # Format ['\r\n (bunch of spaces)', ' @ 1:rate\r\n'] Second part is rate info
-        trade_info = self.get_raw_data(trade_info_path[1])
-        if not len(trade_info):
-            raise requests.exceptions.ConnectionError
-        rate_info = trade_info[1]
-        return 'Market' in rate_info
-
-    def check_trade_gap(self):
-        """Check if our rate is far higher than the next rate."""
-        if self.config['early_cancel'] and self.current_trade and RobuxTrader.holds_top_trade:
-            # Get the second highest trade's info
-            next_rate = self.get_ith_trade_rate(2)
-            start_diff = self.current_trade.start_rate - self.current_trade.current_rate
-            nt_diff = next_rate - self.current_trade.current_rate
-            return start_diff >= RGAP - .000001 or nt_diff >= RGAP - .000001 # Float stuff
-
-    def check_better_rate(self):
-        """Check if a better rate for robux to tix exists"""
-        our_robux = self.get_trade_remainder()
-        top_robux, top_rate = self.get_trade_info(1)
-        # Check if the top trade is not our trade
-        if our_robux and our_robux != top_robux:
-            self.update_current_trade(our_robux)
-            RobuxTrader.holds_top_trade = False
-            if rates.last_tix_rate and top_rate > rates.last_tix_rate:
-                return True
-            elif rates.current_robux_rate and top_rate <= rates.current_robux_rate:
-                return True
-            elif not rates.last_tix_rate and not rates.current_tix_rate and top_rate > self.get_other_rate():
-                return True
-        elif our_robux is not None:
-            RobuxTrader.holds_top_trade = True
-            self.update_current_trade(our_robux, top_rate)
-        return False
+    def remember_fill_rate(self, rate):
+        self.rates.past_robux_rates.append(rate)
+        self.rates.last_robux_rate = min(self.rates.past_robux_rates)
 
+    def remember_completed_rate(self, rate):
+        if self.rates.last_robux_rate:
+            self.rates.last_robux_rate = min(rate, self.rates.last_robux_rate)
+        else:
+            self.rates.last_robux_rate = rate
 
-    def test_rate(self, rate, this_top_rate, threshold_rate):
-        """Verifies that this is a better and profit making rate to trade at"""
-        last_rate = rates.last_tix_rate
-        logging.debug("Last tix rate: ", str(last_rate))
-        if not RobuxTrader.holds_top_trade:
-            if this_top_rate - rate >= RGAP:
-                raise TradeGapError
-        if self.config['threshold_rate'] and rate < self.config['threshold_rate']:
-            raise ThresholdRateError
-        if last_rate and rate < round_down(last_rate):
-            raise WorseRateError(self.currency, self.other_currency, rate, last_rate)
-        elif not last_rate:
-            if not threshold_rate:
-                raise BadSpreadError
-            if round_down(rate) < threshold_rate:
-                raise WorseRateError(self.currency, self.other_currency, rate, threshold_rate)
-
-    def balance_rate(self, amount, rate, this_top_rate, threshold_rate):
-        """Gives a trade amount nearest the exact rate, and the corresponding tix to receive"""
-        x, closest, best_x = amount, sys.maxsize, 0
-        # Trade within .001 of top rate, or lower if the last tix rate is within .001 of top rate
-        tolerance = self.get_tolerance(amount)
-        while x > tolerance*amount:
-            diff = math.ceil(x*rate)/x - rate # Difference between top trade rate and actual rate
-            if diff < closest and diff >= 0:
-                closest = diff
-                best_x = x
-            x -= 1
-        to_trade, receive = best_x, math.floor(best_x*rate)
-        actual_rate = receive/to_trade
-        self.test_rate(actual_rate, this_top_rate, threshold_rate)
-        return to_trade, receive, actual_rate
+    def has_remainder(self, amount):
+        return amount is not None
 
-    def fully_complete_trade(self):
-        completed_trade = self.current_trade
-        if completed_trade and time.time() - self.last_trade_start_time > TRADE_LAG_TIME: # Trades can be incorrectly completed due to Roblox's time to process a trade
-            completed_trade.update(0)
-            if rates.last_robux_rate:
-                rates.last_robux_rate = min(completed_trade.start_rate, rates.last_robux_rate)
-            else:
-                rates.last_robux_rate = completed_trade.start_rate
-            rates.current_robux_rate = 0
-            self.current_trade = None
-            return True
-        return False
+    def check_at_market(self):
+        """Checks if the top robux trade is @ Market"""
+        return self.market.robux_at_market
 
-def test_login(user, pw):
+def test_login(user, pw, account=None):
     payload = {
         'username': user,
         'password': pw,
     }
-    r = session.post(LOGIN_URL, payload).result()
+    account = account or default_account
+    r = account.http.post('login', LOGIN_URL, payload).result()
     if r.url == LOGIN_URL:
-        raise LoginError
\ No newline at end of file
+        raise LoginError
+    account.username = user
+    account.warm_up()
+
+def resume_login(user, account=None, cookie_file=COOKIE_FILE):
+    """Logs in with the cookies saved by save_cookies instead of the password, if they are still valid.
+       One fetch of the trade currency page checks them, and its snapshot is kept for the first tick.
+       Returns whether it worked; a failed resume does not count as a login attempt."""
+    account = account or default_account
+    if not load_cookies(account, user, cookie_file):
+        return False
+    try:
+        market, panel = account.exchange.fetch() # Without a login, the page has no balances and this raises
+    except Exception as e: # Any page we cannot trade on means the password is needed
+        logger.info("Saved session of %s not accepted: %s", user, e)
+        account.session.cookies.clear()
+        forget_cookies(cookie_file)
+        return False
+    account.username = user
+    account.keep_snapshot(market, panel)
+    account.warm_up()
+    return True
\ No newline at end of file
@@ -0,0 +1,358 @@
+"""Replays recorded market history through the real TixTrader/RobuxTrader code.
+
+Time is simulated (SimClock), the trade currency page is replaced by SimExchange and
+nothing touches the network, so hours of history run in seconds. The ticks run on a
+Scheduler of the SimClock. When a tick changes nothing, the next one is scheduled at
+the next thing that could change a decision: the next recorded snapshot, a pending
+order, or one of the trader's time limits.
+
+Record history with `python headless.py USERNAME --record history.jsonl`, then run
+`python -m rbxAPI.backtest history.jsonl --tix 1000 --robux 100` from valktcbot/."""
+from .account import Account
+from .actions import TixTrader, RobuxTrader
+from .clock import Scheduler, SimClock
+from .config import read_config, trader_settings
+from .exchange import AccountSnapshot
+from .market import MarketSnapshot, load_history
+from .params import default_params
+from .trade_log import TradeLog
+from .units import ratio_round, to_float
+
+import argparse
+import math
+import time
+
+LATENCY = .1 # Simulated seconds before a submitted or cancelled bid shows on the page
+ROUND_TRIP = .2 # Simulated seconds a page fetch takes
+FILL_RATIO = 1.0 # Share of the volume taken from the recorded top trade that would have filled our better bid
+
+
+class SimBid:
+
+    def __init__(self, currency, amount, receive, split, placed_at):
+        self.currency = currency
+        self.amount = amount # Amount given
+        self.receive = receive
+        self.remaining = amount
+        self.split = split
+        self.placed_at = placed_at
+        if currency == 'Tickets':
+            self.rate = ratio_round(amount, receive) # Tix per robux, as shown in the tix column
+        else:
+            self.rate = ratio_round(receive, amount) # 1:rate, as shown in the robux column
+
+    def received(self):
+        return math.floor(self.receive*(self.amount - self.remaining)/self.amount)
+
+    def ahead_of(self, rate):
+        """Whether this bid is strictly better than rate, so it gets filled first"""
+        if self.currency == 'Tickets':
+            return self.rate > rate
+        return self.rate < rate
+
+
+class SimExchange:
+
+    """Stands in for the trade currency page: serves recorded market snapshots with our
+       bids placed into them, and fills our bids from the volume the recorded market traded."""
+
+    def __init__(self, history, clock, balances, latency=LATENCY, fill_ratio=FILL_RATIO, round_trip=ROUND_TRIP):
+        self.history = history
+        self.clock = clock
+        self.balances = dict(balances)
+        self.latency = latency
+        self.round_trip = round_trip
+        self.fill_ratio = fill_ratio
+        self.position = 0 # Index of the current snapshot in history
+        self.bids = {'Tickets': [], 'Robux': []}
+        self.pending = [] # (due time, action, args) not yet visible on the page
+        self.fills = [] # (time, currency, amount, rate)
+        self.submitted = self.cancelled = self.rejected = 0
+        self.actions = 0 # Submits and cancels, to tell if a tick did anything
+        self.shown_bids = {'Tickets': [], 'Robux': []} # Bids in the order of the last AccountSnapshot
+
+    @property
+    def market(self):
+        return self.history[self.position]
+
+    def next_event_time(self):
+        times = [due for due, action, args in self.pending]
+        if self.position + 1 < len(self.history):
+            times.append(self.history[self.position + 1].time)
+        return min(times) if times else None
+
+    def end_time(self):
+        """Time of the last snapshot, or of the last order still pending after it"""
+        return max([self.history[-1].time] + [due for due, action, args in self.pending])
+
+    def finished(self):
+        """Whether the replay has reached the last snapshot. Orders still pending are cancelled by cancel_all."""
+        return self.position + 1 >= len(self.history)
+
+    def advance(self):
+        now = self.clock.time()
+        while True:
+            next_market = self.history[self.position + 1].time if self.position + 1 < len(self.history) else None
+            next_pending = min(self.pending, key=lambda p: p[0])[0] if self.pending else None
+            if next_pending is not None and next_pending <= now and (next_market is None or next_pending <= next_market):
+                self.pending.sort(key=lambda p: p[0])
+                due, action, args = self.pending.pop(0)
+                action(*args)
+            elif next_market is not None and next_market <= now:
+                self.position += 1
+                for currency in self.bids:
+                    self.fill(currency, self.history[self.position - 1], self.market)
+            else:
+                break
+
+    def fill(self, currency, before, after):
+        """Gives our bids the volume taken from the top trade of the column between two snapshots"""
+        top = next((info for info in before.column(currency) if info), None)
+        if top is None:
+            return
+        amount, rate = top
+        left = next((info[0] for info in after.column(currency) if info and info[1] == rate), 0)
+        volume = max(amount - left, 0)*self.fill_ratio
+        for bid in self.bids[currency]:
+            if volume <= 0 or not bid.ahead_of(rate):
+                break
+            filled = min(bid.remaining, math.floor(volume))
+            if not bid.split and filled < bid.remaining:
+                break
+            if filled <= 0:
+                break
+            received_before = bid.received()
+            bid.remaining -= filled
+            volume -= filled
+            other = 'Robux' if currency == 'Tickets' else 'Tickets'
+            self.balances[other] += bid.received() - received_before
+            self.fills.append((after.time, currency, filled, bid.rate))
+        self.bids[currency] = [bid for bid in self.bids[currency] if bid.remaining > 0]
+
+    def fetch(self):
+        self.clock.sleep(self.round_trip)
+        self.advance()
+        market = self.market
+        columns = {}
+        for currency in ('Tickets', 'Robux'):
+            column = list(market.column(currency))
+            length = len(column)
+            for bid in self.bids[currency]:
+                i = 0
+                while i < len(column) and (column[i] is None or not bid.ahead_of(column[i][1])):
+                    i += 1
+                column.insert(i, (bid.remaining, bid.rate))
+            columns[currency] = column[:length]
+            self.shown_bids[currency] = list(self.bids[currency])
+        snapshot = MarketSnapshot(market.spread, market.tix_rate, market.robux_rate,
+                                  columns['Tickets'], columns['Robux'], market.robux_at_market,
+                                  market.seq, self.clock.time())
+        panel = AccountSnapshot(
+            dict(self.balances),
+            {currency: [bid.remaining for bid in bids] for currency, bids in self.bids.items()},
+            {currency: bool(bids) for currency, bids in self.bids.items()},
+            'viewstate', 'eventvalidation'
+        )
+        return snapshot, panel
+
+    def submit_trade(self, panel, currency, other_currency, amount_to_give, amount_to_receive, split_trades):
+        self.actions += 1
+        self.pending.append((self.clock.time() + self.latency, self._place,
+                             (currency, amount_to_give, amount_to_receive, bool(split_trades))))
+
+    def cancel_bid(self, panel, currency, index):
+        self.actions += 1
+        shown = self.shown_bids[currency]
+        if index <= len(shown):
+            self.pending.append((self.clock.time() + self.latency, self._cancel, (shown[index - 1],)))
+
+    def _place(self, currency, amount, receive, split):
+        if amount <= 0 or receive <= 0 or amount > self.balances[currency]:
+            self.rejected += 1
+            return
+        self.balances[currency] -= amount
+        self.bids[currency].append(SimBid(currency, amount, receive, split, self.clock.time()))
+        self.submitted += 1
+
+    def _cancel(self, bid):
+        if bid in self.bids[bid.currency]:
+            self.bids[bid.currency].remove(bid)
+            self.balances[bid.currency] += bid.remaining
+            self.cancelled += 1
+
+    def cancel_all(self):
+        for currency in self.bids:
+            for bid in list(self.bids[currency]):
+                self._cancel(bid)
+        self.pending = []
+
+
+class BacktestResult:
+
+    def __init__(self, start_balances, end_balances, fills, submitted, cancelled, rejected,
+                 ticks, sim_seconds, wall_seconds, end_rate):
+        self.start_balances = start_balances
+        self.end_balances = end_balances
+        self.fills = fills
+        self.submitted = submitted
+        self.cancelled = cancelled
+        self.rejected = rejected
+        self.ticks = ticks
+        self.sim_seconds = sim_seconds
+        self.wall_seconds = wall_seconds
+        self.end_rate = end_rate # Tix per robux used to value the result
+
+    def value(self, balances):
+        """Worth of balances in tix"""
+        return balances['Tickets'] + balances['Robux']*self.end_rate
+
+    @property
+    def profit(self):
+        """Profit in tix, valued at the final rate"""
+        return self.value(self.end_balances) - self.value(self.start_balances)
+
+    @property
+    def speedup(self):
+        return self.sim_seconds/self.wall_seconds if self.wall_seconds else float('inf')
+
+    def summary(self):
+        lines = [
+            "Simulated {:.0f} seconds in {:.2f} seconds ({:.0f}x real time), {} ticks ({:.1f} us per tick)".format(
+                self.sim_seconds, self.wall_seconds, self.speedup, self.ticks,
+                self.wall_seconds/self.ticks*1e6 if self.ticks else 0),
+            "Bids submitted: {}  cancelled: {}  rejected: {}  fills: {}".format(
+                self.submitted, self.cancelled, self.rejected, len(self.fills)),
+        ]
+        for currency in ('Tickets', 'Robux'):
+            lines.append("{}: {} -> {} ({:+d})".format(currency, self.start_balances[currency],
+                         self.end_balances[currency], self.end_balances[currency] - self.start_balances[currency]))
+        lines.append("Profit: {:+.1f} Tickets at {:.3f} Tickets per Robux".format(self.profit, self.end_rate))
+        return '\n'.join(lines)
+
+
+class Backtest:
+
+    """Runs a TixTrader and RobuxTrader pair over history.
+       configs holds trader options per currency, as set by Trader.set_config, and params the
+       TraderParams both traders use."""
+
+    def __init__(self, history, balances, configs=None, latency=LATENCY, fill_ratio=FILL_RATIO, params=None,
+                 round_trip=ROUND_TRIP):
+        self.history = history
+        self.balances = balances
+        self.configs = configs or {}
+        self.latency = latency
+        self.round_trip = round_trip
+        self.fill_ratio = fill_ratio
+        self.params = params or default_params
+
+    def make_traders(self, account, trade_log):
+        traders = [TixTrader(trade_log, account), RobuxTrader(trade_log, account)]
+        for trader in traders:
+            for option, value in self.configs.get(trader.currency, {}).items():
+                trader.set_config(option, value)
+        return traders
+
+    @staticmethod
+    def state(traders):
+        """What a tick can change besides the exchange, to tell if a tick did anything"""
+        state = []
+        for trader in traders:
+            trade = trader.current_trade
+            state.append((id(trade), trade and trade.remaining1, trade and trade.current_rate,
+                          trader.holds_top_trade, trader.rate_updated, trader.last_traded_time))
+        rates = traders[0].rates
+        state.append(tuple(rates[name] for name in sorted(rates) if not name.startswith('past')))
+        return state
+
+    @staticmethod
+    def time_limits(traders):
+        limits = []
+        for trader in traders:
+            lag = trader.trade_lag_time
+            limits += [trader.last_trade_start_time + lag, trader.last_traded_time + lag,
+                       trader.last_traded_time + trader.params.reset_time]
+        return limits
+
+    def run(self):
+        clock = SimClock(self.history[0].time)
+        exchange = SimExchange(self.history, clock, self.balances, self.latency, self.fill_ratio, self.round_trip)
+        account = Account('backtest', clock=clock, exchange=exchange, params=self.params)
+        traders = self.make_traders(account, TradeLog(clock))
+        for trader in traders:
+            trader.started = True
+
+        delay = self.params.delay
+        scheduler = Scheduler(clock)
+        ticks = 0
+
+        def tick():
+            nonlocal ticks
+            if exchange.finished():
+                return
+            actions, state = exchange.actions, self.state(traders)
+            for trader in traders:
+                trader.tick()
+            ticks += 1
+            now = clock.time()
+            due = now + delay
+            if exchange.actions == actions and self.state(traders) == state:
+                # Nothing happened, so nothing will until the market, an order or a time limit changes
+                upcoming = [t for t in self.time_limits(traders) if t > now]
+                next_event = exchange.next_event_time()
+                if next_event is not None:
+                    upcoming.append(next_event)
+                if upcoming:
+                    due = max(min(upcoming), due)
+                # Past the end of the history only the trader's time limits are left, which nothing replays
+                due = min(due, exchange.end_time())
+            scheduler.call_at(due, tick)
+
+        start = time.perf_counter()
+        scheduler.call_at(clock.time(), tick)
+        timer = scheduler.next_timer() # Moves the clock to each tick, and is None once none is scheduled
+        while timer is not None:
+            timer.run()
+            timer = scheduler.next_timer()
+        end = min(clock.time(), exchange.end_time())
+        for trader in traders:
+            trader.started = False
+        exchange.cancel_all()
+        wall = time.perf_counter() - start
+
+        last = self.history[-1]
+        return BacktestResult(dict(self.balances), exchange.balances, exchange.fills, exchange.submitted,
+                              exchange.cancelled, exchange.rejected, ticks, end - self.history[0].time,
+                              wall, to_float(last.tix_rate + last.robux_rate)/2)
+
+
+def load_configs(path=None):
+    """Trader options per currency from a config.ini, or trade all with split trades"""
+    if path:
+        config = read_config(path)
+        return {currency: trader_settings(config, currency) for currency in ('Tickets', 'Robux')}
+    return {currency: {'trade_all': True, 'split_trades': 'on'} for currency in ('Tickets', 'Robux')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded market history through the trading strategy")
+    parser.add_argument('history', help="JSON lines file written by headless.py --record")
+    parser.add_argument('--config', help="config.ini with the trader settings (default: trade all)")
+    parser.add_argument('--tix', type=int, default=1000, help="Starting tickets")
+    parser.add_argument('--robux', type=int, default=100, help="Starting robux")
+    parser.add_argument('--latency', type=float, default=LATENCY)
+    parser.add_argument('--round-trip', type=float, default=ROUND_TRIP)
+    parser.add_argument('--fill-ratio', type=float, default=FILL_RATIO)
+    args = parser.parse_args()
+
+    configs = load_configs(args.config)
+    history = load_history(args.history)
+    if len(history) < 2:
+        parser.error("Not enough history to replay")
+    result = Backtest(history, {'Tickets': args.tix, 'Robux': args.robux}, configs,
+                      args.latency, args.fill_ratio, round_trip=args.round_trip).run()
+    print(result.summary())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+"""An in-process publish/subscribe bus for market data and the trade lifecycle.
+
+Each Account has a bus. Its traders publish typed events to it:
+
+    Snapshot       every refresh, with the MarketSnapshot and AccountSnapshot traded on
+    TopOfBook      the top trade of a column changed since the account's last refresh
+    OrderSubmitted a bid was sent
+    CancelSent     cancels were sent for our open bids
+    TraderError    a tick failed on a connection problem or an unexpected exception
+    FillEvent      the fill events of rbxAPI.fills (PartialFill, FullFill, ...)
+
+A consumer subscribes to the event classes it wants (subclasses included) and gets its
+own bounded queue. publish() only appends to the queues, so a slow consumer never slows
+the trader down: when its queue is full, the oldest event is dropped (DROP_OLDEST, the
+default), or the new one is (DROP_NEWEST). A consumer that must not lose events can ask
+for BLOCK, which makes the publisher wait up to block_timeout for room, at the cost of
+the trader's latency. Dropped events are counted in rbx_bus_dropped.
+
+With a handler, a subscription runs it on its own daemon thread. Without one, read it
+with get(). A Qt slot should be reached through a Signal emitted from the handler."""
+from collections import deque
+from .metrics import BUS_DROPPED
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 1000 # Events a subscriber may fall behind by
+BLOCK_TIMEOUT = .05 # Seconds a BLOCK publisher waits for room before dropping the event
+CLOSE_TIMEOUT = 2 # Seconds close() waits for a handler to finish its queue
+DROP_OLDEST, DROP_NEWEST, BLOCK = 'drop_oldest', 'drop_newest', 'block'
+
+
+class Event:
+
+    def __init__(self, currency, time):
+        self.currency = currency # Of the trader that published it, or of the column for TopOfBook
+        self.time = time
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.__dict__ == other.__dict__
+
+    def __repr__(self):
+        return "{}({})".format(type(self).__name__, ', '.join('{}={!r}'.format(*item) for item in self.__dict__.items()))
+
+
+class Snapshot(Event):
+
+    def __init__(self, currency, time, market, panel):
+        super().__init__(currency, time)
+        self.market = market
+        self.panel = panel
+
+
+class TopOfBook(Event):
+
+    """The top of the column of currency is now (amount, rate), or None if it is empty or a market trade"""
+
+    def __init__(self, currency, time, top, previous):
+        super().__init__(currency, time)
+        self.top = top
+        self.previous = previous
+
+
+class OrderSubmitted(Event):
+
+    def __init__(self, currency, time, give, receive):
+        super().__init__(currency, time)
+        self.give = give
+        self.receive = receive
+
+
+class CancelSent(Event):
+
+    def __init__(self, currency, time, bids):
+        super().__init__(currency, time)
+        self.bids = bids # Remainders of the bids a cancel was sent for
+
+
+class TraderError(Event):
+
+    def __init__(self, currency, time, error):
+        super().__init__(currency, time)
+        self.error = error
+
+
+class Subscription:
+
+    """A bounded queue of the events of some classes, and the thread that runs its handler if it has one"""
+
+    def __init__(self, bus, kinds, handler=None, maxsize=QUEUE_SIZE, overflow=DROP_OLDEST,
+                 block_timeout=BLOCK_TIMEOUT, name=None):
+        if overflow not in (DROP_OLDEST, DROP_NEWEST, BLOCK):
+            raise ValueError("Unknown overflow policy {!r}".format(overflow))
+        self.bus = bus
+        self.kinds = kinds
+        self.handler = handler
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.name = name or getattr(handler, '__qualname__', None) or 'subscriber'
+        self.queue = deque()
+        self.dropped = 0
+        self.closed = False
+        self._dropped_counter = BUS_DROPPED.labels(self.name)
+        self._changed = threading.Condition(threading.Lock()) # Notified when an event is added or taken
+        self._thread = None
+        if handler is not None:
+            self._thread = threading.Thread(target=self._run, name='Bus-' + self.name, daemon=True)
+            self._thread.start()
+
+    def _drop(self):
+        self.dropped += 1
+        self._dropped_counter.inc()
+
+    def offer(self, event):
+        """Queues event without waiting, except under BLOCK. Returns False if it was dropped."""
+        with self._changed:
+            if self.closed:
+                return False
+            if len(self.queue) >= self.maxsize:
+                if self.overflow == DROP_OLDEST:
+                    self.queue.popleft()
+                    self._drop()
+                elif self.overflow == DROP_NEWEST or not self._changed.wait_for(
+                        lambda: len(self.queue) < self.maxsize or self.closed, self.block_timeout) or self.closed:
+                    self._drop()
+                    return False
+            self.queue.append(event)
+            self._changed.notify_all()
+        return True
+
+    def get(self, timeout=None):
+        """The next event, or None if there was none within timeout or the subscription is closed and empty"""
+        with self._changed:
+            if not self._changed.wait_for(lambda: self.queue or self.closed, timeout) or not self.queue:
+                return None
+            event = self.queue.popleft()
+            if self.overflow == BLOCK:
+                self._changed.notify_all()
+            return event
+
+    def _run(self):
+        while True:
+            event = self.get()
+            if event is None:
+                return
+            try:
+                self.handler(event)
+            except Exception:
+                logger.exception("Bus subscriber %s failed on %r", self.name, event)
+
+    def close(self, timeout=CLOSE_TIMEOUT):
+        """Stops taking events. The handler still gets the queued ones, for up to timeout seconds."""
+        self.bus.unsubscribe(self)
+        with self._changed:
+            self.closed = True
+            self._changed.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+
+class EventBus:
+
+    def __init__(self):
+        self.subscriptions = ()
+        self._routes = {} # Event class -> subscriptions that want it, rebuilt when they change
+        self._lock = threading.Lock()
+
+    def subscribe(self, handler=None, kinds=(Event,), **options):
+        """Subscribes to the events that are instances of kinds (a class or a tuple of them). options are those of
+           Subscription. Returns the Subscription; close it to unsubscribe."""
+        subscription = Subscription(self, kinds, handler, **options)
+        with self._lock:
+            self.subscriptions += (subscription,)
+            self._routes = {}
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self.subscriptions = tuple(s for s in self.subscriptions if s is not subscription)
+            self._routes = {}
+
+    def _route(self, kind):
+        with self._lock: # So a route is never built from the subscriptions before a change and kept after it
+            subscriptions = tuple(s for s in self.subscriptions if issubclass(kind, s.kinds))
+            self._routes[kind] = subscriptions
+        return subscriptions
+
+    def wants(self, kind):
+        """Whether anyone subscribes to events of class kind, so publishers can skip building them"""
+        subscriptions = self._routes.get(kind)
+        if subscriptions is None:
+            subscriptions = self._route(kind)
+        return bool(subscriptions)
+
+    def publish(self, event):
+        subscriptions = self._routes.get(type(event))
+        if subscriptions is None:
+            subscriptions = self._route(type(event))
+        for subscription in subscriptions:
+            subscription.offer(event)
+
+    def close(self):
+        for subscription in self.subscriptions:
+            subscription.close()
@@ -0,0 +1,158 @@
+"""Checkpoints of an account's rates and current trades, so a restart carries on trading where it stopped.
+
+A Checkpointer thread reads the state every CHECKPOINT_INTERVAL seconds and, only if it
+changed, appends it to the state file as one JSON line. A line is a few hundred bytes,
+and appending it takes one small write with no rename. The file is rewritten with just its
+last line once it has COMPACT_LINES lines. A line cut short by a crash is skipped.
+
+restore_state() loads the last line at startup. The rates are only restored if the
+checkpoint is younger than the traders' reset_time, since the bot would reset older
+rates anyway. A current trade is kept as the trader's saved_trade, with the balance of its currency when
+it was saved, and the trader checks it against the open bids and balance of its first
+refresh (Trader.resume_trade) before trusting it.
+Rates are saved in units, with the RATE_SCALE they were saved with."""
+from collections import deque
+from .units import RATE_SCALE
+
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = 'bot_state.jsonl'
+CHECKPOINT_INTERVAL = 1 # Seconds between checks for a changed state
+COMPACT_LINES = 1000 # Lines in the state file before it is rewritten with only the last one
+RATE_NAMES = ('last_tix_rate', 'last_robux_rate', 'current_tix_rate', 'current_robux_rate')
+TRADE_FIELDS = ('amount1', 'amount2', 'remaining1', 'type1', 'type2', 'start_rate', 'current_rate', 'seconds_time')
+
+
+def account_state(account):
+    """The state of account worth keeping, as a dict that json can write"""
+    rates = account.rates
+    traders = {}
+    for currency, trader in account.traders.items():
+        trade = trader.current_trade
+        traders[currency] = {
+            'trade': dict({field: getattr(trade, field) for field in TRADE_FIELDS},
+                          balance=trader.panel.balances[currency]) if trade else None,
+            'last_trade_start_time': trader.last_trade_start_time,
+            'last_traded_time': trader.last_traded_time,
+        }
+    return {
+        'username': account.username,
+        'rate_scale': RATE_SCALE,
+        'rates': {name: rates[name] for name in RATE_NAMES},
+        'past_tix_rates': list(rates.past_tix_rates),
+        'past_robux_rates': list(rates.past_robux_rates),
+        'traders': traders,
+    }
+
+
+def read_state(path=STATE_FILE):
+    """The last complete state in path, or None"""
+    try:
+        with open(path, 'rb') as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return None
+    for line in reversed(lines):
+        try:
+            return json.loads(line.decode())
+        except ValueError: # Cut short by a crash
+            continue
+    return None
+
+
+def restore_state(account, path=STATE_FILE):
+    """Loads the last checkpoint of account from path. Returns whether there was one to use."""
+    state = read_state(path)
+    if not state or state.get('username') != account.username:
+        return False
+    if state.get('rate_scale') != RATE_SCALE: # Saved before rates were units, or with other units
+        logger.info("Checkpoint rates are not in units of 1/%d, starting with fresh rates", RATE_SCALE)
+        return False
+    age = account.clock.time() - state['saved']
+    traders = account.traders.values()
+    reset_time = min((trader.params.reset_time for trader in traders), default=account.params.reset_time)
+    if age > reset_time:
+        logger.info("Checkpoint is %.0f seconds old, starting with fresh rates", age)
+        return False
+    rates = account.rates
+    for name in RATE_NAMES:
+        rates[name] = state['rates'][name]
+    for name in ('past_tix_rates', 'past_robux_rates'):
+        rates[name] = deque(state[name], maxlen=rates[name].maxlen)
+    for currency, saved in state['traders'].items():
+        trader = account.traders.get(currency)
+        if trader:
+            trader.last_trade_start_time = saved['last_trade_start_time']
+            trader.last_traded_time = saved['last_traded_time']
+            trader.saved_trade = saved['trade']
+    print("Restored the rates and trades of {} from {:.0f} seconds ago".format(account.username, age))
+    return True
+
+
+class Checkpointer:
+
+    """Appends account_state(account) to path whenever it changes"""
+
+    def __init__(self, account, path=STATE_FILE, interval=CHECKPOINT_INTERVAL):
+        self.account = account
+        self.path = path
+        self.interval = interval
+        self.last_state = None
+        self.lines = self._count_lines()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def _count_lines(self):
+        try:
+            with open(self.path, 'rb') as f:
+                return sum(1 for _ in f)
+        except FileNotFoundError:
+            return 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='Checkpointer', daemon=True)
+        self._thread.start()
+        return self
+
+    def checkpoint(self):
+        """Writes the state if it changed since the last write. Returns whether it wrote."""
+        with self._lock:
+            try:
+                state = account_state(self.account)
+            except RuntimeError: # A deque changed while it was copied, try again next time
+                return False
+            if state == self.last_state:
+                return False
+            self.last_state = state
+            line = json.dumps(dict(state, saved=self.account.clock.time())) + '\n'
+            if self.lines >= COMPACT_LINES:
+                temp_path = self.path + '.tmp'
+                with open(temp_path, 'w') as f:
+                    f.write(line)
+                os.replace(temp_path, self.path)
+                self.lines = 1
+            else:
+                with open(self.path, 'a') as f:
+                    f.write(line)
+                self.lines += 1
+            return True
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                self.checkpoint()
+            except OSError as e:
+                logger.warning("Could not write %s: %s", self.path, e)
+
+    def stop(self):
+        """Stops the thread and writes the final state"""
+        self._stopping.set()
+        if self._thread:
+            self._thread.join()
+        self.checkpoint()
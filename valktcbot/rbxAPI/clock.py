@@ -0,0 +1,153 @@
+"""Time sources for traders and trades, so the same code can run live or in simulated time.
+
+A Scheduler runs callbacks at given times of a clock. With the RealClock a thread waits
+for them (see TraderPool). With a SimClock nothing waits: run_until() runs the timers on
+the calling thread in order of their due time, then of scheduling, and moves the clock
+to each one, so a simulated hour of trading takes as long as its ticks do and runs the
+same way every time."""
+from itertools import count
+
+import datetime
+import heapq
+import threading
+import time
+
+
+class RealClock:
+
+    """Wall clock time"""
+
+    virtual = False
+
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def now(self):
+        return datetime.datetime.now()
+
+
+class SimClock:
+
+    """Simulated time that only moves when sleep() or advance_to() is called, so nothing ever waits"""
+
+    virtual = True
+
+    def __init__(self, start=0.0):
+        self.current = start
+
+    def time(self):
+        return self.current
+
+    def sleep(self, seconds):
+        self.current += seconds
+
+    def advance_to(self, t):
+        if t > self.current:
+            self.current = t
+
+    def now(self):
+        return datetime.datetime.fromtimestamp(self.current)
+
+
+real_clock = RealClock()
+
+
+class Timer:
+
+    def __init__(self, due, callback, args):
+        self.due = due
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        return self.callback(*self.args)
+
+
+class Scheduler:
+
+    """Timers on a clock, taken off in order of (due time, order scheduled)"""
+
+    def __init__(self, clock=real_clock):
+        self.clock = clock
+        self.running = True
+        self._queue = [] # Heap of (due time, order, Timer)
+        self._order = count()
+        self._cond = threading.Condition()
+
+    def call_at(self, when, callback, *args):
+        """Runs callback(*args) at clock time when. Returns a Timer that can be cancelled."""
+        timer = Timer(when, callback, args)
+        with self._cond:
+            heapq.heappush(self._queue, (when, next(self._order), timer))
+            self._cond.notify()
+        return timer
+
+    def call_later(self, delay, callback, *args):
+        return self.call_at(self.clock.time() + delay, callback, *args)
+
+    def next_due(self):
+        """Due time of the next timer, or None if there is none"""
+        with self._cond:
+            self._drop_cancelled()
+            return self._queue[0][0] if self._queue else None
+
+    def _drop_cancelled(self):
+        while self._queue and self._queue[0][2].cancelled:
+            heapq.heappop(self._queue)
+
+    def next_timer(self):
+        """Waits until the next timer is due and takes it off, or returns None once stopped.
+           A virtual clock is moved to the timer instead, and None is returned when there are no timers left."""
+        with self._cond:
+            while self.running:
+                self._drop_cancelled()
+                if self._queue:
+                    due = self._queue[0][0]
+                    if self.clock.virtual:
+                        self.clock.advance_to(due)
+                    wait = due - self.clock.time()
+                    if wait <= 0:
+                        return heapq.heappop(self._queue)[2]
+                elif self.clock.virtual:
+                    return None
+                else:
+                    wait = None
+                self._cond.wait(wait)
+            return None
+
+    def run_until(self, end):
+        """Runs the timers due up to clock time end on this thread, including the ones they schedule.
+           A virtual clock finishes at end. Returns how many timers ran."""
+        ran = 0
+        while self.running:
+            due = self.next_due()
+            if due is None or due > end:
+                break
+            timer = self.next_timer()
+            if timer is None:
+                break
+            timer.run()
+            ran += 1
+        if self.clock.virtual:
+            self.clock.advance_to(end)
+        return ran
+
+    def clear(self):
+        with self._cond:
+            self._queue.clear()
+
+    def stop(self):
+        with self._cond:
+            self.running = False
+            self._queue.clear()
+            self._cond.notify_all()
+
+    def __len__(self):
+        return sum(1 for due, order, timer in self._queue if not timer.cancelled)
@@ -0,0 +1,223 @@
+"""Reading config.ini without the GUI, and applying its [Engine] and [Retry] sections while the bot runs.
+
+[Engine] holds the TraderParams (delay, rgap, tgap, trade_lag_time, lag_quantile, ...) and max_workers.
+[Retry] holds the request policies as KIND_FIELD = value, such as refresh_deadline = 2 or
+submit_max_attempts = 3, plus failure_threshold and cooldown of the circuit breaker.
+Every value is checked before any of them is applied, so a bad edit changes nothing."""
+from .account import MAX_WORKERS
+from .params import default_params, RATE_PARAMS
+from .market import NUM_TRADES
+from .shutdown import SHUTDOWN_DEADLINE
+from .retry import POLICIES, RequestPolicy, FAILURE_THRESHOLD, COOLDOWN
+from .units import parse_rate, to_float, to_units
+
+import configparser
+import logging
+import os
+import threading
+
+CONFIG_FILE = 'config.ini'
+TRADER_SECTIONS = {
+    'Tickets': 'TixTrader',
+    'Robux': 'RobuxTrader',
+}
+BOT_SECTION = 'Bot'
+ENGINE_SECTION = 'Engine'
+RETRY_SECTION = 'Retry'
+WATCH_INTERVAL = 1 # Seconds between checks of config.ini for changes
+
+logger = logging.getLogger(__name__)
+
+# Allowed (low, high) of each setting, inclusive. Counts are whole numbers, the rest any number.
+# Rate params (params.RATE_PARAMS) are checked as written and kept in rate units.
+COUNTS = {'deque_size', 'num_trades', 'max_workers', 'max_attempts', 'failure_threshold'}
+ENGINE_LIMITS = {
+    'delay': (0, 10),
+    'rgap': (.0001, 1),
+    'tgap': (.0001, 1),
+    'trade_lag_time': (0, 60),
+    'reset_time': (1, 86400),
+    'deque_size': (1, 1000),
+    'tolerance_base': (0, 1),
+    'tolerance_step': (0, 1),
+    'tolerance_max': (0, 1),
+    'num_trades': (1, NUM_TRADES), # No more than the page shows, or every search would look cut off
+    'lag_quantile': (0, 1),
+    'max_workers': (1, 64),
+}
+POLICY_LIMITS = {
+    'deadline': (.1, 120),
+    'connect_timeout': (.1, 60),
+    'read_timeout': (.1, 60),
+    'backoff': (0, 10),
+    'max_attempts': (1, 20),
+}
+BREAKER_LIMITS = {
+    'failure_threshold': (1, 1000),
+    'cooldown': (0, 3600),
+}
+
+
+def new_config():
+    config = configparser.ConfigParser()
+    config.optionxform = str # Keep logger names like rbxAPI.actions as written
+    return config
+
+
+def read_config(path=CONFIG_FILE):
+    config = new_config()
+    with open(path, 'r') as f:
+        config.read_file(f)
+    for section in TRADER_SECTIONS.values():
+        if not config.has_section(section):
+            raise configparser.NoSectionError(section)
+    return config
+
+
+def trader_settings(config, currency):
+    """The trader options for currency, as the GUI's option widgets would set them"""
+    settings = config[TRADER_SECTIONS[currency]]
+    return {
+        'split_trades': 'on' if settings.getboolean('split_trades') else '',
+        'amount': int(settings['amount_to_trade']),
+        'trade_all': settings.getboolean('trade_all'),
+        'early_cancel': settings.getboolean('early_cancel'),
+        'threshold_rate': parse_rate(settings['threshold_rate']),
+    }
+
+
+def bot_settings(config):
+    """Options for the whole bot from the optional [Bot] section"""
+    return {
+        'parse_process': config.getboolean(BOT_SECTION, 'parse_process', fallback=False),
+        'metrics_port': config.getint(BOT_SECTION, 'metrics_port', fallback=0), # 0 to not serve metrics
+        'watch_config': config.getboolean(BOT_SECTION, 'watch_config', fallback=True),
+        'remember_login': config.getboolean(BOT_SECTION, 'remember_login', fallback=True), # Keep cookies on disk
+        'remember_state': config.getboolean(BOT_SECTION, 'remember_state', fallback=True), # Checkpoint rates and trades
+        'shutdown_deadline': config.getfloat(BOT_SECTION, 'shutdown_deadline', fallback=SHUTDOWN_DEADLINE),
+        'speculate': config.getboolean(BOT_SECTION, 'speculate', fallback=True), # Balance orders during refreshes
+        'publish_book': config.get(BOT_SECTION, 'publish_book', fallback=''), # Shared book to write, see sharedbook.py
+        'read_book': config.get(BOT_SECTION, 'read_book', fallback=''), # Shared book of another bot to read
+    }
+
+
+def apply_trader_config(trader, config):
+    for option, value in trader_settings(config, trader.currency).items():
+        trader.set_config(option, value)
+
+
+def _number(config, section, option, default, limits, kind=float):
+    """option of section, within limits, or default if it is not set"""
+    if not config.has_option(section, option):
+        return default
+    text = config.get(section, option)
+    try:
+        value = kind(text)
+    except ValueError:
+        raise ValueError("[{}] {} = {!r} is not {}".format(section, option, text,
+                                                           'a whole number' if kind is int else 'a number'))
+    low, high = limits
+    if not low <= value <= high:
+        raise ValueError("[{}] {} = {} is not between {} and {}".format(section, option, value, low, high))
+    return value
+
+
+def _unknown_options(config, section, known):
+    if config.has_section(section):
+        unknown = set(config[section]) - set(known)
+        if unknown:
+            raise ValueError("Unknown option(s) in [{}]: {}".format(section, ', '.join(sorted(unknown))))
+
+
+def engine_settings(config):
+    """(TraderParams, max_workers) from the [Engine] section. Raises ValueError for a bad value."""
+    defaults = dict(default_params.as_dict(), max_workers=MAX_WORKERS)
+    for name in RATE_PARAMS:
+        defaults[name] = to_float(defaults[name])
+    _unknown_options(config, ENGINE_SECTION, defaults)
+    values = {name: _number(config, ENGINE_SECTION, name, default, ENGINE_LIMITS[name],
+                            int if name in COUNTS else float)
+              for name, default in defaults.items()}
+    for name in RATE_PARAMS:
+        values[name] = to_units(values[name])
+    if values['tolerance_base'] > values['tolerance_max']:
+        raise ValueError("[{}] tolerance_base is above tolerance_max".format(ENGINE_SECTION))
+    max_workers = values.pop('max_workers')
+    return default_params.replace(**values), max_workers
+
+
+def retry_settings(config):
+    """({kind: RequestPolicy}, failure_threshold, cooldown) from the [Retry] section.
+       Raises ValueError for a bad value."""
+    options = {'{}_{}'.format(kind, field) for kind in POLICIES for field in POLICY_LIMITS}
+    _unknown_options(config, RETRY_SECTION, options | set(BREAKER_LIMITS))
+    policies = {}
+    for kind, policy in POLICIES.items():
+        values = {field: _number(config, RETRY_SECTION, '{}_{}'.format(kind, field), getattr(policy, field), limits,
+                                 int if field in COUNTS else float)
+                  for field, limits in POLICY_LIMITS.items()}
+        policies[kind] = RequestPolicy(retry_reads=policy.retry_reads, **values)
+    failure_threshold = _number(config, RETRY_SECTION, 'failure_threshold', FAILURE_THRESHOLD,
+                                BREAKER_LIMITS['failure_threshold'], int)
+    cooldown = _number(config, RETRY_SECTION, 'cooldown', COOLDOWN, BREAKER_LIMITS['cooldown'])
+    return policies, failure_threshold, cooldown
+
+
+def apply_engine_config(account, config):
+    """Checks [Engine] and [Retry] and applies them to account and its running traders.
+       Traders pick up the new TraderParams at the start of their next tick."""
+    params, max_workers = engine_settings(config)
+    policies, failure_threshold, cooldown = retry_settings(config)
+    account.set_params(params)
+    account.set_max_workers(max_workers)
+    account.set_request_policies(policies, failure_threshold, cooldown)
+
+
+class ConfigWatcher:
+
+    """Calls on_change(config) on a daemon thread whenever the config file is saved.
+       If reading or applying it fails, the error is printed and the old settings stay."""
+
+    def __init__(self, on_change, path=CONFIG_FILE, interval=WATCH_INTERVAL):
+        self.on_change = on_change
+        self.path = path
+        self.interval = interval
+        self.mtime = self._mtime()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def _mtime(self):
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='ConfigWatcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def check(self):
+        """Applies the file if it changed since the last check. Returns whether it was applied."""
+        mtime = self._mtime()
+        if mtime is None or mtime == self.mtime:
+            return False
+        self.mtime = mtime
+        try:
+            config = read_config(self.path)
+            self.on_change(config)
+        except (OSError, configparser.Error, KeyError, ValueError) as e:
+            print("{} not applied: {}".format(self.path, e))
+            return False
+        print("Applied changes to {}".format(self.path))
+        return True
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.exception('%s', e)
+
+    def stop(self):
+        self._stopping.set()
@@ -0,0 +1,74 @@
+"""The login cookies of an account on disk, so a restart can skip the login POST.
+
+The file holds the session cookies, which are as good as the password for as long as
+they are valid, so it is only readable by its owner (mode 0600 where the OS supports it)
+and is replaced atomically. resume_login in actions.py loads it and checks it with one
+fetch of the trade currency page before the bot trusts it."""
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+COOKIE_FILE = 'session.cookies'
+COOKIE_FIELDS = ('name', 'value', 'domain', 'path', 'secure', 'expires')
+
+
+def save_cookies(account, path=COOKIE_FILE):
+    """Writes the cookies of account's session to path, readable only by the owner"""
+    state = {
+        'username': account.username,
+        'saved': time.time(),
+        'cookies': [{field: getattr(cookie, field) for field in COOKIE_FIELDS} for cookie in account.session.cookies],
+    }
+    temp_path = path + '.tmp'
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        os.chmod(temp_path, 0o600) # In case the file already existed with other permissions
+        with os.fdopen(fd, 'w') as f:
+            json.dump(state, f)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    os.replace(temp_path, path)
+
+
+def saved_username(path=COOKIE_FILE):
+    """The username whose cookies are saved at path, or None"""
+    try:
+        with open(path) as f:
+            return json.load(f).get('username')
+    except (OSError, ValueError):
+        return None
+
+
+def load_cookies(account, username, path=COOKIE_FILE):
+    """Puts the saved cookies of username into account's session. Returns False if there are none
+       that have not expired."""
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return False
+    except (OSError, ValueError) as e:
+        logger.warning("Could not read %s: %s", path, e)
+        return False
+    if (state.get('username') or '').lower() != username.lower():
+        return False
+    now = time.time()
+    loaded = 0
+    for cookie in state.get('cookies', []):
+        if cookie.get('expires') and cookie['expires'] <= now:
+            continue
+        account.session.cookies.set(cookie['name'], cookie['value'], domain=cookie['domain'], path=cookie['path'],
+                                    secure=cookie['secure'], expires=cookie['expires'])
+        loaded += 1
+    return loaded > 0
+
+
+def forget_cookies(path=COOKIE_FILE):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
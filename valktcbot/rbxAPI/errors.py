@@ -82,4 +82,14 @@ class OurTradeError(Exception):
 
 class ThresholdRateError(Exception):
 
-    """Raised when current trade rate is worse than our user's settings rate"""
\ No newline at end of file
+    """Raised when current trade rate is worse than our user's settings rate"""
+
+class CircuitOpenError(Exception):
+
+    """Raised instead of sending a request while too many requests in a row have failed"""
+
+    def __init__(self, retry_in):
+        self.msg = "Too many failed requests. Retrying in {:.1f} seconds".format(max(retry_in, 0))
+
+    def __str__(self):
+        return self.msg
@@ -0,0 +1,57 @@
+"""Signals for trade events.
+
+The GUI imports PySide before rbxAPI, in which case the real Qt classes are used so slots
+still run on the GUI thread. Otherwise (headless mode) Qt is never imported and a small
+pure Python dispatcher with the same connect/emit interface is used instead."""
+import sys
+import threading
+
+HEADLESS = 'PySide.QtCore' not in sys.modules
+
+if HEADLESS:
+
+    class BoundSignal:
+
+        def __init__(self):
+            self._slots = []
+            self._lock = threading.Lock()
+
+        def connect(self, slot):
+            with self._lock:
+                self._slots = self._slots + [slot]
+
+        def disconnect(self, slot):
+            with self._lock:
+                self._slots = [s for s in self._slots if s != slot]
+
+        def emit(self, *args):
+            # Slots run on the emitting thread
+            for slot in self._slots:
+                slot(*args)
+
+    class Signal:
+
+        """Class attribute that gives each instance its own BoundSignal, like Qt's Signal"""
+
+        def __init__(self, *types):
+            self.types = types
+            self.name = None
+
+        def __set_name__(self, owner, name):
+            self.name = '_signal_' + name
+
+        def __get__(self, inst, owner):
+            if inst is None:
+                return self
+            bound = inst.__dict__.get(self.name)
+            if bound is None:
+                bound = inst.__dict__.setdefault(self.name, BoundSignal())
+            return bound
+
+    class QObject:
+
+        def __init__(self, parent=None):
+            pass
+
+else:
+    from PySide.QtCore import Signal, QObject
@@ -0,0 +1,157 @@
+"""Reading and posting the trade currency page of one account.
+
+Traders only talk to an exchange through fetch(), submit_trade() and cancel_bid(),
+so the same trader code can run against the live site or a simulated one.
+
+Parsing a page holds the GIL for most of a tick. With a ProcessParser on the account,
+pages are parsed in a worker process instead and only the small snapshots come back,
+so the other trader and the GUI keep running while a page is parsed."""
+from .rbx_data import data, TC_URL
+from .market import parse_market
+from .utils import LazyModule, to_num
+
+import logging
+
+html = LazyModule('lxml.html')
+requests = LazyModule('requests')
+multiprocessing = LazyModule('multiprocessing')
+futures_process = LazyModule('concurrent.futures.process') # Imports multiprocessing, only needed with a ProcessParser
+logger = logging.getLogger(__name__)
+
+PARSE_WORKERS = 1 # Worker processes of a ProcessParser
+
+
+class AccountSnapshot:
+
+    """Our balances and open bids from one fetch of the trade currency page.
+       open_bids holds the remaining amount of each open bid, top row first."""
+
+    def __init__(self, balances, open_bids, active, viewstate=None, eventvalidation=None):
+        self.balances = balances
+        self.open_bids = open_bids
+        self.active = active # Whether the open bids panel shows any trade
+        self.viewstate = viewstate
+        self.eventvalidation = eventvalidation
+
+    def remainder(self, currency, index=1):
+        """Remaining amount of our open bid at index (Starting at index = 1), 0 if there is none"""
+        bids = self.open_bids[currency]
+        if index > len(bids):
+            return 0
+        return bids[index - 1]
+
+
+def _input_value(tree, path):
+    found = tree.xpath(path)
+    return found[0].attrib['value'] if found else None
+
+
+def parse_account(tree):
+    balances, open_bids, active = {}, {}, {}
+    for currency in ('Tickets', 'Robux'):
+        balance = tree.xpath(data[currency]['current'])
+        if not balance:
+            raise requests.exceptions.ConnectionError
+        balances[currency] = to_num(balance[0])
+        bids = []
+        for row in tree.xpath(data[currency]['open_trades']):
+            remainder = row.xpath('td[2]/text()')
+            bids.append(to_num(remainder[0]) if remainder else 0)
+        open_bids[currency] = bids
+        active[currency] = tree.xpath(data[currency]['trades']) == [] # No "NoResults" message
+    return AccountSnapshot(balances, open_bids, active,
+                           _input_value(tree, data['VIEWSTATE']), _input_value(tree, data['EVENTVALIDATION']))
+
+
+def parse_page(page, encoding=None, with_market=True, snapshot_time=None):
+    """(MarketSnapshot or None, AccountSnapshot) of a trade currency page given as text or bytes"""
+    if encoding:
+        page = page.decode(encoding)
+    tree = html.fromstring(page)
+    return (parse_market(tree, snapshot_time=snapshot_time) if with_market else None), parse_account(tree)
+
+
+def load_parser():
+    """Imports lxml and parses a scrap of html, so the first page does not pay for either"""
+    html.fromstring('<p></p>')
+
+
+class ProcessParser:
+
+    """Parses pages in worker processes. The page bytes are sent undecoded, so the
+       trading thread only waits on the pipe, not on decoding or lxml."""
+
+    def __init__(self, workers=PARSE_WORKERS):
+        self.workers = workers
+        self.executor = self._make_executor()
+
+    def _make_executor(self):
+        # spawn, since forking a process that runs threads (and Qt) is unsafe
+        executor = futures_process.ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        executor.submit(load_parser) # Start the workers and import lxml before the first page
+        return executor
+
+    def parse(self, content, encoding=None, with_market=True, snapshot_time=None):
+        try:
+            return self.executor.submit(parse_page, content, encoding, with_market, snapshot_time).result()
+        except futures_process.BrokenProcessPool:
+            logger.warning("Parser process died, starting a new one")
+            self.executor = self._make_executor()
+            return parse_page(content, encoding, with_market, snapshot_time)
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+class LiveExchange:
+
+    def __init__(self, account, url=TC_URL):
+        self.account = account
+        self.url = url # The trade currency page, or a stand-in of it (see standin.py)
+
+    def fetch(self):
+        """Gets a fresh page and returns its (MarketSnapshot, AccountSnapshot). The snapshot's time is when
+           the page was requested."""
+        requested = self.account.clock.time()
+        r = self.account.http.get('refresh', self.url).result()
+        # With a shared feed, the market part is only parsed if no other account got a page as new as ours
+        feed = self.account.feed
+        feed_market = feed.since(requested) if feed else None
+        parser = self.account.parser
+        if parser:
+            market, panel = parser.parse(r.content, r.encoding, feed_market is None, requested)
+        else:
+            market, panel = parse_page(r.text, with_market=feed_market is None, snapshot_time=requested)
+        if feed_market:
+            return feed_market, panel
+        if feed:
+            feed.offer(market)
+        return market, panel
+
+    def get_auth_tools(self, panel):
+        # VIEWSTATE and EVENTVALIDATION must be from the same session
+        if panel.viewstate is None or panel.eventvalidation is None:
+            raise requests.exceptions.ConnectionError
+        return {
+            '__VIEWSTATE': panel.viewstate,
+            '__EVENTVALIDATION': panel.eventvalidation,
+        }
+
+    def submit_trade(self, panel, currency, other_currency, amount_to_give, amount_to_receive, split_trades):
+        payload = {
+            data['give_type']: currency,
+            data['receive_type']: other_currency,
+            data['limit_order']: 'LimitOrderRadioButton',
+            data['split_trades']: split_trades,
+            data['give_box']: str(amount_to_give),
+            data['receive_box']: str(amount_to_receive),
+            '__EVENTTARGET': data['submit_trade_button'],
+        }
+        payload.update(self.get_auth_tools(panel))
+        return self.account.http.post('submit', self.url, data=payload)
+
+    def cancel_bid(self, panel, currency, index):
+        """Cancels our open bid at index (Starting at index = 1)"""
+        payload = {'__EVENTTARGET': data[currency]['cancel_bid'](index)}
+        payload.update(self.get_auth_tools(panel))
+        return self.account.http.post('cancel', self.url, data=payload)
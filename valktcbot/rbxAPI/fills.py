@@ -0,0 +1,153 @@
+"""Fill events from the difference between consecutive open bid panels.
+
+The page only shows the remaining amount of each of our open bids, so fills have to be
+read from how that changes between refreshes. A FillTracker keeps the panel of the
+last refresh of one currency and what the trader last did (submitted a bid, asked for a
+cancel), and turns each new panel into typed events:
+
+    PartialFill        our bid's remainder went down
+    FullFill           our bid is gone without a cancel, or never showed up in trade_lag_time
+                       although our balance paid for it
+    CancelAcknowledged our bid is gone after we cancelled it
+    RejectedBid        a submitted bid never showed up and our balance never paid for it
+    GhostBid           an open bid we did not submit
+    DuplicateBid       more than one open bid, usually a submit repeated by server lag
+
+Trader.refresh passes the events to TradeLog.record_fill, which keeps them and emits
+fill_event, and publishes them on the account's bus. The trader's current trade follows
+the tracker: its remainder is tracked, its rate is remembered after a PartialFill, and
+it is completed on a FullFill or RejectedBid, or once its bid has been gone for a while
+without either (see Trader.fully_complete_trade). The trading decisions still read the
+snapshots (see kernel.py)."""
+from .bus import Event
+
+
+class FillEvent(Event):
+    pass
+
+
+class PartialFill(FillEvent):
+
+    def __init__(self, currency, time, amount, remaining):
+        super().__init__(currency, time)
+        self.amount = amount # Filled since the last refresh
+        self.remaining = remaining
+
+
+class FullFill(FillEvent):
+
+    def __init__(self, currency, time, amount):
+        super().__init__(currency, time)
+        self.amount = amount # The remainder that was filled
+
+
+class CancelAcknowledged(FillEvent):
+
+    def __init__(self, currency, time, remaining):
+        super().__init__(currency, time)
+        self.remaining = remaining # Unfilled amount returned to us
+
+
+class RejectedBid(FillEvent):
+
+    def __init__(self, currency, time, amount):
+        super().__init__(currency, time)
+        self.amount = amount
+
+
+class GhostBid(FillEvent):
+
+    def __init__(self, currency, time, remaining):
+        super().__init__(currency, time)
+        self.remaining = remaining
+
+
+class DuplicateBid(FillEvent):
+
+    def __init__(self, currency, time, bids):
+        super().__init__(currency, time)
+        self.bids = bids # Remainders of every open bid
+
+
+class FillTracker:
+
+    """Diffs the open bids of one currency from refresh to refresh"""
+
+    def __init__(self, currency, lag=None):
+        self.currency = currency
+        self.lag = lag # LagEstimator given the time each submit and cancel took to show
+        self.bids = None # Remainders shown by the last panel, None before the first
+        self.tracked = None # Remainder of the bid we believe is ours
+        self.cancelled = False # Whether we asked to cancel the tracked bid
+        self.cancel_time = None # When we asked
+        self.submitted = None # [time, amount, cancelled, available] of a submit that has not shown up yet
+
+    def expect_bid(self, amount, now, available):
+        """Called when we submit a bid. available is our balance once the bids cancelled for it are refunded."""
+        self.submitted = [now, amount, False, available]
+
+    def expect_cancel(self, now):
+        """Called when we cancel our bids"""
+        self.cancelled = True
+        self.cancel_time = now
+        if self.submitted:
+            self.submitted[2] = True
+
+    def track(self, remaining):
+        """Takes an open bid as ours without a submit, such as a trade resumed from a checkpoint"""
+        self.tracked = remaining
+        self.cancelled = False
+
+    def replaced(self, now, lag_time):
+        """Whether the tracked bid was cancelled for the pending submit more than lag_time ago, so a bid of the
+           same amount is the submitted one and not the tracked one left unchanged"""
+        return self.cancelled and now - self.submitted[0] > lag_time
+
+    def observe(self, bids, balance, now, lag_time):
+        """The events between the last panel and this one, given as the remainders of our open bids and our
+           balance, at time now. A submitted bid that is not shown after lag_time seconds is taken as filled
+           if our balance went down by at least half of it (fills of the other currency may add some back)."""
+        previous, self.bids = self.bids, list(bids)
+        events = []
+        # A bid replaced by one of the same amount looks unchanged, so neither can be timed
+        timed = self.lag is not None and not (self.submitted and self.submitted[1] == self.tracked)
+        if len(bids) > 1 and len(previous or ()) != len(bids): # Once, not on every refresh until it is cleaned up
+            events.append(DuplicateBid(self.currency, now, list(bids)))
+        remaining = bids[0] if bids else None
+        if self.tracked is not None:
+            if remaining is not None and (self.submitted is None or
+                                          remaining == self.tracked and not self.replaced(now, lag_time)):
+                if remaining < self.tracked:
+                    events.append(PartialFill(self.currency, now, self.tracked - remaining, remaining))
+                self.tracked = remaining
+                return events
+            # Gone, or replaced by the bid we just submitted
+            if self.cancelled:
+                events.append(CancelAcknowledged(self.currency, now, self.tracked))
+                if timed:
+                    self.lag.observe('cancel', now - self.cancel_time)
+            else:
+                events.append(FullFill(self.currency, now, self.tracked))
+            self.tracked = None
+        if self.submitted is not None:
+            submit_time, amount, cancelled, available = self.submitted
+            if remaining is not None:
+                if timed:
+                    self.lag.observe('submit', now - submit_time)
+                if remaining < amount:
+                    events.append(PartialFill(self.currency, now, amount - remaining, remaining))
+                self.submitted = None
+                self.track(remaining)
+                self.cancelled = cancelled
+            elif now - submit_time > lag_time:
+                if balance > available - amount/2:
+                    events.append(RejectedBid(self.currency, now, amount))
+                elif cancelled:
+                    events.append(CancelAcknowledged(self.currency, now, amount))
+                else:
+                    events.append(FullFill(self.currency, now, amount))
+                self.submitted = None
+        elif remaining is not None:
+            events.append(GhostBid(self.currency, now, remaining))
+            self.track(remaining) # Report it once
+        return events
@@ -0,0 +1,341 @@
+"""The trading strategy as pure functions.
+
+Nothing here sends a request, sleeps or changes a trader: each function reads a
+TraderState, a MarketSnapshot and an AccountSnapshot and returns a value, or raises
+one of the strategy errors (WorseRateError, TradeGapError, ...) when there is no
+trade to make. decide() picks the next Action for one tick and the Trader classes
+carry it out, so the same decisions can be benchmarked or run over thousands of
+snapshots without HTTP or Qt. Rates are ints of rate units (see units.py)."""
+from .errors import *
+from .units import RATE_SCALE, STEP, floor_step, ceil_step, ratio_floor, ratio_ceil, to_float
+from .utils import LazyModule
+
+import math
+
+requests = LazyModule('requests')
+
+OTHER_CURRENCY = {'Tickets': 'Robux', 'Robux': 'Tickets'}
+
+
+class TraderState:
+
+    """Everything a decision depends on besides the snapshots. Trader.state() builds one.
+       rates and current_trade are the trader's own objects and are only read."""
+
+    def __init__(self, currency, rates, config, params, current_trade=None, holds_top_trade=False,
+                 other_holds_top_trade=False, now=0.0, last_trade_start_time=0.0, trade_lag_time=None, orders=None):
+        self.currency = currency
+        self.other_currency = OTHER_CURRENCY[currency]
+        self.rates = rates
+        self.config = config
+        self.params = params
+        self.current_trade = current_trade # Trade, or anything with start_rate, current_rate and remaining1
+        self.holds_top_trade = holds_top_trade
+        self.other_holds_top_trade = other_holds_top_trade
+        self.now = now
+        self.last_trade_start_time = last_trade_start_time
+        self.trade_lag_time = params.trade_lag_time if trade_lag_time is None else trade_lag_time # Measured, if known
+        self.orders = orders # OrderCache of balanced amounts worked out ahead of time (see speculate.py), or None
+
+
+class Action:
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.__dict__ == other.__dict__
+
+    def __repr__(self):
+        return "{}({})".format(type(self).__name__, ', '.join('{}={!r}'.format(*item) for item in self.__dict__.items()))
+
+
+class Hold(Action):
+    """Leave our bid as it is"""
+
+
+class Replace(Action):
+
+    """Cancel our bid, if any, and submit give for receive at rate"""
+
+    def __init__(self, give, receive, rate):
+        self.give = give
+        self.receive = receive
+        self.rate = rate
+
+
+class Complete(Action):
+    """Our bid is gone and has had time to show as filled: log the current trade as complete, then decide again"""
+
+
+class Cancel(Action):
+    """Cancel every bid of ours"""
+
+
+class CancelOthers(Action):
+    """Cancel every bid but the one of the current trade"""
+
+
+def better_rate(currency, rate):
+    """A rate one step better than rate in the column of currency"""
+    if currency == 'Tickets':
+        return rate + STEP
+    return rate - STEP
+
+
+def get_tolerance(amount, params):
+    """A magical function that determines the minimum % (in decimal) to trade"""
+    if amount//10 == 0:
+        return params.tolerance_base
+    return min(params.tolerance_base + params.tolerance_step*math.floor(math.log(amount//10, 10)),
+               params.tolerance_max)
+
+
+def amount_to_trade(state, panel):
+    our_money = panel.balances[state.currency]
+    if state.config['trade_all']:
+        if panel.active[state.currency]:
+            return our_money + panel.remainder(state.currency)
+        return our_money
+    amount = state.config['amount']
+    if not amount or amount > our_money + panel.remainder(state.currency):
+        raise NoMoneyError(state.currency)
+    return amount
+
+
+def threshold_rate(state, market):
+    """Gets the worst possible rate to trade at, so we don't go beyond it"""
+    other = state.other_currency
+    other_top_rate = market.tix_rate if other == 'Tickets' else market.robux_rate
+    other_second_top_rate = market.trade_info(other, 2)[1]
+    if state.holds_top_trade or market.spread >= 0:
+        return other_top_rate
+    if state.other_holds_top_trade:
+        # The spread is forcibly negative due to your split trade
+        # In this case, get the second highest trade rate of the other currency.
+        return other_second_top_rate
+    if state.current_trade: # A better rate exists on our currency and goes below spread
+        return other_top_rate # Use the top rate on the other currency, since our trade may be the 2nd best
+    # No trades exist and spread is negative. Match the second best trade in this category.
+    return other_second_top_rate
+
+
+def rate_problem(state, rate, this_top_rate, threshold_rate):
+    """Why rate is not a better and profit making rate to trade at ('gap', 'threshold', 'worse_than_last',
+       'bad_spread' or 'worse_than_threshold'), or None if it is. A search can skip a rate without raising."""
+    threshold_setting = state.config['threshold_rate']
+    if state.currency == 'Tickets':
+        last_rate = state.rates.last_robux_rate
+        if not state.holds_top_trade and rate - this_top_rate >= state.params.tgap:
+            return 'gap'
+        if threshold_setting and rate > threshold_setting:
+            return 'threshold'
+        if last_rate and rate > ceil_step(last_rate): # Rounding up may cause loss at up to 4th decimal point
+            return 'worse_than_last'
+        elif not last_rate:
+            if not threshold_rate:
+                return 'bad_spread'
+            if floor_step(rate) > threshold_rate:
+                return 'worse_than_threshold'
+    else:
+        last_rate = state.rates.last_tix_rate
+        if not state.holds_top_trade and this_top_rate - rate >= state.params.rgap:
+            return 'gap'
+        if threshold_setting and rate < threshold_setting:
+            return 'threshold'
+        if last_rate and rate < floor_step(last_rate):
+            return 'worse_than_last'
+        elif not last_rate:
+            if not threshold_rate:
+                return 'bad_spread'
+            if floor_step(rate) < threshold_rate:
+                return 'worse_than_threshold'
+    return None
+
+
+def test_rate(state, rate, this_top_rate, threshold_rate):
+    """Raises the error for rate_problem, if there is one"""
+    problem = rate_problem(state, rate, this_top_rate, threshold_rate)
+    if problem == 'gap':
+        raise TradeGapError
+    if problem == 'threshold':
+        raise ThresholdRateError
+    if problem == 'worse_than_last':
+        last_rate = state.rates.last_robux_rate if state.currency == 'Tickets' else state.rates.last_tix_rate
+        raise WorseRateError(state.currency, state.other_currency, to_float(rate), to_float(last_rate))
+    if problem == 'bad_spread':
+        raise BadSpreadError
+    if problem == 'worse_than_threshold':
+        raise WorseRateError(state.currency, state.other_currency, to_float(rate), to_float(threshold_rate))
+
+
+def balance_amounts(state, amount, rate):
+    """Gives the amount to trade nearest the exact rate, the amount to receive and the actual rate"""
+    if state.orders is not None:
+        return state.orders.balance_amounts(state.currency, amount, rate, state.params)
+    return compute_balance_amounts(state.currency, amount, rate, state.params)
+
+
+def compute_balance_amounts(currency, amount, rate, params):
+    """balance_amounts without a cache. Takes up to a few hundred microseconds for large amounts.
+       Differences between rates are compared as exact fractions of units, diff/denominator, and
+       are updated from one amount to the next without dividing."""
+    x = amount
+    best_x = 0
+    lowest = get_tolerance(amount, params)*amount # Lowest amount to trade
+    if currency == 'Tickets':
+        # Trade within .001 of the top rate with the highest 4th decimal place
+        within, within_den = 0, 1 # Closest difference below STEP
+        outside, outside_den = None, 1 # Closest difference of STEP or more, if there is none below
+        receive, diff = divmod(x*RATE_SCALE, rate) # Our actual rate is above the top tix rate by diff/receive units
+        while x > lowest:
+            if not receive:
+                raise ZeroDivisionError("Cannot buy any Robux with {} Tickets".format(x))
+            if diff < STEP*receive:
+                if diff*within_den > within*receive:
+                    within, within_den = diff, receive
+                    best_x = x
+            elif not within and (outside is None or diff*outside_den < outside*receive):
+                outside, outside_den = diff, receive
+                best_x = x
+            x -= 1
+            diff -= RATE_SCALE
+            while diff < 0: # Once at most for rates above 1
+                diff += rate
+                receive -= 1
+        to_trade, receive = best_x, best_x*RATE_SCALE//rate
+        return to_trade, receive, ratio_ceil(to_trade, receive) # Rounded up, the side that costs us more
+    closest, closest_den = RATE_SCALE, 1 # More than any difference
+    step = rate % RATE_SCALE
+    diff = -x*rate % RATE_SCALE # The top trade rate is above ours by diff/x units
+    while x > lowest:
+        if diff*closest_den < closest*x:
+            closest, closest_den = diff, x
+            best_x = x
+        x -= 1
+        diff += step
+        if diff >= RATE_SCALE:
+            diff -= RATE_SCALE
+    to_trade, receive = best_x, best_x*rate//RATE_SCALE
+    return to_trade, receive, ratio_floor(receive, to_trade) # Rounded down, the side that gives us less
+
+
+def balance_rate(state, amount, rate, this_top_rate, threshold_rate):
+    """balance_amounts, raising if the actual rate is not one to trade at"""
+    to_trade, receive, actual_rate = balance_amounts(state, amount, rate)
+    test_rate(state, actual_rate, this_top_rate, threshold_rate)
+    return to_trade, receive, actual_rate
+
+
+def calculate_trade(state, market, panel, amount):
+    """Determines which trade rate to match and returns the amount to trade, the amount to receive and the rate.
+       The column is searched once from the top for the first rate that is acceptable both as shown and
+       after balancing the amounts. If none of the trade rates currently displayed are better than the
+       threshold rate setting, we trade at the threshold rate instead."""
+    currency = state.currency
+    spread = market.spread
+    column = market.column(currency)
+    this_top_rate = market.trade_info(currency, 1)[1]
+    other_threshold_rate = threshold_rate(state, market)
+    our_amount = panel.remainder(currency)
+    if spread > 10000*RATE_SCALE or spread < -10000*RATE_SCALE:
+        raise BadSpreadError
+    if this_top_rate <= 10*RATE_SCALE:
+        raise LowRateError
+
+    current_trade = state.current_trade
+    check_ours = current_trade and not state.holds_top_trade
+    for info in column[:state.params.num_trades]:
+        if info is None:
+            raise MarketTraderError
+        cur_amount, cur_rate = info
+        if check_ours:
+            if (
+                our_amount == cur_amount and
+                current_trade.current_rate == cur_rate or
+                our_amount == 0
+                ):
+                raise OurTradeError
+            elif current_trade.current_rate == cur_rate and our_amount != cur_amount:
+                cur_rate = better_rate(currency, cur_rate)
+        if rate_problem(state, cur_rate, this_top_rate, other_threshold_rate):
+            continue
+        to_trade, receive, actual_rate = balance_amounts(state, amount, cur_rate)
+        if rate_problem(state, actual_rate, this_top_rate, other_threshold_rate):
+            continue
+        return to_trade, receive, actual_rate
+    if len(column) < state.params.num_trades: # Page was cut off, most likely a reset connection
+        raise requests.exceptions.ConnectionError
+    threshold_setting = state.config['threshold_rate']
+    if threshold_setting:
+        if not current_trade or abs(current_trade.current_rate - threshold_setting) > 5*STEP:
+            return balance_rate(state, amount, better_rate(state.other_currency, threshold_setting),
+                                this_top_rate, other_threshold_rate)
+    raise ThresholdRateError
+
+
+def has_better_rate(state, market, panel):
+    """Whether another trade has a better rate than ours, so ours should be replaced.
+       Expects holds_top_trade and the current trade to be up to date with market."""
+    our_amount = panel.remainder(state.currency)
+    top_amount, top_rate = market.trade_info(state.currency, 1)
+    if not our_amount or our_amount == top_amount:
+        return False
+    rates = state.rates
+    if state.currency == 'Tickets':
+        if top_rate < rates.last_robux_rate:
+            return True
+        elif rates.current_tix_rate and top_rate >= floor_step(rates.current_tix_rate):
+            return True
+        elif not rates.last_robux_rate and not rates.current_robux_rate and top_rate < market.robux_rate:
+            return True
+    else:
+        if rates.last_tix_rate and top_rate > rates.last_tix_rate:
+            return True
+        elif rates.current_robux_rate and top_rate <= rates.current_robux_rate:
+            return True
+        elif not rates.last_tix_rate and not rates.current_tix_rate and top_rate > market.tix_rate:
+            return True
+    return False
+
+
+def has_trade_gap(state, market):
+    """Whether our top trade is far enough past the next trade or its start rate to trade closer"""
+    current_trade = state.current_trade
+    if not (state.config['early_cancel'] and current_trade and state.holds_top_trade):
+        return False
+    next_rate = market.trade_info(state.currency, 2)[1]
+    if state.currency == 'Tickets':
+        gap = state.params.tgap
+        start_diff = current_trade.current_rate - current_trade.start_rate
+        nt_diff = current_trade.current_rate - next_rate
+    else:
+        gap = state.params.rgap
+        start_diff = current_trade.start_rate - current_trade.current_rate
+        nt_diff = next_rate - current_trade.current_rate
+    return start_diff >= gap or nt_diff >= gap
+
+
+def can_complete(state):
+    """Whether Roblox has had time to show our last trade, so a missing bid means it filled"""
+    return state.now - state.last_trade_start_time > state.trade_lag_time
+
+
+def replace(state, market, panel):
+    give, receive, rate = calculate_trade(state, market, panel, amount_to_trade(state, panel))
+    return Replace(give, receive, rate)
+
+
+def decide(state, market, panel):
+    """The next Action for a trader in state, given the snapshots of one refresh"""
+    currency = state.currency
+    if not panel.active[currency]:
+        if state.current_trade:
+            if can_complete(state):
+                return Complete()
+            return Hold()
+        return replace(state, market, panel)
+    if len(panel.open_bids[currency]) > 1: # Lag error? Better clean it up.
+        return CancelOthers()
+    if state.current_trade:
+        if has_better_rate(state, market, panel) or has_trade_gap(state, market):
+            return replace(state, market, panel)
+        return Hold()
+    return Cancel()
@@ -0,0 +1,304 @@
+"""Differential check of the trade search against the float code it replaced.
+
+    python -m rbxAPI.kernelcheck [--cases 5000] [--seed 1]
+
+Reference below is calculate_trade as it was before the search became one pass and
+rates became integer units: each level is tried with test_rate raising, and amounts are
+balanced by dividing and rounding with round_down/round_up. It runs twice on the same
+random markets, accounts and trader states as calculate_trade:
+
+    exact   on Fractions, which leaves out float error. calculate_trade must return the
+            same amounts, a rate within a unit, or the same error, or the exit status is 1.
+    float   on floats, as the bot traded before. Its mismatches are the decisions float
+            error changed, such as a difference of exactly .001 taken as below .001.
+
+Then compute_balance_amounts is timed against the float balancing loop."""
+from .account import make_rates
+from .errors import *
+from .exchange import AccountSnapshot
+from .kernel import OTHER_CURRENCY, TraderState, calculate_trade, compute_balance_amounts, get_tolerance, threshold_rate
+from .market import MarketSnapshot, NUM_TRADES
+from .params import default_params, RATE_PARAMS
+from .units import PAGE_STEP, RATE_SCALE, to_float, to_units
+from .utils import round_down, round_up
+
+from fractions import Fraction
+
+import argparse
+import math
+import random
+import sys
+import timeit
+
+CASES = 5000 # Random cases to compare, about two a millisecond
+MISMATCHES_SHOWN = 10
+RATE_TOLERANCE = Fraction(1, RATE_SCALE) # A unit, the most a rate of the kernel is rounded by
+SEARCH_ERRORS = (WorseRateError, BadSpreadError, TradeGapError, ThresholdRateError)
+BALANCE_CASES = (('Tickets', 5000, 10.8), ('Tickets', 20000, 10.8), ('Robux', 500, 10.5), ('Robux', 2000, 10.5))
+
+
+class CurrentTrade:
+
+    def __init__(self, current_rate):
+        self.start_rate = self.current_rate = current_rate
+        self.remaining1 = 0
+
+
+class Reference:
+
+    """The old search and balancing loop on float rates, or with exact on Fractions"""
+
+    def __init__(self, exact=False):
+        self.exact = exact
+        self.step = Fraction(1, 1000) if exact else .001
+        self.gap_slack = 0 if exact else .00001 # Covered float error in the tix gap
+
+    def rate(self, units):
+        return Fraction(units, RATE_SCALE) if self.exact else to_float(units)
+
+    def ratio(self, numerator, denominator):
+        return Fraction(numerator, denominator) if self.exact else numerator/denominator
+
+    def round_down(self, num):
+        return Fraction(math.floor(num*1000), 1000) if self.exact else round_down(num)
+
+    def round_up(self, num):
+        return Fraction(math.ceil(num*1000), 1000) if self.exact else round_up(num)
+
+    def better_rate(self, currency, rate):
+        if currency == 'Tickets':
+            return rate + self.step
+        return rate - self.step
+
+    def test_rate(self, state, rate, this_top_rate, threshold_rate):
+        threshold_setting = state.config['threshold_rate']
+        if state.currency == 'Tickets':
+            last_rate = state.rates.last_robux_rate
+            if not state.holds_top_trade and rate - this_top_rate >= state.params.tgap - self.gap_slack:
+                raise TradeGapError
+            if threshold_setting and rate > threshold_setting:
+                raise ThresholdRateError
+            if last_rate and rate > self.round_up(last_rate):
+                raise WorseRateError(state.currency, state.other_currency, rate, last_rate)
+            elif not last_rate:
+                if not threshold_rate:
+                    raise BadSpreadError
+                if self.round_down(rate) > threshold_rate:
+                    raise WorseRateError(state.currency, state.other_currency, rate, threshold_rate)
+        else:
+            last_rate = state.rates.last_tix_rate
+            if not state.holds_top_trade and this_top_rate - rate >= state.params.rgap:
+                raise TradeGapError
+            if threshold_setting and rate < threshold_setting:
+                raise ThresholdRateError
+            if last_rate and rate < self.round_down(last_rate):
+                raise WorseRateError(state.currency, state.other_currency, rate, last_rate)
+            elif not last_rate:
+                if not threshold_rate:
+                    raise BadSpreadError
+                if self.round_down(rate) < threshold_rate:
+                    raise WorseRateError(state.currency, state.other_currency, rate, threshold_rate)
+
+    def balance_amounts(self, currency, amount, rate, params):
+        x = amount
+        best_x = 0
+        tolerance = get_tolerance(amount, params)
+        if currency == 'Tickets':
+            closest_within_rate, closest_outside_rate = 0, sys.maxsize
+            while x > tolerance*amount:
+                diff = self.ratio(x, math.floor(x/rate)) - rate
+                if diff < self.step:
+                    if diff > closest_within_rate:
+                        closest_within_rate = diff
+                        best_x = x
+                elif not closest_within_rate and diff < closest_outside_rate:
+                    closest_outside_rate = diff
+                    best_x = x
+                x -= 1
+            to_trade, receive = best_x, math.floor(best_x/rate)
+            return to_trade, receive, self.ratio(to_trade, receive)
+        closest = sys.maxsize
+        while x > tolerance*amount:
+            diff = self.ratio(math.ceil(x*rate), x) - rate
+            if diff < closest and diff >= 0:
+                closest = diff
+                best_x = x
+            x -= 1
+        to_trade, receive = best_x, math.floor(best_x*rate)
+        return to_trade, receive, self.ratio(receive, to_trade)
+
+    def balance_rate(self, state, amount, rate, this_top_rate, threshold_rate):
+        to_trade, receive, actual_rate = self.balance_amounts(state.currency, amount, rate, state.params)
+        self.test_rate(state, actual_rate, this_top_rate, threshold_rate)
+        return to_trade, receive, actual_rate
+
+    def calculate_trade(self, state, market, panel, amount):
+        currency = state.currency
+        spread = market.spread
+        this_top_rate = market.trade_info(currency, 1)[1]
+        other_threshold_rate = threshold_rate(state, market)
+        our_amount = panel.remainder(currency)
+        if spread > 10000 or spread < -10000:
+            raise BadSpreadError
+        if this_top_rate <= 10:
+            raise LowRateError
+
+        current_trade = state.current_trade
+        for i in range(1, state.params.num_trades + 1):
+            try:
+                cur_amount, cur_rate = market.trade_info(currency, i)
+                if current_trade and not state.holds_top_trade:
+                    if (
+                        our_amount == cur_amount and
+                        self.round_down(current_trade.current_rate == cur_rate) or
+                        our_amount == 0
+                        ):
+                        raise OurTradeError
+                    elif self.round_down(current_trade.current_rate == cur_rate) and our_amount != cur_amount:
+                        cur_rate = self.better_rate(currency, cur_rate)
+                self.test_rate(state, cur_rate, this_top_rate, other_threshold_rate)
+                return self.balance_rate(state, amount, cur_rate, this_top_rate, other_threshold_rate)
+            except SEARCH_ERRORS:
+                continue
+        threshold_setting = state.config['threshold_rate']
+        if threshold_setting:
+            if not current_trade or abs(current_trade.current_rate - threshold_setting) > 5*self.step:
+                return self.balance_rate(state, amount, self.better_rate(state.other_currency, threshold_setting),
+                                         this_top_rate, other_threshold_rate)
+        raise ThresholdRateError
+
+    def market(self, market):
+        column = lambda entries: [(info[0], self.rate(info[1])) if info else None for info in entries]
+        return MarketSnapshot(self.rate(market.spread), self.rate(market.tix_rate), self.rate(market.robux_rate),
+                              column(market.tix_column), column(market.robux_column), snapshot_time=0)
+
+    def state(self, currency, rates, threshold, current_rate, holds_top_trade):
+        params = default_params.replace(**{name: self.rate(getattr(default_params, name)) for name in RATE_PARAMS})
+        return make_state(currency, rates, threshold, current_rate, holds_top_trade, self.rate, params)
+
+
+def random_market(rng):
+    """A market in units like the page shows it: the tix column falls from its top rate, the robux column rises"""
+    mid = rng.randint(100000, 115000)*PAGE_STEP
+    tix_top = mid - rng.randint(0, 1000)*PAGE_STEP
+    robux_top = mid + rng.randint(-50, 1000)*PAGE_STEP
+    tix_column, robux_column = [], []
+    tix_rate, robux_rate = tix_top, robux_top
+    for _ in range(NUM_TRADES if rng.random() > .05 else rng.randint(1, NUM_TRADES - 1)):
+        tix_column.append((rng.randint(20, 3000), tix_rate))
+        robux_column.append((rng.randint(2, 300), robux_rate))
+        tix_rate -= rng.choice((0, rng.randint(1, 20)))*PAGE_STEP
+        robux_rate += rng.choice((0, rng.randint(1, 20)))*PAGE_STEP
+    if rng.random() < .02:
+        robux_column[rng.randrange(len(robux_column))] = None
+    return MarketSnapshot(robux_top - tix_top, tix_top, robux_top, tix_column, robux_column, snapshot_time=0)
+
+
+def random_case(rng):
+    """(currency, market, panel, amount, rates, config, current trade rate, holds top trade), rates in units"""
+    market = random_market(rng)
+    currency = rng.choice(('Tickets', 'Robux'))
+    column = [info for info in market.column(currency) if info]
+    amount = rng.randint(10, 20000) if currency == 'Tickets' else rng.randint(2, 2000)
+    rates = {'last_tix_rate': 0, 'last_robux_rate': 0}
+    if rng.random() < .6:
+        rates['last_tix_rate'] = market.tix_rate + rng.randint(-300, 300)*PAGE_STEP
+    if rng.random() < .6:
+        rates['last_robux_rate'] = market.robux_rate + rng.randint(-300, 300)*PAGE_STEP
+    threshold = 0
+    if rng.random() < .3:
+        threshold = rng.choice((market.tix_rate, market.robux_rate)) + rng.randint(-200, 200)*PAGE_STEP
+    current_rate = None
+    our_amount = 0
+    if column and rng.random() < .4:
+        our_amount, current_rate = rng.choice(column)
+        if rng.random() < .5:
+            our_amount = rng.randint(0, our_amount)
+    other = OTHER_CURRENCY[currency]
+    panel = AccountSnapshot({currency: amount, other: amount}, {currency: [our_amount] if our_amount else [], other: []},
+                            {currency: bool(our_amount), other: False})
+    return currency, market, panel, amount, rates, threshold, current_rate, rng.random() < .2
+
+
+def make_state(currency, rates, threshold, current_rate, holds_top_trade, convert=None, params=default_params):
+    convert = convert or (lambda units: units)
+    trader_rates = make_rates()
+    for name, value in rates.items():
+        trader_rates[name] = convert(value)
+    config = {'split_trades': 'on', 'trade_all': True, 'amount': 0, 'early_cancel': True,
+              'threshold_rate': convert(threshold)}
+    current_trade = CurrentTrade(convert(current_rate)) if current_rate is not None else None
+    return TraderState(currency, trader_rates, config, params, current_trade, holds_top_trade)
+
+
+def outcome(search, *args):
+    """What search returned, or the name of the error it raised, such as the ConnectionError of a cut off page"""
+    try:
+        return search(*args)
+    except Exception as e:
+        return type(e).__name__
+
+
+def same(expected, actual):
+    if isinstance(expected, str) or isinstance(actual, str):
+        return expected == actual
+    return expected[:2] == actual[:2] and abs(expected[2] - Fraction(actual[2], RATE_SCALE)) <= RATE_TOLERANCE
+
+
+def compare(cases, seed):
+    """Runs calculate_trade and both references on cases random cases.
+       Returns the mismatches of the exact and of the float reference."""
+    rng = random.Random(seed)
+    references = (Reference(exact=True), Reference())
+    mismatches = ([], [])
+    for _ in range(cases):
+        currency, market, panel, amount, rates, threshold, current_rate, holds_top = random_case(rng)
+        state = make_state(currency, rates, threshold, current_rate, holds_top)
+        actual = outcome(calculate_trade, state, market, panel, amount)
+        for reference, found in zip(references, mismatches):
+            expected = outcome(reference.calculate_trade,
+                               reference.state(currency, rates, threshold, current_rate, holds_top),
+                               reference.market(market), panel, amount)
+            if not same(expected, actual):
+                found.append((currency, amount, to_float(market.trade_info(currency, 1)[1]), expected, actual))
+    return mismatches
+
+
+def show(name, mismatches, cases):
+    print("{}: {} of {} cases differ".format(name, len(mismatches), cases))
+    for currency, amount, top_rate, expected, actual in mismatches[:MISMATCHES_SHOWN]:
+        if not isinstance(expected, str):
+            expected = expected[:2] + (float(expected[2]),)
+        print("  {} {} at top rate {}: reference {} kernel {}".format(currency, amount, top_rate, expected, actual))
+
+
+def time_balancing(number=200):
+    """(currency, amount, float microseconds, integer microseconds) for each of BALANCE_CASES"""
+    rows = []
+    for currency, amount, rate in BALANCE_CASES:
+        units = to_units(rate)
+        reference = timeit.timeit(lambda: Reference().balance_amounts(currency, amount, rate, default_params),
+                                  number=number)
+        integer = timeit.timeit(lambda: compute_balance_amounts(currency, amount, units, default_params),
+                                number=number)
+        rows.append((currency, amount, 1e6*reference/number, 1e6*integer/number))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare calculate_trade with the float search it replaced")
+    parser.add_argument('--cases', type=int, default=CASES, help="Random cases to compare")
+    parser.add_argument('--seed', type=int, default=1, help="Seed of the random cases")
+    args = parser.parse_args()
+
+    exact, inexact = compare(args.cases, args.seed)
+    show('exact', exact, args.cases)
+    show('float', inexact, args.cases)
+    print("{:>8}{:>8}{:>10}{:>10}".format('currency', 'amount', 'float us', 'int us'))
+    for currency, amount, reference, integer in time_balancing():
+        print("{:>8}{:>8}{:>10.1f}{:>10.1f}".format(currency, amount, reference, integer))
+    sys.exit(1 if exact else 0)
+
+
+if __name__ == '__main__':
+    main()
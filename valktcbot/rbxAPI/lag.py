@@ -0,0 +1,67 @@
+"""How long Roblox takes to show our requests, measured from the open bids of each refresh.
+
+FillTracker reports two kinds of samples to the account's LagEstimator:
+
+    submit  seconds from a submit to the first refresh that shows its bid
+    cancel  seconds from a cancel to the first refresh without the bid
+
+A sample is only seen at a refresh, so it is an upper bound of the real lag, off by at
+most one tick. Bids that fill or are rejected before they show give no sample.
+
+The estimate is a high quantile (TraderParams.lag_quantile) of the last LAG_WINDOW samples
+of each kind, the larger of the two, kept within LAG_FLOOR and LAG_CEILING. Until a kind
+has LAG_MIN_SAMPLES samples it is left out, and with neither the trader uses the fixed
+TraderParams.trade_lag_time. lag_quantile = 0 in [Engine] always uses the fixed value.
+The samples are in the rbx_trade_lag_seconds histogram and the estimate in the
+rbx_trade_lag_estimate gauge."""
+from collections import deque
+from .metrics import TRADE_LAG_SECONDS
+
+import threading
+
+LAG_WINDOW = 64 # Latest samples of each kind the estimate is taken from
+LAG_MIN_SAMPLES = 8 # Samples of a kind before it counts
+LAG_FLOOR = .25 # Seconds, the lowest estimate
+LAG_CEILING = 10 # Seconds, the highest estimate
+LAG_KINDS = ('submit', 'cancel')
+
+
+def quantile(values, q):
+    """The nearest rank q quantile of values, which are sorted"""
+    return values[min(int(q*len(values)), len(values) - 1)]
+
+
+class LagEstimator:
+
+    def __init__(self, window=LAG_WINDOW, min_samples=LAG_MIN_SAMPLES):
+        self.min_samples = min_samples
+        self.samples = {kind: deque(maxlen=window) for kind in LAG_KINDS}
+        self.histograms = {kind: TRADE_LAG_SECONDS.labels(kind) for kind in LAG_KINDS}
+        self._sorted = None # {kind: sorted samples}, made again after a new sample
+        self._lock = threading.Lock()
+
+    def observe(self, kind, seconds):
+        self.histograms[kind].observe(seconds)
+        with self._lock:
+            self.samples[kind].append(seconds)
+            self._sorted = None
+
+    def _sorted_samples(self):
+        with self._lock:
+            if self._sorted is None:
+                self._sorted = {kind: sorted(samples) for kind, samples in self.samples.items()
+                                if len(samples) >= self.min_samples}
+            return self._sorted
+
+    def estimate(self, q, default):
+        """The q quantile of the lag, or default if there are not enough samples yet or q is 0"""
+        if not q:
+            return default
+        estimates = [quantile(samples, q) for samples in self._sorted_samples().values()]
+        if not estimates:
+            return default
+        return min(max(max(estimates), LAG_FLOOR), LAG_CEILING)
+
+    def distribution(self, quantiles=(.5, .9, .95, .99)):
+        """{kind: {q: seconds}} of the current samples, for the kinds with enough of them"""
+        return {kind: {q: quantile(samples, q) for q in quantiles} for kind, samples in self._sorted_samples().items()}
@@ -0,0 +1,185 @@
+"""Load test: many of our trader pairs and scripted competitors in one market, on one host.
+
+    python -m rbxAPI.loadtest --pairs 1,5,10,25 --competitors 9 --seconds 20
+
+Each step of --pairs starts a fresh stand-in of the trade currency page (standin.py) in
+its own process, with --competitors scripted traders. That way the market's work does
+not compete with the traders for this process's GIL. N accounts, each with a TixTrader
+and RobuxTrader, then run on one TraderPool for --seconds against real HTTP on
+127.0.0.1. They trade their whole balance in split trades, or as --config sets. At the
+end they are shut down. No request leaves the host. For each step it prints:
+
+    req/s       requests the stand-in answered: refreshes, submits and cancels
+    dec/s       trade decisions of all traders
+    tick ms     p50, p95 and max of Trader.tick, refresh included
+    ours/s      OurTradeError per second: a trader found its own bid where it wanted to trade
+    cleanups    CancelOthers decisions and DuplicateBid events, the clean up of bids repeated by lag
+    conn        ticks lost to connection errors, timeouts or an open circuit
+    trades      trades made on the stand-in, and submits it dropped for a short balance
+
+--output appends each step as a JSON line, to compare runs."""
+from .account import Account
+from .actions import TixTrader, RobuxTrader
+from .backtest import load_configs
+from .exchange import LiveExchange
+from .market import MarketFeed
+from .metrics import DECISIONS, TICK_ERRORS, FILL_EVENTS
+from .parsebench import percentile
+from .pool import TraderPool
+from .standin import ACCOUNT_COOKIE, LAG, START_BALANCES, serve
+from .trade_log import TradeLog
+
+import argparse
+import json
+import multiprocessing
+import time
+
+PAIRS = (1, 5, 10, 25) # Trader pairs of each step
+SECONDS = 20 # Seconds each step trades for
+COMPETITORS = 9 # Scripted traders in the stand-in's market
+ACCOUNT_WORKERS = 4 # Request threads of each account's session
+STOP_TIMEOUT = 5 # Seconds the stand-in's process gets to stop before it is killed
+CONNECTION_ERRORS = {'ConnectionError', 'ChunkedEncodingError', 'Timeout', 'ConnectTimeout', 'ReadTimeout',
+                     'CircuitOpenError'}
+
+
+class TickRecorder:
+
+    """Takes the place of a trader's tick_seconds histogram: keeps the seconds of every tick and still observes them"""
+
+    def __init__(self, histogram, samples):
+        self.histogram = histogram
+        self.samples = samples
+
+    def observe(self, seconds):
+        self.samples.append(seconds)
+        self.histogram.observe(seconds)
+
+
+def counter_total(counter, match):
+    """Sum of the children of counter whose label values match"""
+    return sum(child.value for values, child in counter.items() if match(values))
+
+
+def counts():
+    """Totals of the trader metrics a step reports, to take the difference of"""
+    return {
+        'decisions': counter_total(DECISIONS, lambda values: True),
+        'our_trade': counter_total(TICK_ERRORS, lambda values: values[1] == 'OurTradeError'),
+        'connection': counter_total(TICK_ERRORS, lambda values: values[1] in CONNECTION_ERRORS),
+        'cancel_others': counter_total(DECISIONS, lambda values: values[1] == 'CancelOthers'),
+        'duplicates': counter_total(FILL_EVENTS, lambda values: values[1] == 'DuplicateBid'),
+    }
+
+
+def make_accounts(url, pairs, configs):
+    """pairs accounts with a trader pair each, trading on the stand-in at url, and the list their ticks go to"""
+    accounts, samples = [], []
+    for i in range(pairs):
+        account = Account('loadtest{}'.format(i), max_workers=ACCOUNT_WORKERS)
+        account.exchange = LiveExchange(account, url)
+        account.session.cookies.set(ACCOUNT_COOKIE, account.username)
+        trade_log = TradeLog()
+        for trader in (TixTrader(trade_log, account), RobuxTrader(trade_log, account)):
+            for option, value in configs.get(trader.currency, {}).items():
+                trader.set_config(option, value)
+            trader.tick_seconds = TickRecorder(trader.tick_seconds, samples)
+        accounts.append(account)
+    return accounts, samples
+
+
+def run_step(pairs, seconds, configs, balances, lag=LAG, competitors=COMPETITORS, workers=None, shared_feed=False,
+             seed=None):
+    """Runs pairs trader pairs against a new stand-in for seconds. Returns the step's results as a dict."""
+    context = multiprocessing.get_context('spawn')
+    connection, child = context.Pipe()
+    server = context.Process(target=serve, args=(child, balances, lag, competitors, seed), daemon=True)
+    server.start()
+    try:
+        url = connection.recv()
+        accounts, samples = make_accounts(url, pairs, configs)
+        pool = TraderPool(accounts, max_workers=workers, shared_feed=False)
+        if shared_feed and pairs > 1:
+            pool.feed = MarketFeed(clock=pool.clock)
+            for account in accounts:
+                pool.feed.subscribe(account)
+        connection.send('stats')
+        before_stats, before = connection.recv(), counts()
+        start = time.perf_counter()
+        pool.start()
+        time.sleep(seconds)
+        connection.send('stats')
+        stats, after = connection.recv(), counts()
+        elapsed = time.perf_counter() - start
+        ticks = sorted(samples)
+        pool.stop()
+        connection.send('stop')
+        connection.poll(STOP_TIMEOUT)
+    finally:
+        server.join(STOP_TIMEOUT)
+        if server.is_alive():
+            server.terminate()
+    change = {name: after[name] - before[name] for name in after}
+    served = {name: stats[name] - before_stats[name] for name in stats if name not in ('accounts', 'book')}
+    return {
+        'pairs': pairs,
+        'seconds': elapsed,
+        'requests_per_second': (served['refresh'] + served['submit'] + served['cancel'])/elapsed,
+        'refreshes_per_second': served['refresh']/elapsed,
+        'decisions_per_second': change['decisions']/elapsed,
+        'ticks': len(ticks),
+        'tick_ms': {name: 1000*percentile(ticks, p) if ticks else None
+                    for name, p in (('p50', .5), ('p95', .95), ('max', 1))},
+        'our_trade_per_second': change['our_trade']/elapsed,
+        'cancel_others': change['cancel_others'],
+        'duplicate_bids': change['duplicates'],
+        'connection_errors': change['connection'],
+        'trades': served['trades'],
+        'rejected': served['rejected'],
+    }
+
+
+def format_row(result):
+    tick = result['tick_ms']
+    return "{:>5}{:>9.1f}{:>9.1f}{:>9.1f}{:>9.1f}{:>9.1f}{:>9.2f}{:>10}{:>7}{:>8}{:>9}".format(
+        result['pairs'], result['requests_per_second'], result['decisions_per_second'],
+        *(tick[name] or 0 for name in ('p50', 'p95', 'max')), result['our_trade_per_second'],
+        '{}+{}'.format(result['cancel_others'], result['duplicate_bids']), result['connection_errors'],
+        result['trades'], result['rejected'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ramp up trader pairs against a local stand-in of the trade page")
+    parser.add_argument('--pairs', default=','.join(map(str, PAIRS)), help="Trader pairs of each step, such as 1,5,10")
+    parser.add_argument('--seconds', type=float, default=SECONDS, help="Seconds each step trades for")
+    parser.add_argument('--competitors', type=int, default=COMPETITORS, help="Scripted traders in the market")
+    parser.add_argument('--lag', type=float, default=LAG, help="Seconds before the stand-in shows a submit or cancel")
+    parser.add_argument('--config', help="config.ini with the trader settings (default: trade all)")
+    parser.add_argument('--tix', type=int, default=START_BALANCES['Tickets'], help="Starting tickets of each account")
+    parser.add_argument('--robux', type=int, default=START_BALANCES['Robux'], help="Starting robux of each account")
+    parser.add_argument('--workers', type=int, help="Threads of the TraderPool (default: one per trader, plus one)")
+    parser.add_argument('--shared-feed', action='store_true', help="Fetch market data once for every account")
+    parser.add_argument('--seed', type=int, help="Seed of the competitors")
+    parser.add_argument('--output', help="Append each step's results to this file as a JSON line")
+    args = parser.parse_args()
+    try:
+        steps = [int(pairs) for pairs in args.pairs.split(',') if pairs.strip()]
+    except ValueError:
+        parser.error("--pairs takes whole numbers, such as 1,5,10")
+
+    configs = load_configs(args.config)
+    balances = {'Tickets': args.tix, 'Robux': args.robux}
+    print("{:>5}{:>9}{:>9}{:>9}{:>9}{:>9}{:>9}{:>10}{:>7}{:>8}{:>9}".format(
+        'pairs', 'req/s', 'dec/s', 'p50 ms', 'p95 ms', 'max ms', 'ours/s', 'cleanups', 'conn', 'trades', 'rejected'),
+        flush=True)
+    for pairs in steps:
+        result = run_step(pairs, args.seconds, configs, balances, args.lag, args.competitors, args.workers,
+                          args.shared_feed, args.seed)
+        print(format_row(result), flush=True)
+        if args.output:
+            with open(args.output, 'a') as f:
+                f.write(json.dumps(dict(result, lag=args.lag, competitors=args.competitors)) + '\n')
+
+
+if __name__ == '__main__':
+    main()
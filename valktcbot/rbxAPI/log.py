@@ -0,0 +1,70 @@
+"""The one place logging is configured.
+
+Enabled records are formatted by the calling thread (so they show the state at the
+time of the call) and put on a queue; a QueueListener thread writes them out, so
+trader threads never wait on console or file I/O. Disabled records are dropped
+before any formatting. Log with %-style arguments, never pre-formatted strings.
+Levels can be set per module in the [Logging] section of config.ini:
+
+    [Logging]
+    level = WARNING
+    rbxAPI.actions = DEBUG
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+
+FORMAT = "%(asctime)s -%(levelname)s %(funcName)s %(message)s  %(module)s: <Line %(lineno)s>"
+DEFAULT_LEVEL = logging.WARNING
+CONFIG_SECTION = 'Logging'
+
+_listener = None
+
+
+def levels_from_config(config):
+    """Returns (root level, {logger name: level}) from the [Logging] section, if there is one.
+       Raises ValueError for a level logging does not know."""
+    if config is None or not config.has_section(CONFIG_SECTION):
+        return DEFAULT_LEVEL, {}
+    names = logging.getLevelNamesMapping()
+    levels = {}
+    for name, value in config[CONFIG_SECTION].items():
+        if value.upper() not in names:
+            raise ValueError("[{}] {} = {!r} is not one of {}".format(CONFIG_SECTION, name, value,
+                                                                      ', '.join(sorted(names, key=names.get))))
+        levels[name] = value.upper()
+    return levels.pop('level', DEFAULT_LEVEL), levels
+
+
+def setup_logging(config=None, handler=None):
+    """Routes all logging through a queue to handler (stderr by default). Safe to call again to change levels.
+       Raises ValueError for a bad level in config before changing any."""
+    global _listener
+    level, levels = levels_from_config(config)
+    root = logging.getLogger()
+    root.setLevel(level)
+    for name, module_level in levels.items():
+        logging.getLogger(name).setLevel(module_level)
+    if _listener is not None:
+        return _listener
+
+    if handler is None:
+        handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(FORMAT))
+    log_queue = queue.SimpleQueue()
+    for old_handler in root.handlers[:]:
+        root.removeHandler(old_handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """Writes out any queued records and stops the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,236 @@
+"""Public market data of the trade currency page, parsed once and shared between traders and accounts"""
+from .rbx_data import data
+from .clock import real_clock
+from .errors import MarketTraderError
+from .units import parse_rate, to_float, to_units
+from .utils import LazyModule, to_num
+
+import json
+import logging
+import threading
+
+requests = LazyModule('requests')
+logger = logging.getLogger(__name__)
+
+NUM_TRADES = 19 # Number of trades that display on the trade currency page
+FEED_MAX_AGE = 1 # Seconds before a shared snapshot is too old to trade on
+
+
+class MarketSnapshot:
+
+    """Spread, rates and both currency columns from one fetch of the trade currency page.
+       Column entries are (amount, rate) tuples, or None for trades that are @ Market.
+       The spread and rates are in units (see units.py)."""
+
+    def __init__(self, spread, tix_rate, robux_rate, tix_column, robux_column, robux_at_market=False, seq=0,
+                 snapshot_time=None, clock=real_clock):
+        self.spread = spread
+        self.tix_rate = tix_rate
+        self.robux_rate = robux_rate
+        self.tix_column = tix_column
+        self.robux_column = robux_column
+        self.robux_at_market = robux_at_market # Top robux trade is @ Market and left out of the column
+        self.seq = seq
+        self.time = clock.time() if snapshot_time is None else snapshot_time
+
+    def column(self, currency):
+        if currency == 'Tickets':
+            return self.tix_column
+        return self.robux_column
+
+    def trade_info(self, currency, index):
+        """Gets the (amount, rate) of the trade at index (Starting at index = 1)"""
+        column = self.column(currency)
+        if index > len(column): # Page was cut off, most likely a reset connection
+            raise requests.exceptions.ConnectionError
+        info = column[index - 1]
+        if info is None:
+            raise MarketTraderError
+        return info
+
+    def book(self):
+        """Everything but the time and sequence number, to tell if the market changed"""
+        return (self.spread, self.tix_rate, self.robux_rate, self.tix_column, self.robux_column, self.robux_at_market)
+
+    def to_dict(self):
+        """With the rates as floats, as history files have always had them"""
+        column = lambda entries: [(info[0], to_float(info[1])) if info else None for info in entries]
+        return {
+            'time': self.time,
+            'spread': to_float(self.spread),
+            'rates': [to_float(self.tix_rate), to_float(self.robux_rate)],
+            'Tickets': column(self.tix_column),
+            'Robux': column(self.robux_column),
+            'at_market': self.robux_at_market,
+        }
+
+    @classmethod
+    def from_dict(cls, d, seq=0):
+        column = lambda entries: [(entry[0], to_units(entry[1])) if entry else None for entry in entries]
+        return cls(to_units(d['spread']), to_units(d['rates'][0]), to_units(d['rates'][1]), column(d['Tickets']),
+                   column(d['Robux']),
+                   d['at_market'], seq, d['time'])
+
+
+def _first_text(tree, path):
+    found = tree.xpath(path)
+    if not found:
+        raise requests.exceptions.ConnectionError
+    return found[0]
+
+
+def parse_tix_info(info):
+    # Format: '\r\n (bunch of spaces) Tix @ rate:1\r\n (bunch of spaces)'
+    rate_split = [x for x in info.split(' ') if x and x[0].isdigit()]
+    if len(rate_split) < 2:
+        return None
+    tix, all_rate = to_num(rate_split[0]), rate_split[1]
+    return tix, parse_rate(all_rate.split(':')[0])
+
+
+def parse_robux_info(amount_info, rate_info):
+    # Format: '1:rate\r\n'
+    all_rate = [x for x in rate_info.split(' ') if x and x[0].isdigit()]
+    if not all_rate:
+        return None
+    rate = (all_rate[0].split(':')[1]).split('\\')[0]
+    return to_num(amount_info), parse_rate(rate)
+
+
+def parse_tix_column(tree, max_entries=NUM_TRADES):
+    column = []
+    for div in tree.xpath(data['Tickets']['trade_column'])[:max_entries]:
+        info = ''.join(div.xpath('text()'))
+        if not info:
+            break
+        column.append(parse_tix_info(info))
+    return column
+
+
+def parse_robux_column(tree, max_entries=NUM_TRADES):
+    """Returns the robux column and whether its top trade is @ Market,
+       in which case the real trades start one entry lower"""
+    column = []
+    for div in tree.xpath(data['Robux']['trade_column'])[:max_entries + 1]:
+        # Format: <div><span>robuxtext</span> @ rate </div>
+        amount_info = ''.join(div.xpath('span/text()'))
+        rate_info = div.xpath('text()')
+        if not amount_info or not rate_info:
+            break
+        column.append(parse_robux_info(amount_info, rate_info[-1]))
+    at_market = bool(column) and column[0] is None
+    if at_market:
+        column.pop(0)
+    return column[:max_entries], at_market
+
+
+def parse_market(tree, seq=0, snapshot_time=None):
+    tix_rate, robux_rate = _first_text(tree, data['rates']).split('/')
+    robux_column, robux_at_market = parse_robux_column(tree)
+    return MarketSnapshot(
+        parse_rate(_first_text(tree, data['spread'])),
+        parse_rate(tix_rate), parse_rate(robux_rate),
+        parse_tix_column(tree), robux_column,
+        robux_at_market, seq, snapshot_time
+    )
+
+
+class MarketFeed:
+
+    """The newest market data any subscribed account has parsed, so accounts that refresh at about
+       the same time parse the market part of the page once. Each account still fetches its own page
+       for its balances and open bids; LiveExchange.fetch only takes the feed's snapshot when that
+       page was requested no earlier than its own, and offers its own otherwise.
+       With a SharedBookWriter, each snapshot is also published to traders in other processes."""
+
+    def __init__(self, shared_book=None, clock=real_clock):
+        self.shared_book = shared_book
+        self.clock = clock
+        self.snapshot = None
+        self.seq = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self, account):
+        account.feed = self
+
+    def unsubscribe(self, account):
+        if account.feed is self:
+            account.feed = None
+
+    def latest(self, max_age=FEED_MAX_AGE):
+        """Returns the newest snapshot, or None if it is too old to trade on"""
+        snapshot = self.snapshot
+        if snapshot and self.clock.time() - snapshot.time <= max_age:
+            return snapshot
+        return None
+
+    def since(self, requested):
+        """Returns the newest snapshot if its page was requested at or after time requested, else None"""
+        snapshot = self.snapshot
+        if snapshot and snapshot.time >= requested:
+            return snapshot
+        return None
+
+    def offer(self, snapshot):
+        """Keeps snapshot if its page was requested after that of the newest one. Returns whether it was kept."""
+        with self._lock: # One writer at a time, for the shared book too
+            if self.snapshot and self.snapshot.time >= snapshot.time:
+                return False
+            self.seq += 1
+            snapshot.seq = self.seq
+            self.snapshot = snapshot
+            if self.shared_book:
+                self.shared_book.write(snapshot)
+            return True
+
+
+class MarketRecorder:
+
+    """Appends every change of the market to a JSON lines file, for backtesting.
+       Our own open bids are left out of the recorded columns. Subscribe on_snapshot to an account's bus
+       so the file is written off the trader threads."""
+
+    def __init__(self, path):
+        self.file = open(path, 'a')
+        self.last_book = None
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def record(self, market, panel=None):
+        if panel is not None:
+            market = without_bids(market, panel)
+        book = market.book()
+        with self._lock:
+            if book == self.last_book:
+                return
+            self.last_book = book
+            self.file.write(json.dumps(market.to_dict()) + '\n')
+            self.count += 1
+
+    def on_snapshot(self, event):
+        self.record(event.market, event.panel)
+
+    def close(self):
+        with self._lock:
+            self.file.close()
+
+
+def without_bids(market, panel):
+    """Copy of market without the column entries that match our open bids' remaining amounts"""
+    columns = {}
+    for currency in ('Tickets', 'Robux'):
+        column = list(market.column(currency))
+        for remainder in panel.open_bids[currency]:
+            for i, info in enumerate(column):
+                if info and info[0] == remainder:
+                    del column[i]
+                    break
+        columns[currency] = column
+    return MarketSnapshot(market.spread, market.tix_rate, market.robux_rate, columns['Tickets'], columns['Robux'],
+                          market.robux_at_market, market.seq, market.time)
+
+
+def load_history(path):
+    """Reads the snapshots written by a MarketRecorder, oldest first"""
+    with open(path) as f:
+        return [MarketSnapshot.from_dict(json.loads(line), seq) for seq, line in enumerate(f, 1) if line.strip()]
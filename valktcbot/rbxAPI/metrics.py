@@ -0,0 +1,271 @@
+"""Counters and histograms in the Prometheus text format, served on a local port when enabled.
+
+Every thread counts into its own list, so recording an event is a few list operations with
+no lock (a few hundred nanoseconds) and the lists are only added up when /metrics is read.
+Metrics are always recorded; the HTTP endpoint is opt in:
+
+    [Bot]
+    metrics_port = 9464
+
+then read http://127.0.0.1:9464/metrics."""
+from .units import to_float
+from .utils import LazyModule
+
+from bisect import bisect_left
+import threading
+import time
+
+http_server = LazyModule('http.server')
+
+METRICS_HOST = '127.0.0.1' # Only served locally
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10) # Seconds
+
+REGISTRY = []
+
+
+class _Shards:
+
+    """One list of numbers per thread (local.values). A thread only ever adds to its own list."""
+
+    def __init__(self, size):
+        self.size = size
+        self.local = threading.local()
+        self.lists = []
+        self.lock = threading.Lock()
+
+    def new(self):
+        """Makes the list of the calling thread, the first time it records something"""
+        values = self.local.values = [0]*self.size
+        with self.lock:
+            self.lists.append(values)
+        return values
+
+    def total(self):
+        with self.lock:
+            lists = list(self.lists)
+        return [sum(column) for column in zip(*lists)] if lists else [0]*self.size
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, str(value).replace('\\', r'\\').replace('"', r'\"'))
+                          for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+
+    kind = None
+
+    def __init__(self, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def labels(self, *values):
+        """The child for these label values. Keep it to skip the lookup on hot paths."""
+        try:
+            return self.children[values]
+        except KeyError:
+            with self._lock:
+                return self.children.setdefault(values, self._new_child())
+
+    def items(self):
+        """(label values, child) pairs, copied under the lock so a child added meanwhile cannot break a loop"""
+        with self._lock:
+            return list(self.children.items())
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.description), '# TYPE {} {}'.format(self.name, self.kind)]
+        for values, child in sorted(self.items()):
+            lines += self._render_child(values, child)
+        return lines
+
+
+class _CounterChild:
+
+    def __init__(self):
+        self.shards = _Shards(1)
+        self.local = self.shards.local
+
+    def inc(self, amount=1):
+        try:
+            self.local.values[0] += amount
+        except AttributeError:
+            self.shards.new()[0] += amount
+
+    @property
+    def value(self):
+        return self.shards.total()[0]
+
+
+class Counter(_Metric):
+
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def _render_child(self, values, child):
+        return ['{}_total{} {}'.format(self.name, _format_labels(self.labelnames, values), _format_value(child.value))]
+
+
+class _HistogramChild:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.shards = _Shards(len(buckets) + 2) # A count per bucket, the +Inf bucket, then the sum
+        self.local = self.shards.local
+
+    def observe(self, value):
+        try:
+            values = self.local.values
+        except AttributeError:
+            values = self.shards.new()
+        values[bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+    def time(self):
+        """Context manager that observes the seconds its block takes"""
+        return _Timer(self)
+
+
+class _Timer:
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.child.observe(time.perf_counter() - self.start)
+
+
+class Histogram(_Metric):
+
+    kind = 'histogram'
+
+    def __init__(self, name, description, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, description, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def _render_child(self, values, child):
+        totals = child.shards.total()
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), totals):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(float(bound))
+            lines.append('{}_bucket{} {}'.format(self.name, _format_labels(self.labelnames, values, [('le', le)]),
+                                                 cumulative))
+        labels = _format_labels(self.labelnames, values)
+        lines.append('{}_sum{} {}'.format(self.name, labels, _format_value(totals[-1])))
+        lines.append('{}_count{} {}'.format(self.name, labels, cumulative))
+        return lines
+
+
+class Gauge(_Metric):
+
+    """Read when /metrics is requested: collect() returns {label values tuple: value}"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, description, labelnames=(), collect=None):
+        super().__init__(name, description, labelnames)
+        self.collectors = [collect] if collect else []
+
+    def add_collector(self, collect):
+        with self._lock:
+            self.collectors.append(collect)
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.description), '# TYPE {} gauge'.format(self.name)]
+        with self._lock:
+            collectors = list(self.collectors)
+        for collect in collectors:
+            for values, value in sorted(collect().items()):
+                lines.append('{}{} {}'.format(self.name, _format_labels(self.labelnames, values), _format_value(value)))
+        return lines
+
+
+def render():
+    """Every registered metric in the Prometheus text format"""
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    return '\n'.join(lines) + '\n'
+
+
+# The bot's metrics
+REQUESTS = Counter('rbx_requests', "Requests by kind and outcome (ok, failed, rejected)", ('kind', 'outcome'))
+REQUEST_SECONDS = Histogram('rbx_request_seconds', "Request time by kind, including retries", ('kind',))
+TICK_SECONDS = Histogram('rbx_tick_seconds', "Time of one trader tick, refresh included", ('currency',))
+DECISIONS = Counter('rbx_decisions', "Actions decided by the traders", ('currency', 'action'))
+TICK_ERRORS = Counter('rbx_tick_errors', "Exceptions caught in Trader.tick by class", ('currency', 'error'))
+TRADES_ADDED = Counter('rbx_trades_added', "Trades added to the trade log", ('currency',))
+TRADES_COMPLETED = Counter('rbx_trades_completed', "Trades completed in the trade log", ('currency',))
+FILL_EVENTS = Counter('rbx_fill_events', "Events read from the open bids panel", ('currency', 'event'))
+BUS_DROPPED = Counter('rbx_bus_dropped', "Events dropped because a bus subscriber fell behind", ('subscriber',))
+SPECULATION = Counter('rbx_speculation', "Balanced orders found ready (speculated, repeated) or not (missed)", ('currency', 'outcome'))
+SPECULATION_SAVED = Counter('rbx_speculation_saved_seconds', "Decision time saved by orders found ready", ('currency',))
+TRADE_LAG_SECONDS = Histogram('rbx_trade_lag_seconds', "Seconds until the page showed a submit or cancel", ('kind',))
+TRADE_LAG = Gauge('rbx_trade_lag_estimate', "Trade lag the traders of each account use, in seconds", ('account',))
+RATES = Gauge('rbx_rate', "Rate memory of each account", ('account', 'rate'))
+
+
+def watch_rates(account):
+    """Reports the current and last rates of account in RATES"""
+    def collect():
+        return {(account.username or '', name): to_float(value) for name, value in account.rates.items()
+                if not name.startswith('past')}
+    RATES.add_collector(collect)
+
+
+def watch_lag(account):
+    """Reports the trade lag estimate of account in TRADE_LAG"""
+    def collect():
+        params = account.params
+        return {(account.username or '',): account.lag.estimate(params.lag_quantile, params.trade_lag_time)}
+    TRADE_LAG.add_collector(collect)
+
+
+def start_metrics_server(port, host=METRICS_HOST):
+    """Serves /metrics on a daemon thread and returns the server"""
+    class MetricsHandler(http_server.BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass # Scrapes would flood the console
+
+    server = http_server.ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='Metrics', daemon=True).start()
+    return server
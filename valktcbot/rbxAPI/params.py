@@ -0,0 +1,55 @@
+"""The tuning constants of the trading strategy.
+
+The module constants are the defaults. Each trader reads them through its TraderParams,
+so a backtest or sweep can run traders with different values side by side, and the
+[Engine] section of config.ini can change them while the bot runs (see config.py)."""
+from .market import NUM_TRADES
+from .units import to_units
+
+DELAY = .05  # Second delay between calculating trades.
+RGAP = to_units(.005) # Max gap before cancelling a robux split trade, in rate units
+TGAP = to_units(.0025) # Max gap before cancelling a tix split trade, in rate units
+TRADE_LAG_TIME = 1.25 # Estimate of how long it takes for Roblox to process our requests, until it is measured
+LAG_QUANTILE = .95 # Quantile of the measured lags used as the trade lag (see lag.py), 0 to always use TRADE_LAG_TIME
+RESET_TIME = 240 # Number of seconds the bot goes without trading before resetting last rates to be able to trade again (might result in loss)
+DEQUE_SIZE = 15 # Max number of past trade rates to keep track of to money prevent loss
+# get_tolerance: the lowest share of the amount to trade is TOLERANCE_BASE, plus TOLERANCE_STEP
+# for each digit the amount has past the second, up to TOLERANCE_MAX
+TOLERANCE_BASE = .9
+TOLERANCE_STEP = .015
+TOLERANCE_MAX = .975
+# NUM_TRADES: number of trades from the top of a column that are searched for a rate to match
+RATE_PARAMS = ('rgap', 'tgap') # Params in rate units, written as decimals in config.ini and on the command line
+
+
+class TraderParams:
+
+    def __init__(self, delay=DELAY, rgap=RGAP, tgap=TGAP, trade_lag_time=TRADE_LAG_TIME, reset_time=RESET_TIME,
+                 deque_size=DEQUE_SIZE, tolerance_base=TOLERANCE_BASE, tolerance_step=TOLERANCE_STEP,
+                 tolerance_max=TOLERANCE_MAX, num_trades=NUM_TRADES, lag_quantile=LAG_QUANTILE):
+        self.delay = delay
+        self.rgap = rgap
+        self.tgap = tgap
+        self.trade_lag_time = trade_lag_time
+        self.reset_time = reset_time
+        self.deque_size = deque_size
+        self.tolerance_base = tolerance_base
+        self.tolerance_step = tolerance_step
+        self.tolerance_max = tolerance_max
+        self.num_trades = num_trades
+        self.lag_quantile = lag_quantile
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+    def replace(self, **changes):
+        """Copy with some values changed. Unknown names raise a TypeError."""
+        values = self.as_dict()
+        values.update(changes)
+        return TraderParams(**values)
+
+    def __repr__(self):
+        return "TraderParams({})".format(', '.join('{}={!r}'.format(name, value) for name, value in self.__dict__.items()))
+
+
+default_params = TraderParams()
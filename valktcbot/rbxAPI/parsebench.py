@@ -0,0 +1,101 @@
+"""Measures tick latency with pages parsed on the trading threads or in worker processes,
+while other threads compete for the GIL.
+
+    python -m rbxAPI.parsebench PAGE.html [--traders 2] [--ticks 200] [--gui-load .5]
+
+PAGE.html is a saved trade currency page. Each trader thread parses it and decides a
+trade on it, like Trader.tick without the request, then waits DELAY. A GUI thread
+spends --gui-load of every frame in Python work, like repaints of the trade log."""
+from .account import make_rates
+from .errors import *
+from .exchange import ProcessParser, parse_page
+from .kernel import TraderState, decide
+from .params import DELAY, default_params
+
+import argparse
+import threading
+import time
+
+FRAME = 1/60 # Seconds per GUI frame
+STRATEGY_ERRORS = (WorseRateError, LowRateError, BadSpreadError, MarketTraderError, TradeGapError, NoMoneyError,
+                   OurTradeError, ZeroDivisionError, ThresholdRateError)
+
+
+def busy_gui(load, stop):
+    """Holds the GIL for load of every frame until stop is set"""
+    while not stop.is_set():
+        end = time.perf_counter() + FRAME*load
+        while time.perf_counter() < end:
+            sum(range(100))
+        time.sleep(FRAME*(1 - load))
+
+
+def run_trader(content, parser, ticks, delay, latencies):
+    state = TraderState('Tickets', make_rates(), {'split_trades': 'on', 'trade_all': True, 'amount': 0,
+                                                  'early_cancel': True, 'threshold_rate': 0}, default_params)
+    for _ in range(ticks):
+        start = time.perf_counter()
+        if parser:
+            market, panel = parser.parse(content, 'utf-8')
+        else:
+            market, panel = parse_page(content.decode('utf-8'))
+        try:
+            decide(state, market, panel)
+        except STRATEGY_ERRORS:
+            pass
+        latencies.append(time.perf_counter() - start)
+        time.sleep(delay)
+
+
+def measure(content, traders, ticks, delay, gui_load, parser=None):
+    """Tick latencies in seconds, sorted"""
+    latencies = []
+    stop = threading.Event()
+    gui = threading.Thread(target=busy_gui, args=(gui_load, stop), daemon=True)
+    if gui_load:
+        gui.start()
+    threads = [threading.Thread(target=run_trader, args=(content, parser, ticks, delay, latencies))
+               for _ in range(traders)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stop.set()
+    return sorted(latencies)
+
+
+def percentile(values, p):
+    return values[min(int(len(values)*p), len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare tick latency with in-thread and process parsing")
+    parser.add_argument('page', help="Saved trade currency page")
+    parser.add_argument('--traders', type=int, default=2)
+    parser.add_argument('--ticks', type=int, default=200, help="Ticks per trader")
+    parser.add_argument('--gui-load', type=float, default=.5, help="Share of each frame the GUI thread is busy")
+    parser.add_argument('--delay', type=float, default=DELAY)
+    args = parser.parse_args()
+
+    with open(args.page, 'rb') as f:
+        content = f.read()
+    process_parser = ProcessParser(args.traders)
+    process_parser.parse(content, 'utf-8') # Wait for the workers to start
+    print("{:<24}{:>9}{:>9}{:>9}{:>9}".format('ms per tick', 'p50', 'p95', 'p99', 'max'))
+    rows = [
+        ('thread, alone', dict(traders=1, gui_load=0)),
+        ('thread, contended', {}),
+        ('process, alone', dict(traders=1, gui_load=0, parser=process_parser)),
+        ('process, contended', dict(parser=process_parser)),
+    ]
+    for name, options in rows:
+        kwargs = dict(traders=args.traders, ticks=args.ticks, delay=args.delay, gui_load=args.gui_load)
+        kwargs.update(options)
+        latencies = measure(content, **kwargs)
+        print("{:<24}{:>9.2f}{:>9.2f}{:>9.2f}{:>9.2f}".format(
+            name, *(1000*percentile(latencies, p) for p in (.5, .95, .99, 1))))
+    process_parser.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Schedules the trader pairs of many accounts on a fixed set of worker threads"""
+from concurrent.futures import ThreadPoolExecutor
+from .clock import Scheduler, real_clock
+from .market import MarketFeed
+from .params import DELAY
+from .shutdown import shutdown, SHUTDOWN_DEADLINE
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class TraderPool:
+
+    """Runs every trader of the given accounts on max_workers threads, with one MarketFeed shared by the accounts.
+       Each trader is rescheduled its params.delay (or delay, if given) seconds after its last tick
+       finishes, so a trader never ticks twice at once and a slow account cannot hold up the others.
+       params.delay is read again after every tick, so a reloaded config takes effect at once.
+       With a virtual clock (a SimClock, by default the first account's clock) nothing runs until
+       run_until(), which ticks the traders one at a time on the calling thread in simulated time.
+       A SharedBookWriter given as shared_book gets every snapshot of the feed, for bots in other processes."""
+
+    def __init__(self, accounts, max_workers=None, delay=None, shared_feed=True, clock=None, shared_book=None):
+        self.accounts = list(accounts)
+        self.traders = [trader for account in self.accounts for trader in account.traders.values()]
+        self.delay = delay
+        self.clock = clock or (self.accounts[0].clock if self.accounts else real_clock)
+        self.scheduler = Scheduler(self.clock)
+        self.feed = None
+        if shared_feed and (len(self.accounts) > 1 or shared_book):
+            self.feed = MarketFeed(shared_book, self.clock)
+            for account in self.accounts:
+                self.feed.subscribe(account)
+        if max_workers is None:
+            max_workers = len(self.traders) + 1
+        self.executor = None if self.clock.virtual else ThreadPoolExecutor(max_workers=max_workers)
+        self.running = False
+        self._scheduler = None
+
+    def schedule(self, job, due, delay=DELAY):
+        """Runs job at clock time due. delay None is a trader's own params.delay."""
+        return self.scheduler.call_at(due, self._run_job, job, delay)
+
+    def start(self):
+        self.running = True
+        now = self.clock.time()
+        for trader in self.traders:
+            trader.started = True
+            self.schedule(trader.tick, now, self.delay)
+        if not self.clock.virtual:
+            self._scheduler = threading.Thread(target=self._run, name='TraderPool', daemon=True)
+            self._scheduler.start()
+
+    def _run(self):
+        while self.running:
+            timer = self.scheduler.next_timer()
+            if timer is None:
+                break
+            self.executor.submit(timer.run)
+
+    def run_until(self, end):
+        """Ticks the traders up to clock time end, for a virtual clock. Returns the number of ticks."""
+        return self.scheduler.run_until(end)
+
+    def _run_job(self, job, delay):
+        try:
+            keep = job()
+        except Exception as e:
+            logger.exception('%s', e)
+            keep = False
+        if keep and self.running:
+            next_delay = job.__self__.params.delay if delay is None else delay # job is a Trader's tick
+            self.schedule(job, self.clock.time() + next_delay, delay)
+
+    def stop(self, deadline=SHUTDOWN_DEADLINE):
+        """Stops scheduling and cancels the open trades of every trader. Returns a ShutdownReport."""
+        self.running = False
+        self.scheduler.stop()
+        report = shutdown(self.traders, deadline)
+        if self.executor:
+            self.executor.shutdown(wait=False)
+        if self.feed:
+            for account in self.accounts:
+                self.feed.unsubscribe(account)
+        return report
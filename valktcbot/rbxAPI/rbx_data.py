@@ -13,6 +13,8 @@ data = {
         'trade_remainder': lambda i: '//*[@id="ctl00_ctl00_cphRoblox_cphMyRobloxContent_ctl00_OpenBids_OpenBidsUpdatePanel"]/table/tr[' + str(i+1) + ']/td[2]/text()',
         # Starts at index 1
         'trade_info_path': lambda i: '//*[@id="CurrencyBidsPane"]/div/div[' + str(i) +']/text()',
+        # Every trade of the column, in order
+        'trade_column': '//*[@id="CurrencyBidsPane"]/div/div',
     },
     'Robux': {
         'current': '//*[@id="nav-robux-balance"]/text()',
@@ -27,6 +29,8 @@ data = {
         # Starts at index 1
         'trade_info_path': lambda i: ('//*[@id="CurrencyOffersPane"]/div/div[' + str(i) + ']/span/text()', 
                                       '//*[@id="CurrencyOffersPane"]/div/div[' + str(i) + ']/text()'),
+        # Every trade of the column, in order
+        'trade_column': '//*[@id="CurrencyOffersPane"]/div/div',
     },
     # Viewstate, EventValidation
     'VIEWSTATE': '//input[@name="__VIEWSTATE"]',
@@ -0,0 +1,237 @@
+"""Latency budgets, retries and a circuit breaker for every request the bot makes.
+
+Each kind of request (refresh, submit, cancel, login) has a RequestPolicy: a deadline
+for the whole request including retries, a timeout per attempt and a backoff between
+attempts. No attempt is started or allowed to run past the deadline, so a trader
+thread never waits longer than its budget while the market moves. A 5xx or 429 answer
+fails an attempt like a lost connection. Submits and cancels
+are only retried when the connection failed before the form was sent, since the
+server may have taken a form whose answer was lost, and a second submit is a second bid. After enough
+consecutive failures the CircuitBreaker rejects requests for a while instead of
+hammering a server that is down."""
+from .clock import real_clock
+from .errors import CircuitOpenError
+from .metrics import REQUESTS, REQUEST_SECONDS
+from .utils import LazyModule
+
+import logging
+import threading
+import time
+
+requests = LazyModule('requests')
+urllib3 = LazyModule('urllib3')
+logger = logging.getLogger(__name__)
+
+
+class RequestPolicy:
+
+    def __init__(self, deadline, connect_timeout, read_timeout, backoff=.1, max_attempts=5, retry_reads=True):
+        self.deadline = deadline # Seconds for the request including all retries
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.backoff = backoff # Seconds before the 2nd attempt, doubled after each attempt
+        self.max_attempts = max_attempts
+        self.retry_reads = retry_reads # Whether to retry after the request may have reached the server
+
+    def __repr__(self):
+        return "RequestPolicy(deadline={}, timeout=({}, {}), backoff={}, max_attempts={}, retry_reads={})".format(
+            self.deadline, self.connect_timeout, self.read_timeout, self.backoff, self.max_attempts, self.retry_reads)
+
+
+POLICIES = {
+    'refresh': RequestPolicy(deadline=2, connect_timeout=1, read_timeout=1.5, backoff=.05),
+    'submit': RequestPolicy(deadline=3, connect_timeout=1, read_timeout=2.5, backoff=.1, retry_reads=False),
+    'cancel': RequestPolicy(deadline=5, connect_timeout=1, read_timeout=3, backoff=.1, retry_reads=False),
+    'login': RequestPolicy(deadline=20, connect_timeout=5, read_timeout=10, backoff=.5, max_attempts=3),
+}
+TOO_MANY_REQUESTS = 429
+FAILURE_THRESHOLD = 5 # Consecutive failed requests before the circuit opens
+COOLDOWN = 10 # Seconds the circuit stays open before letting a trial request through
+
+
+def before_sent(error):
+    """Whether a failed request never reached the server: the connection could not be made in time"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ChunkedEncodingError)):
+        return False
+    reason = error.args[0] if error.args else None
+    reason = getattr(reason, 'reason', reason) # A MaxRetryError holds the error of the connection
+    return isinstance(reason, urllib3.exceptions.NewConnectionError)
+
+
+def failed_status(response):
+    """Whether the server answered with an error page of an outage or rate limit instead of the page"""
+    return response.status_code >= 500 or response.status_code == TOO_MANY_REQUESTS
+
+
+class CircuitBreaker:
+
+    """Closed: requests go through. Open: requests fail at once with CircuitOpenError.
+       Half open (after the cooldown): one trial request goes through, and closes the
+       circuit if it succeeds or opens it again if it fails."""
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, cooldown=COOLDOWN, clock=real_clock):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.times_opened = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if self.clock.time() - self.opened_at < self.cooldown:
+            return 'open'
+        return 'half open'
+
+    def before_request(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            now = self.clock.time()
+            if now - self.opened_at < self.cooldown or self.trial_running:
+                raise CircuitOpenError(self.opened_at + self.cooldown - now)
+            self.trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_running or (self.opened_at is None and self.failures >= self.failure_threshold):
+                if self.opened_at is None:
+                    logger.warning("Opening circuit after %s failed requests", self.failures)
+                    self.times_opened += 1
+                self.opened_at = self.clock.time()
+            self.trial_running = False
+
+
+class RequestStats:
+
+    """Counts for one kind of request"""
+
+    def __init__(self):
+        self.requests = 0
+        self.attempts = 0
+        self.retries = 0
+        self.failures = 0 # Requests that ran out of attempts or deadline
+        self.rejected = 0 # Requests stopped by an open circuit
+        self.time_lost = 0.0 # Seconds spent in failed attempts and backing off
+        self._lock = threading.Lock()
+
+    def record(self, attempts, failed=False, rejected=False, time_lost=0.0):
+        with self._lock:
+            self.requests += 1
+            self.attempts += attempts
+            self.retries += max(attempts - 1, 0)
+            self.failures += failed
+            self.rejected += rejected
+            self.time_lost += time_lost
+
+    def as_dict(self):
+        return {name: value for name, value in self.__dict__.items() if not name.startswith('_')}
+
+
+class PolicySession:
+
+    """Sends requests on a FuturesSession's worker threads following POLICIES.
+       Like FuturesSession, get() and post() return a Future. Deadlines and backoff are kept on clock."""
+
+    def __init__(self, session, policies=None, breaker=None, clock=real_clock):
+        self.session = session
+        self.clock = clock
+        self.policies = dict(POLICIES if policies is None else policies)
+        self.breaker = breaker or CircuitBreaker(clock=clock)
+        self.stats = {kind: RequestStats() for kind in self.policies}
+
+    def set_policies(self, policies, failure_threshold=None, cooldown=None):
+        """Replaces the policies (and the breaker's settings) for requests started from now on"""
+        self.policies = dict(policies) # One assignment, so a request reads either all old or all new policies
+        if failure_threshold is not None:
+            self.breaker.failure_threshold = failure_threshold
+        if cooldown is not None:
+            self.breaker.cooldown = cooldown
+
+    def get(self, kind, url, **kwargs):
+        return self.request(kind, 'GET', url, **kwargs)
+
+    def post(self, kind, url, data=None, **kwargs):
+        return self.request(kind, 'POST', url, data=data, **kwargs)
+
+    def request(self, kind, method, url, **kwargs):
+        deadline = self.clock.time() + self.policies[kind].deadline # Time waiting for a worker counts too
+        return self.session.executor.submit(self.request_now, kind, method, url, deadline, **kwargs)
+
+    def request_now(self, kind, method, url, deadline=None, **kwargs):
+        """Sends the request on the calling thread, retrying until it succeeds or the deadline passes"""
+        policy = self.policies[kind]
+        stats = self.stats[kind]
+        clock = self.clock
+        if deadline is None:
+            deadline = clock.time() + policy.deadline
+        try:
+            self.breaker.before_request()
+        except CircuitOpenError:
+            stats.record(0, rejected=True)
+            REQUESTS.labels(kind, 'rejected').inc()
+            raise
+        request_start = time.perf_counter()
+        backoff = policy.backoff
+        attempts = 0
+        time_lost = 0.0
+        while True:
+            attempts += 1
+            start = clock.time()
+            remaining = deadline - start
+            try:
+                if remaining <= 0:
+                    raise requests.exceptions.Timeout("{} request waited past its deadline".format(kind))
+                timeout = (min(policy.connect_timeout, remaining), min(policy.read_timeout, remaining))
+                # Plain requests.Session.request; the FuturesSession override would queue it again
+                r = requests.Session.request(self.session, method, url, timeout=timeout, **kwargs)
+                if failed_status(r):
+                    # The form reached the server, so a submit or cancel is not sent again
+                    raise requests.exceptions.ConnectionError(
+                        "{} request got HTTP {}".format(kind, r.status_code), response=r)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError) as e:
+                now = clock.time()
+                time_lost += now - start
+                if (attempts >= policy.max_attempts or now + backoff >= deadline or
+                        not (policy.retry_reads or before_sent(e))):
+                    self._failed(kind, attempts, time_lost, request_start)
+                    logger.debug("%s request failed after %s attempts: %s", kind, attempts, e)
+                    raise
+                clock.sleep(backoff)
+                time_lost += backoff
+                backoff *= 2
+            except BaseException: # Anything else still ends a half open circuit's trial
+                self._failed(kind, attempts, time_lost + clock.time() - start, request_start)
+                raise
+            else:
+                stats.record(attempts, time_lost=time_lost)
+                REQUESTS.labels(kind, 'ok').inc()
+                REQUEST_SECONDS.labels(kind).observe(time.perf_counter() - request_start)
+                self.breaker.record_success()
+                return r
+
+    def _failed(self, kind, attempts, time_lost, request_start):
+        self.stats[kind].record(attempts, failed=True, time_lost=time_lost)
+        REQUESTS.labels(kind, 'failed').inc()
+        REQUEST_SECONDS.labels(kind).observe(time.perf_counter() - request_start)
+        self.breaker.record_failure()
+
+    def metrics(self):
+        """Retry counts and time lost per kind of request, plus the circuit breaker's state"""
+        result = {kind: stats.as_dict() for kind, stats in self.stats.items()}
+        result['circuit'] = {'state': self.breaker.state, 'times_opened': self.breaker.times_opened}
+        return result
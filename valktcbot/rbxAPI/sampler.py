@@ -0,0 +1,137 @@
+"""A sampling profiler that can be started and stopped while the bot trades.
+
+A daemon thread reads the stack of every other thread every PROFILE_INTERVAL seconds
+(sys._current_frames) and counts each distinct stack. Nothing is hooked into the
+traders, so a tick costs exactly the same with the profiler off. With it on, each
+sample holds the GIL for a few microseconds. Stopping writes the counts as collapsed
+stacks, one "thread;outer;...;inner count" line per stack, which flamegraph.pl,
+speedscope and inferno read directly:
+
+    flamegraph.pl profile-20170101-120000.folded > profile.svg
+
+Toggle it with profiler.toggle(), Ctrl+Shift+P in the GUI, or SIGUSR1 to headless.py."""
+from collections import Counter
+
+import os
+import signal
+import sys
+import threading
+import time
+
+PROFILE_INTERVAL = .005 # Seconds between samples
+PROFILE_DIR = '.' # Where collapsed stack files are written
+MAX_DEPTH = 128 # Frames kept per stack, innermost first
+TOP_FUNCTIONS = 15 # Functions printed when a profile is written
+
+
+class SamplingProfiler:
+
+    def __init__(self, interval=PROFILE_INTERVAL, directory=PROFILE_DIR):
+        self.interval = interval
+        self.directory = directory
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = None
+        self._labels = {} # Code object -> frame label, so each function is formatted once
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.stacks = Counter()
+            self.samples = 0
+            self.started_at = time.time()
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='Sampler', daemon=True)
+            self._thread.start()
+        print("Profiling started, sampling every {:g} ms".format(self.interval*1000))
+
+    def stop(self):
+        """Stops sampling and writes the profile. Returns the path of the file, or None if it was not running."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is None:
+                return None
+            self._stopping.set()
+        thread.join()
+        path = self.write()
+        print("Profiling stopped: {} samples written to {}".format(self.samples, path))
+        for label, count in self.top_functions():
+            print("{:>7.1%}  {}".format(count/max(self.samples, 1), label))
+        return path
+
+    def toggle(self):
+        """Starts the profiler if it is stopped and stops it (writing the profile) if it is running"""
+        if self.running:
+            return self.stop()
+        self.start()
+        return None
+
+    def _label(self, code):
+        try:
+            return self._labels[code]
+        except KeyError:
+            label = self._labels[code] = '{} ({}:{})'.format(code.co_name, os.path.basename(code.co_filename),
+                                                             code.co_firstlineno)
+            return label
+
+    def sample(self):
+        """Counts the current stack of every thread but this one"""
+        me = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_DEPTH:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(ident, 'Thread-{}'.format(ident)))
+            self.stacks[tuple(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            self.sample()
+
+    def collapsed(self):
+        """The profile as collapsed stack lines"""
+        return ['{} {}'.format(';'.join(stack), count) for stack, count in sorted(self.stacks.items())]
+
+    def top_functions(self, top=TOP_FUNCTIONS):
+        """(label, samples) of the functions most often on top of a stack"""
+        counts = Counter()
+        for stack, count in self.stacks.items():
+            counts[stack[-1]] += count
+        return counts.most_common(top)
+
+    def write(self, path=None):
+        if path is None:
+            path = os.path.join(self.directory, time.strftime('profile-%Y%m%d-%H%M%S.folded',
+                                                              time.localtime(self.started_at)))
+        with open(path, 'w') as f:
+            f.write('\n'.join(self.collapsed()) + '\n')
+        return path
+
+
+profiler = SamplingProfiler() # The profiler the GUI, headless.py and the signal handler toggle
+
+
+def toggle_on_signal(signum=None):
+    """Toggles profiler whenever signum (SIGUSR1 by default) is received. Returns False where the signal
+       does not exist, such as on Windows."""
+    signum = signum or getattr(signal, 'SIGUSR1', None)
+    if signum is None:
+        return False
+    def on_signal(signum, frame):
+        # The handler runs on the main thread between bytecodes, so stop (which joins) is done elsewhere
+        threading.Thread(target=profiler.toggle, name='SamplerToggle').start()
+    signal.signal(signum, on_signal)
+    return True
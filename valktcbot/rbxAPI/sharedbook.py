@@ -0,0 +1,175 @@
+"""The latest market snapshot in shared memory, for traders in other processes.
+
+One writer (the MarketFeed of a process whose accounts fetch the page) packs each
+MarketSnapshot into a fixed layout in a multiprocessing.shared_memory segment. Any number
+of reader processes unpack it without pickling, pipes or locks. The segment starts with a
+seqlock version: the writer makes it odd before writing and even again after, and a
+reader retries if the version was odd or changed while it was reading.
+
+share_book() connects an account either way, from [Bot] publish_book or read_book (or
+headless.py --publish-book/--read-book): one bot publishes under a name, and bots of
+other accounts started with that name read its snapshots instead of parsing the market
+part of their own page whenever the shared one is as new.
+
+Layout (native byte order, 8 byte aligned, see _BODY):
+    version, seq                           2 x uint64
+    time                                   double
+    spread, tix_rate, robux_rate           3 x int64 units
+    robux_at_market, tix_len, robux_len    3 x uint64
+    tix column, robux column               BOOK_DEPTH x (int64 amount, int64 rate) each,
+                                           amount -1 for an entry @ Market"""
+from .clock import real_clock
+from .market import MarketFeed, MarketSnapshot, NUM_TRADES, FEED_MAX_AGE
+from .utils import LazyModule
+
+import struct
+import time
+
+shared_memory = LazyModule('multiprocessing.shared_memory')
+
+BOOK_DEPTH = NUM_TRADES + 1 # Entries kept per column
+READ_RETRIES = 1000 # Attempts before a reader gives up on a writer that keeps writing
+
+_VERSION = struct.Struct('Q')
+_BODY = struct.Struct('Qd3q3Q' + 'qq'*2*BOOK_DEPTH) # Everything after the version, packed in one call
+_HEADER_FIELDS = 8
+_EMPTY = (-1, 0)
+SIZE = _VERSION.size + _BODY.size
+
+_created = set() # Segments made by this process, which the resource tracker must keep
+
+
+def _attach(name):
+    """Opens an existing segment without handing it to this process's resource tracker,
+       which would otherwise destroy it when this reader exits"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False) # Python 3.13+
+    except TypeError:
+        segment = shared_memory.SharedMemory(name=name)
+        if segment.name not in _created:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(segment._name, 'shared_memory')
+        return segment
+
+
+class SharedBookWriter:
+
+    """Publishes snapshots to a new segment. Only one process may write to a segment."""
+
+    def __init__(self, name=None):
+        self.segment = shared_memory.SharedMemory(name=name, create=True, size=SIZE)
+        self.name = self.segment.name
+        _created.add(self.name)
+        self.buf = self.segment.buf
+        self.version = 0
+        _VERSION.pack_into(self.buf, 0, 0)
+
+    def write(self, market):
+        buf = self.buf
+        self.version += 1 # Odd: readers retry until the write is done
+        _VERSION.pack_into(buf, 0, self.version)
+        tix_column, robux_column = market.tix_column[:BOOK_DEPTH], market.robux_column[:BOOK_DEPTH]
+        values = [market.seq, market.time, market.spread, market.tix_rate, market.robux_rate,
+                  market.robux_at_market, len(tix_column), len(robux_column)]
+        for column in (tix_column, robux_column):
+            for info in column:
+                values += info or _EMPTY
+            values += _EMPTY*(BOOK_DEPTH - len(column))
+        _BODY.pack_into(buf, _VERSION.size, *values)
+        self.version += 1
+        _VERSION.pack_into(buf, 0, self.version)
+
+    def close(self):
+        """Closes and destroys the segment. Readers that are still attached keep their mapping."""
+        self.buf = None
+        self.segment.close()
+        self.segment.unlink()
+
+
+class SharedBookReader:
+
+    """Reads the snapshots of a SharedBookWriter from any process. Has the same latest(), since() and
+       offer() as MarketFeed, so it can be an account's feed: account.feed = SharedBookReader(name)."""
+
+    def __init__(self, name, clock=real_clock):
+        self.segment = _attach(name)
+        self.clock = clock
+        self.buf = self.segment.buf
+        self.last_version = None
+        self.snapshot = None
+
+    def version(self):
+        return _VERSION.unpack_from(self.buf, 0)[0]
+
+    def read(self):
+        """The current snapshot, or None if nothing has been written yet or the reader is closed"""
+        buf = self.buf
+        if buf is None:
+            return None
+        for _ in range(READ_RETRIES):
+            version = _VERSION.unpack_from(buf, 0)[0]
+            if version == 0: # Nothing written yet, and a writer never goes back to 0, so a 0 read later is not news
+                return self.snapshot
+            if version & 1: # Being written
+                time.sleep(0) # Let the writer finish, it may be waiting for this core
+                continue
+            if version == self.last_version: # Unchanged, no need to unpack it again
+                return self.snapshot
+            values = _BODY.unpack_from(buf, _VERSION.size)
+            if _VERSION.unpack_from(buf, 0)[0] != version: # Torn read
+                time.sleep(0)
+                continue
+            seq, snapshot_time, spread, tix_rate, robux_rate, at_market, tix_len, robux_len = values[:_HEADER_FIELDS]
+            columns = []
+            start = _HEADER_FIELDS
+            for length in (tix_len, robux_len):
+                flat = values[start:start + 2*length]
+                columns.append([None if amount == -1 else (amount, rate) for amount, rate in zip(flat[::2], flat[1::2])])
+                start += 2*BOOK_DEPTH
+            self.last_version = version
+            self.snapshot = MarketSnapshot(spread, tix_rate, robux_rate, columns[0], columns[1], bool(at_market),
+                                           seq, snapshot_time)
+            return self.snapshot
+        raise TimeoutError("Shared book {} kept changing while being read".format(self.segment.name))
+
+    def latest(self, max_age=FEED_MAX_AGE):
+        """Returns the newest snapshot, or None if it is too old to trade on"""
+        snapshot = self.read()
+        if snapshot and self.clock.time() - snapshot.time <= max_age:
+            return snapshot
+        return None
+
+    def since(self, requested):
+        """Returns the newest snapshot if its page was requested at or after time requested, else None"""
+        snapshot = self.read()
+        if snapshot and snapshot.time >= requested:
+            return snapshot
+        return None
+
+    def offer(self, snapshot):
+        """Only the writer's process publishes, so a snapshot parsed here is not shared"""
+        return False
+
+    def close(self):
+        """Detaches from the segment. From then on the reader has no snapshots, so traders fetch their own."""
+        if self.buf is None:
+            return
+        self.buf = None
+        self.snapshot = None
+        self.segment.close()
+
+
+def share_book(account, publish=None, read=None):
+    """Publishes the markets account parses to a new segment named publish, or makes the segment named
+       read (published by another process) account's feed. Returns the SharedBookWriter or SharedBookReader
+       to close when the bot ends, or None if neither name is given. Raises FileExistsError if publish is
+       taken, and FileNotFoundError if nothing publishes read."""
+    if publish:
+        writer = SharedBookWriter(publish)
+        MarketFeed(writer, account.clock).subscribe(account)
+        return writer
+    if read:
+        reader = SharedBookReader(read, account.clock)
+        account.feed = reader
+        return reader
+    return None
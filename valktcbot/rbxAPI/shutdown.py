@@ -0,0 +1,145 @@
+"""Stopping traders and cancelling their open bids within a deadline.
+
+shutdown() stops every trader first and waits for ticks in progress, so none submits a
+bid after the final page is read. It then fetches one fresh page per account. The
+cancels of each currency are sent one after another from the bottom up, so no index
+moves before it is used, while the accounts and both currencies go side by side. The
+page is then fetched again every CONFIRM_INTERVAL until it shows the bids gone, and bids
+it still shows RECANCEL_AFTER seconds after their cancels were sent are cancelled again.
+Whatever is still running at the deadline is abandoned and reported."""
+from .bus import CancelSent
+from .clock import real_clock
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+SHUTDOWN_DEADLINE = 8 # Seconds to stop the traders and cancel their bids
+CONFIRM_INTERVAL = .25 # Seconds between fetches of the page until it shows our bids gone
+RECANCEL_AFTER = 1 # Seconds after sending cancels before the bids still shown are cancelled again
+
+
+class ShutdownReport:
+
+    """What shutdown() cancelled. Bids are listed as the remaining amount shown on the page."""
+
+    def __init__(self):
+        self.cancelled = {'Tickets': [], 'Robux': []} # Bids a cancel was sent for
+        self.unconfirmed = {'Tickets': [], 'Robux': []} # Bids that may still be open
+        self.errors = [] # Accounts whose bids could not be read or cancelled
+        self.timed_out = False
+        self.seconds = 0.0
+
+    @property
+    def ok(self):
+        return not (self.timed_out or self.errors or any(self.unconfirmed.values()))
+
+    def __str__(self):
+        sent = sum(len(bids) for bids in self.cancelled.values())
+        text = "Cancelled {} bid(s) in {:.2f} seconds".format(sent, self.seconds)
+        if self.timed_out:
+            text += ", stopped at the deadline"
+        for currency, bids in self.unconfirmed.items():
+            if bids:
+                text += "\nCould not confirm that these {} bids were cancelled: {}".format(
+                    currency, ', '.join(str(amount) for amount in bids))
+        for error in self.errors:
+            text += "\n" + error
+        return text
+
+
+def _cancel_bids(account, panel, currency, deadline):
+    """Cancels our open bids of currency one at a time, bottom up, so the index of each is still right when
+       it is sent"""
+    for index in range(len(panel.open_bids[currency]), 0, -1):
+        future = account.exchange.cancel_bid(panel, currency, index)
+        if future is not None: # SimExchange cancels without a Future
+            future.result(timeout=max(deadline - account.clock.time(), 0))
+
+
+def _cancel_account(account, traders, report, deadline):
+    """Cancels the open bids of account's traders, filling in report"""
+    market, panel = account.exchange.fetch()
+    for trader in traders:
+        trader.panel = panel # The trade log gets the remainders as they are now
+        trader.close_current_trade()
+    unconfirmed = {}
+    for trader in traders:
+        bids = list(panel.open_bids[trader.currency])
+        unconfirmed[trader.currency] = bids
+        report.unconfirmed[trader.currency] += bids # Until a page shows them gone
+        report.cancelled[trader.currency] += bids
+        if bids:
+            trader.fills.expect_cancel(account.clock.time())
+            account.bus.publish(CancelSent(trader.currency, account.clock.time(), list(bids)))
+    if not any(unconfirmed.values()):
+        return
+
+    def cancel(currency, panel):
+        try:
+            _cancel_bids(account, panel, currency, deadline)
+        except Exception as e:
+            logger.warning("Cancelling the %s bids of %s failed: %s", currency, account, e)
+            report.errors.append("Could not cancel the {} bids of {}: {!r}".format(currency, account, e))
+
+    def cancel_all(panel):
+        # The currencies are cancelled side by side
+        threads = [threading.Thread(target=cancel, args=(currency, panel), name='Shutdown', daemon=True)
+                   for currency, bids in unconfirmed.items() if bids]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(max(deadline - account.clock.time(), 0))
+
+    cancel_all(panel)
+    sent = account.clock.time()
+    while True:
+        market, panel = account.exchange.fetch()
+        for currency, bids in unconfirmed.items():
+            still_open = list(panel.open_bids[currency])
+            for amount in bids: # Other accounts may have bids in the same list
+                report.unconfirmed[currency].remove(amount)
+            report.unconfirmed[currency] += still_open
+            unconfirmed[currency] = still_open
+        if not any(unconfirmed.values()) or account.clock.time() >= deadline:
+            return
+        if account.clock.time() - sent >= RECANCEL_AFTER: # The cancels were lost or refused
+            logger.info("Cancelling the bids of %s again: %s", account, unconfirmed)
+            cancel_all(panel)
+            sent = account.clock.time()
+        account.clock.sleep(min(CONFIRM_INTERVAL, max(deadline - account.clock.time(), 0)))
+
+
+def shutdown(traders, deadline=SHUTDOWN_DEADLINE):
+    """Stops traders and cancels their open bids, taking at most about deadline seconds.
+       Returns a ShutdownReport. The deadline is kept on the clock of the first trader's account, so a
+       simulated shutdown takes simulated time."""
+    clock = traders[0].clock if traders else real_clock
+    start = clock.time()
+    end = start + deadline
+    report = ShutdownReport()
+    for trader in traders:
+        trader.started = False
+    for trader in traders:
+        if not trader.wait_idle(max(end - clock.time(), 0)):
+            logger.warning("%s trader was still ticking at the deadline", trader.currency)
+    by_account = {}
+    for trader in traders:
+        by_account.setdefault(trader.account, []).append(trader)
+
+    def run(account, account_traders):
+        try:
+            _cancel_account(account, account_traders, report, end)
+        except Exception as e:
+            logger.warning("Cancelling the bids of %s failed: %s", account, e)
+            report.errors.append("Could not cancel the bids of {}: {!r}".format(account, e))
+
+    threads = [threading.Thread(target=run, args=item, name='Shutdown', daemon=True) for item in by_account.items()]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(max(end - clock.time(), 0))
+        report.timed_out |= thread.is_alive()
+    report.seconds = clock.time() - start
+    return report
@@ -0,0 +1,149 @@
+"""Working out the likely next order while the trader waits for the page.
+
+Balancing an amount against a rate (kernel.balance_amounts) is the slow part of deciding
+a trade: a loop over every amount within the tolerance, a few hundred microseconds for
+large tix balances. Its result only depends on the currency, the amount, the rate and the
+tolerance params, so it can be worked out before the page arrives.
+
+At the start of each refresh the trader hands its last snapshots to the account's
+Speculator, whose thread balances our amount to trade against the first SPECULATE_DEPTH
+rates of our column that the decision would accept, as shown and one step better, and
+against the threshold rate setting. The results go into the trader's OrderCache, which balance_amounts reads first.
+A decision that finds its order there goes straight to the POST. The share of orders
+found and the time saved are logged every LOG_EVERY orders and counted in the
+rbx_speculation metrics."""
+from collections import OrderedDict
+from .errors import NoMoneyError, MarketTraderError
+from .kernel import amount_to_trade, better_rate, compute_balance_amounts, rate_problem, threshold_rate
+from .metrics import SPECULATION, SPECULATION_SAVED
+from .utils import LazyModule
+
+import logging
+import threading
+import time
+
+requests = LazyModule('requests')
+logger = logging.getLogger(__name__)
+
+SPECULATE_DEPTH = 3 # Acceptable rates from the top of our column that are balanced ahead of time
+CACHE_SIZE = 64 # Orders an OrderCache keeps
+LOG_EVERY = 100 # Orders between log lines of the hit rate
+
+
+class OrderCache:
+
+    """Results of compute_balance_amounts by (currency, amount, rate, tolerance params), with the time each took"""
+
+    def __init__(self, currency):
+        self.currency = currency
+        self.orders = OrderedDict() # key -> (result, seconds, speculated)
+        self.lookups = self.hits = 0
+        self.saved = 0.0 # Seconds
+        self.counters = {outcome: SPECULATION.labels(currency, outcome) for outcome in ('speculated', 'repeated',
+                                                                                       'missed')}
+        self.saved_counter = SPECULATION_SAVED.labels(currency)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(currency, amount, rate, params):
+        return currency, amount, rate, params.tolerance_base, params.tolerance_step, params.tolerance_max
+
+    def put(self, key, result, seconds, speculated):
+        with self._lock:
+            self.orders[key] = (result, seconds, speculated)
+            self.orders.move_to_end(key)
+            while len(self.orders) > CACHE_SIZE:
+                self.orders.popitem(last=False)
+
+    def compute(self, currency, amount, rate, params, speculated=False):
+        """compute_balance_amounts, kept for next time"""
+        key = self.key(currency, amount, rate, params)
+        start = time.perf_counter()
+        result = compute_balance_amounts(currency, amount, rate, params)
+        self.put(key, result, time.perf_counter() - start, speculated)
+        return result
+
+    def balance_amounts(self, currency, amount, rate, params):
+        entry = self.orders.get(self.key(currency, amount, rate, params))
+        self.lookups += 1
+        if entry is None:
+            self.counters['missed'].inc()
+            result = self.compute(currency, amount, rate, params)
+        else:
+            result, seconds, speculated = entry
+            self.hits += 1
+            self.saved += seconds
+            self.counters['speculated' if speculated else 'repeated'].inc()
+            self.saved_counter.inc(seconds)
+        if self.lookups % LOG_EVERY == 0:
+            logger.info("%s orders: %d of %d found ready (%.0f%%), %.1f ms saved", self.currency, self.hits,
+                        self.lookups, 100*self.hits/self.lookups, self.saved*1000)
+        return result
+
+
+class Speculator:
+
+    """Fills the OrderCaches of an account's traders on one daemon thread. Only the latest request of
+       each currency is kept, so a slow round never queues up."""
+
+    def __init__(self, depth=SPECULATE_DEPTH):
+        self.depth = depth
+        self.pending = {} # Currency -> (cache, state, market, panel)
+        self._changed = threading.Condition(threading.Lock())
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='Speculator', daemon=True)
+        self._thread.start()
+
+    def speculate(self, cache, state, market, panel):
+        """Balances the likely next orders of the trader in state, from the snapshots of its last refresh"""
+        with self._changed:
+            self.pending[state.currency] = (cache, state, market, panel)
+            self._changed.notify()
+
+    def candidates(self, state, market, panel):
+        """(amount, rate) of the orders the next decision will most likely balance: the first rates of our
+           column that calculate_trade would try on these snapshots, each as shown and one step better"""
+        try:
+            amount = amount_to_trade(state, panel)
+            this_top_rate = market.trade_info(state.currency, 1)[1]
+            other_threshold_rate = threshold_rate(state, market)
+        except (NoMoneyError, MarketTraderError, requests.exceptions.ConnectionError):
+            return []
+        currency = state.currency
+        rates = []
+        for info in market.column(currency)[:state.params.num_trades]:
+            if info is None or len(rates) >= 2*self.depth:
+                break
+            if not rate_problem(state, info[1], this_top_rate, other_threshold_rate):
+                rates += [info[1], better_rate(currency, info[1])]
+        threshold_setting = state.config['threshold_rate']
+        if threshold_setting:
+            rates.append(better_rate(state.other_currency, threshold_setting))
+        return [(amount, rate) for rate in rates]
+
+    def run_once(self, cache, state, market, panel):
+        for amount, rate in self.candidates(state, market, panel):
+            if cache.key(state.currency, amount, rate, state.params) in cache.orders:
+                continue
+            try:
+                cache.compute(state.currency, amount, rate, state.params, speculated=True)
+            except ZeroDivisionError: # No amount balances at this rate; the decision will find that too
+                pass
+
+    def _run(self):
+        while True:
+            with self._changed:
+                self._changed.wait_for(lambda: self.pending or self._stopping)
+                if self._stopping:
+                    return
+                currency, request = self.pending.popitem()
+            try:
+                self.run_once(*request)
+            except Exception:
+                logger.exception("Speculating the next %s order failed", currency)
+
+    def stop(self):
+        with self._changed:
+            self._stopping = True
+            self._changed.notify()
+        self._thread.join()
@@ -0,0 +1,454 @@
+"""A local stand-in for the trade currency page, for load tests (see loadtest.py).
+
+StandInMarket keeps one order book and the balances of any number of accounts.
+StandInServer serves it over HTTP on 127.0.0.1. For each account it renders the page
+that account would see, with the elements of rbx_data.py. It takes the form posts of
+LiveExchange: a submit from the give and receive boxes, and a cancel of an open bid by
+its index. Accounts are told apart by their ACCOUNT_COOKIE cookie and start with the
+server's balances.
+
+Like Roblox, the stand-in only shows a submit or cancel lag seconds after it was posted.
+A submit that costs more than the balance is dropped. The scripted competitors in
+COMPETITORS trade on the same book from the server's process without that lag.
+
+GET /stats returns the counts of the requests answered, orders, trades and rejections
+as JSON. Rates are in units (units.py). Every order is a split trade, and a trade is
+made at the rate of the order that was already waiting."""
+from bisect import insort
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+from .market import NUM_TRADES
+from .rbx_data import data
+from .units import RATE_SCALE, STEP, ratio_round, to_float, to_units
+
+import heapq
+import itertools
+import json
+import logging
+import random
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+ACCOUNT_COOKIE = 'standin_account'
+PAGE_PATH = '/My/Money.aspx'
+LAG = .5 # Seconds before a posted submit or cancel shows on the page
+START_BALANCES = {'Tickets': 5000, 'Robux': 500}
+START_RATE = 10.6 # Tix per robux the competitors' market starts around
+COMPETITOR_BALANCE = 10**9 # Of each currency, so a competitor never runs out
+SHOWN_TRADES = NUM_TRADES + 1 # Entries of each column on the page
+
+OPEN_BIDS_PANEL = {
+    'Tickets': 'ctl00_ctl00_cphRoblox_cphMyRobloxContent_ctl00_OpenBids_OpenBidsUpdatePanel',
+    'Robux': 'ctl00_ctl00_cphRoblox_cphMyRobloxContent_ctl00_OpenOffers_OpenOffersUpdatePanel',
+}
+CANCEL_TARGET = re.compile(r'\$ctrl(\d+)\$ctl00\$Cancel(Bid|Offer)Button$')
+CANCEL_CURRENCY = {'Bid': 'Tickets', 'Offer': 'Robux'}
+
+
+class Order:
+
+    def __init__(self, account, currency, give, receive, seq):
+        self.account = account
+        self.currency = currency
+        self.remaining = give # Left to give, shown in the open bids panel and the column
+        self.wanted = receive # Left to receive
+        self.seq = seq
+        # Tix per robux, as the columns show it
+        self.rate = ratio_round(give, receive) if currency == 'Tickets' else ratio_round(receive, give)
+
+    def priority(self):
+        """Sort key of the column: best rate first, then oldest"""
+        return (-self.rate if self.currency == 'Tickets' else self.rate), self.seq
+
+    def crosses(self, rate):
+        """Whether this order takes a waiting order of the other column at rate"""
+        return self.rate >= rate if self.currency == 'Tickets' else self.rate <= rate
+
+
+class StandInMarket:
+
+    """The book, the accounts and the processing lag. Every method takes the lock, so the server's
+       threads and the competitors can share it."""
+
+    def __init__(self, balances=None, lag=LAG):
+        self.start_balances = dict(balances or START_BALANCES)
+        self.lag = lag
+        self.balances = {} # Account -> {currency: balance}
+        self.open = {} # Account -> {currency: [Order]}, oldest first
+        self.book = {'Tickets': [], 'Robux': []} # Orders by priority
+        self.pending = [] # Heap of (due time, sequence, function, args) of posts not shown yet
+        self.counts = dict.fromkeys(('refresh', 'submit', 'cancel', 'orders', 'trades', 'rejected', 'cancelled'), 0)
+        self._seq = itertools.count()
+        self._lock = threading.RLock()
+
+    def account(self, name):
+        if name not in self.balances:
+            self.balances[name] = dict(self.start_balances)
+            self.open[name] = {'Tickets': [], 'Robux': []}
+        return self.balances[name]
+
+    def _advance(self):
+        now = time.time()
+        while self.pending and self.pending[0][0] <= now:
+            due, seq, function, args = heapq.heappop(self.pending)
+            function(*args)
+
+    def _later(self, function, *args):
+        if self.lag:
+            heapq.heappush(self.pending, (time.time() + self.lag, next(self._seq), function, args))
+        else:
+            function(*args)
+
+    def count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def post_submit(self, name, currency, give, receive):
+        with self._lock:
+            self.counts['submit'] += 1
+            self.account(name)
+            self._later(self._posted_submit, name, currency, give, receive)
+
+    def _posted_submit(self, name, currency, give, receive):
+        if self.submit(name, currency, give, receive) is None:
+            self.counts['rejected'] += 1 # Only ours; a competitor just tries again
+
+    def post_cancel(self, name, currency, index):
+        """Cancels the open bid at index (Starting at index = 1) as the page showed it when the cancel was posted"""
+        with self._lock:
+            self.counts['cancel'] += 1
+            self._advance()
+            bids = self.open.get(name, {}).get(currency, [])
+            if 0 < index <= len(bids):
+                self._later(self.cancel, bids[index - 1])
+
+    def submit(self, name, currency, give, receive):
+        """Places an order at once. Returns it, or None if the account cannot pay for it."""
+        with self._lock:
+            balances = self.account(name)
+            if give <= 0 or receive <= 0 or give > balances[currency]:
+                return None
+            balances[currency] -= give
+            order = Order(name, currency, give, receive, next(self._seq))
+            self.counts['orders'] += 1
+            self._match(order)
+            if order.remaining and order.wanted:
+                insort(self.book[currency], order, key=Order.priority)
+                self.open[name][currency].append(order)
+            else:
+                self._close(order)
+            return order
+
+    def cancel(self, order):
+        with self._lock:
+            if order in self.open[order.account][order.currency]:
+                self.counts['cancelled'] += 1
+                self.book[order.currency].remove(order)
+                self._close(order)
+
+    def _close(self, order):
+        """Refunds what an order did not give and takes it off the panel"""
+        self.balances[order.account][order.currency] += order.remaining
+        order.remaining = 0
+        bids = self.open[order.account][order.currency]
+        if order in bids:
+            bids.remove(order)
+
+    def _match(self, order):
+        other = 'Robux' if order.currency == 'Tickets' else 'Tickets'
+        waiting = self.book[other]
+        while waiting and order.remaining and order.wanted and order.crosses(waiting[0].rate):
+            top = waiting[0]
+            tix, robux = (order, top) if order.currency == 'Tickets' else (top, order)
+            amount = min(tix.wanted, robux.remaining) # Robux that change hands
+            paid = min(amount*top.rate//RATE_SCALE, tix.remaining)
+            if not amount or not paid:
+                break
+            tix.remaining -= paid
+            tix.wanted -= amount
+            robux.remaining -= amount
+            robux.wanted = max(robux.wanted - paid, 0)
+            self.balances[tix.account]['Robux'] += amount
+            self.balances[robux.account]['Tickets'] += paid
+            self.counts['trades'] += 1
+            if not (top.remaining and top.wanted):
+                waiting.pop(0)
+                self._close(top)
+
+    def top_rate(self, currency):
+        with self._lock:
+            column = self.book[currency]
+            return column[0].rate if column else None
+
+    def page(self, name):
+        """The trade currency page as account name sees it"""
+        with self._lock:
+            self.counts['refresh'] += 1
+            self._advance()
+            balances = dict(self.account(name))
+            bids = {currency: [order.remaining for order in orders] for currency, orders in self.open[name].items()}
+            columns = {currency: [(order.remaining, order.rate) for order in orders[:SHOWN_TRADES]]
+                       for currency, orders in self.book.items()}
+        return render_page(balances, bids, columns)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts, accounts=len(self.balances), book={currency: len(orders) for currency, orders
+                                                                        in self.book.items()})
+
+
+def _rate_text(rate):
+    return '{:.4f}'.format(to_float(rate))
+
+
+def _panel(currency, bids):
+    panel_id = OPEN_BIDS_PANEL[currency]
+    if not bids:
+        return '<div id="{}"><div class="NoResults">You have no open trades</div></div>'.format(panel_id)
+    rows = ''.join('<tr class="TileGroup"><td>{}</td><td>{}</td></tr>'.format(currency, remaining)
+                   for remaining in bids)
+    return '<div id="{}"><table><tr><th>Trade</th><th>Remaining</th></tr>{}</table></div>'.format(panel_id, rows)
+
+
+def render_page(balances, bids, columns):
+    """A page with the parts of Money.aspx that rbx_data.py reads"""
+    tix_column, robux_column = columns['Tickets'], columns['Robux']
+    tix_top = tix_column[0][1] if tix_column else 0
+    robux_top = robux_column[0][1] if robux_column else 0
+    tix_divs = ''.join('<div>\r\n      {} Tix @ {}:1\r\n    </div>'.format(amount, _rate_text(rate))
+                       for amount, rate in tix_column)
+    robux_divs = ''.join('<div><span>{}</span> @ 1:{}\r\n</div>'.format(amount, _rate_text(rate))
+                         for amount, rate in robux_column)
+    return (
+        '<html><body>'
+        '<span id="nav-tix-balance">{tix}</span><span id="nav-robux-balance">{robux}</span>'
+        '<form><input name="__VIEWSTATE" value="standin"/><input name="__EVENTVALIDATION" value="standin"/></form>'
+        '<div id="CurrencyQuotePane"><div>'
+        '<div><div>Spread</div><div></div><div></div><div>{spread}</div></div>'
+        '<div><div>Rates</div><div>{tix_top}/{robux_top}</div></div>'
+        '</div></div>'
+        '<div id="CurrencyBidsPane"><div>{tix_divs}</div></div>'
+        '<div id="CurrencyOffersPane"><div>{robux_divs}</div></div>'
+        '{tix_panel}{robux_panel}'
+        '</body></html>'
+    ).format(tix=balances['Tickets'], robux=balances['Robux'], spread=_rate_text(robux_top - tix_top),
+             tix_top=_rate_text(tix_top), robux_top=_rate_text(robux_top), tix_divs=tix_divs, robux_divs=robux_divs,
+             tix_panel=_panel('Tickets', bids['Tickets']), robux_panel=_panel('Robux', bids['Robux']))
+
+
+class Competitor:
+
+    """A scripted trader on the server's side. step() runs every interval seconds on its own thread."""
+
+    def __init__(self, market, name, rng, interval):
+        self.market = market
+        self.name = name
+        self.rng = rng
+        self.interval = interval
+        self.orders = []
+
+    def drop_filled(self):
+        self.orders = [order for order in self.orders if order.remaining]
+
+    def place(self, currency, rate, amount):
+        """Gives amount of currency at rate"""
+        if currency == 'Tickets':
+            receive = amount*RATE_SCALE//rate
+        else:
+            receive = amount*rate//RATE_SCALE
+        order = self.market.submit(self.name, currency, amount, receive)
+        if order is not None and order.remaining:
+            self.orders.append(order)
+        return order
+
+    def run(self, stopping):
+        while not stopping.wait(self.interval*self.rng.uniform(.5, 1.5)):
+            try:
+                self.drop_filled()
+                self.step()
+            except Exception:
+                logger.exception("Competitor %s failed", self.name)
+
+
+class MarketMaker(Competitor):
+
+    """Keeps depth orders in both columns around a mid rate that drifts, replacing its oldest each step"""
+
+    def __init__(self, market, name, rng, interval=.5, depth=8, mid=START_RATE, spread=.1, drift=.002):
+        super().__init__(market, name, rng, interval)
+        self.depth = depth
+        self.mid = to_units(mid)
+        self.half_spread = to_units(spread)//2
+        self.drift = to_units(drift)
+        for _ in range(depth):
+            self.step()
+
+    def step(self):
+        self.mid += round(self.rng.gauss(0, self.drift))
+        for currency in ('Tickets', 'Robux'):
+            mine = [order for order in self.orders if order.currency == currency]
+            if len(mine) >= self.depth:
+                self.market.cancel(mine[0])
+                self.orders.remove(mine[0])
+            offset = self.half_spread + self.rng.randrange(0, 20*STEP)
+            if currency == 'Tickets':
+                self.place(currency, self.mid - offset, self.rng.randint(100, 3000))
+            else:
+                self.place(currency, self.mid + offset, self.rng.randint(10, 300))
+
+
+class Undercutter(Competitor):
+
+    """Keeps one order of its currency a step better than the top of the column, like our traders"""
+
+    def __init__(self, market, name, rng, interval=.3, currency='Tickets', amount=None):
+        super().__init__(market, name, rng, interval)
+        self.currency = currency
+        self.amount = amount or (rng.randint(200, 2000) if currency == 'Tickets' else rng.randint(20, 200))
+
+    def step(self):
+        top = self.market.top_rate(self.currency)
+        other_top = self.market.top_rate('Robux' if self.currency == 'Tickets' else 'Tickets')
+        if top is None or other_top is None or (self.orders and self.orders[0].rate == top):
+            return
+        rate = top + STEP if self.currency == 'Tickets' else top - STEP
+        if (rate >= other_top) if self.currency == 'Tickets' else (rate <= other_top): # Would cross the spread
+            return
+        for order in self.orders:
+            self.market.cancel(order)
+        self.orders = []
+        self.place(self.currency, rate, self.amount)
+
+
+class Taker(Competitor):
+
+    """Now and then trades a random amount against the top of a column, which fills the orders waiting there"""
+
+    def __init__(self, market, name, rng, interval=1.0):
+        super().__init__(market, name, rng, interval)
+
+    def step(self):
+        currency = self.rng.choice(('Tickets', 'Robux'))
+        other = 'Robux' if currency == 'Tickets' else 'Tickets'
+        top = self.market.top_rate(other)
+        if top is None:
+            return
+        amount = self.rng.randint(100, 2000) if currency == 'Tickets' else self.rng.randint(10, 200)
+        order = self.place(currency, top, amount)
+        if order is not None and order.remaining: # What did not fill at once is not left waiting
+            self.market.cancel(order)
+            self.orders.remove(order)
+
+
+COMPETITORS = (MarketMaker, Undercutter, Taker) # Handed out in turn, so there is a market maker to fill the book
+
+
+def make_competitors(market, count, seed=None):
+    rng = random.Random(seed)
+    competitors = []
+    for i in range(count):
+        kind = COMPETITORS[i % len(COMPETITORS)]
+        name = 'competitor{}'.format(i)
+        market.account(name).update(Tickets=COMPETITOR_BALANCE, Robux=COMPETITOR_BALANCE)
+        if kind is Undercutter:
+            competitors.append(Undercutter(market, name, rng, currency=('Tickets', 'Robux')[i//3 % 2]))
+        else:
+            competitors.append(kind(market, name, rng))
+    return competitors
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1' # Keep-alive, like the live site
+
+    def _account(self):
+        for cookie in self.headers.get_all('Cookie', []):
+            for pair in cookie.split(';'):
+                key, _, value = pair.strip().partition('=')
+                if key == ACCOUNT_COOKIE:
+                    return value
+        return 'anonymous'
+
+    def _send(self, body, content_type='text/html; charset=utf-8'):
+        body = body.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self._send('')
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self._send(json.dumps(self.server.market.stats()), 'application/json')
+        else:
+            self._send(self.server.market.page(self._account()))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        form = {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode()).items()}
+        target = form.get('__EVENTTARGET', '')
+        market = self.server.market
+        if target == data['submit_trade_button']:
+            try:
+                market.post_submit(self._account(), form[data['give_type']], int(form[data['give_box']]),
+                                   int(form[data['receive_box']]))
+            except (KeyError, ValueError):
+                market.count('rejected')
+        else:
+            match = CANCEL_TARGET.search(target)
+            if match:
+                market.post_cancel(self._account(), CANCEL_CURRENCY[match.group(2)], int(match.group(1)) + 1)
+        self._send('')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServer(ThreadingHTTPServer):
+
+    """Serves a StandInMarket and runs its competitors. port 0 takes a free port, see url."""
+
+    daemon_threads = True
+
+    def __init__(self, market, competitors=(), port=0):
+        super().__init__(('127.0.0.1', port), _Handler)
+        self.market = market
+        self.competitors = list(competitors)
+        self._stopping = threading.Event()
+        self._workers = []
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}{}'.format(self.server_address[1], PAGE_PATH)
+
+    def start(self):
+        self._workers = [threading.Thread(target=self.serve_forever, name='StandIn', daemon=True)]
+        self._workers += [threading.Thread(target=competitor.run, args=(self._stopping,), name=competitor.name,
+                                           daemon=True) for competitor in self.competitors]
+        for thread in self._workers:
+            thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        self.shutdown()
+        self.server_close()
+
+
+def serve(connection, balances=None, lag=LAG, competitors=0, seed=None, port=0):
+    """Runs a StandInServer in a process of its own, talking over connection (a multiprocessing Pipe end).
+       Sends the server's url first, then the market's stats for each message, and stops after 'stop'."""
+    market = StandInMarket(balances, lag)
+    server = StandInServer(market, make_competitors(market, competitors, seed), port)
+    server.start()
+    connection.send(server.url)
+    while connection.recv() != 'stop':
+        connection.send(market.stats())
+    server.stop()
+    connection.send(market.stats())
@@ -0,0 +1,149 @@
+"""Tunes the trading constants by backtesting many TraderParams on every core.
+
+Each --param is either a list of values, which are all tried (grid search), or a
+low:high range, which is sampled when --samples is given (random search). Every
+configuration is replayed over each history file in a separate process and the
+results are ranked by total profit. From valktcbot/:
+
+    python -m rbxAPI.sweep history.jsonl --param rgap=.003,.005,.01 --param tgap=.001,.0025,.005
+    python -m rbxAPI.sweep history.jsonl --param trade_lag_time=.5:3 --param rgap=.001:.01 --samples 200"""
+from concurrent.futures import ProcessPoolExecutor
+from .backtest import Backtest, load_configs, LATENCY, FILL_RATIO
+from .config import COUNTS
+from .market import load_history, NUM_TRADES
+from .params import default_params, RATE_PARAMS
+from .units import parse_rate, to_float
+
+import argparse
+import itertools
+import os
+import random
+import time
+
+_job = None # (histories, balances, configs, latency, fill_ratio) in each worker process
+
+
+def parse_param(text):
+    """'name=a,b,c' -> (name, [a, b, c]) and 'name=low:high' -> (name, (low, high)). Counts such as num_trades
+       are whole numbers, rates are in units and the rest are floats."""
+    name, _, spec = text.partition('=')
+    name = name.strip()
+    defaults = default_params.as_dict()
+    if name not in defaults:
+        raise ValueError("Unknown parameter {!r}, expected one of {}".format(name, ', '.join(defaults)))
+    kind = parse_rate if name in RATE_PARAMS else int if name in COUNTS else float
+    if ':' in spec:
+        low, high = spec.split(':')
+        values = (kind(low), kind(high))
+    else:
+        values = [kind(value) for value in spec.split(',') if value.strip()]
+    if name == 'num_trades' and not all(1 <= value <= NUM_TRADES for value in values):
+        raise ValueError("num_trades must be between 1 and {}, the trades the page shows".format(NUM_TRADES))
+    return name, values
+
+
+def grid(params):
+    """Every combination of the listed values"""
+    names = list(params)
+    return [dict(zip(names, values)) for values in itertools.product(*(params[name] for name in names))]
+
+
+def random_search(params, samples, seed=None):
+    """samples random combinations: ranges are sampled uniformly, lists are chosen from"""
+    rng = random.Random(seed)
+    candidates = []
+    for _ in range(samples):
+        changes = {}
+        for name, values in params.items():
+            if isinstance(values, tuple):
+                low, high = values
+                changes[name] = rng.randint(low, high) if isinstance(low, int) else rng.uniform(low, high)
+            else:
+                changes[name] = rng.choice(values)
+        candidates.append(changes)
+    return candidates
+
+
+def _init_worker(paths, balances, configs, latency, fill_ratio):
+    global _job
+    _job = ([load_history(path) for path in paths], balances, configs, latency, fill_ratio)
+
+
+def evaluate(changes):
+    """Backtests default_params with changes over every history. Runs in a worker process."""
+    histories, balances, configs, latency, fill_ratio = _job
+    params = default_params.replace(**changes)
+    row = {'changes': changes, 'profit': 0.0, 'fills': 0, 'submitted': 0, 'rejected': 0, 'wall': 0.0}
+    for history in histories:
+        result = Backtest(history, balances, configs, latency, fill_ratio, params).run()
+        row['profit'] += result.profit
+        row['fills'] += len(result.fills)
+        row['submitted'] += result.submitted
+        row['rejected'] += result.rejected
+        row['wall'] += result.wall_seconds
+    return row
+
+
+def run_sweep(candidates, paths, balances, configs=None, workers=None, latency=LATENCY, fill_ratio=FILL_RATIO):
+    """Evaluates every candidate (a dict of TraderParams changes) and returns the rows, most profitable first"""
+    configs = configs or load_configs()
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(paths, balances, configs, latency, fill_ratio)) as executor:
+        rows = list(executor.map(evaluate, candidates, chunksize=max(len(candidates)//(workers*4), 1)))
+    rows.sort(key=lambda row: row['profit'], reverse=True)
+    return rows
+
+
+def format_table(rows, names, top=None):
+    header = ['#'] + names + ['profit', 'fills', 'submitted', 'rejected']
+    lines = [header]
+    for rank, row in enumerate(rows[:top], 1):
+        values = ['{:g}'.format(to_float(row['changes'][name]) if name in RATE_PARAMS else row['changes'][name])
+                  for name in names]
+        lines.append([str(rank)] + values + ['{:+.1f}'.format(row['profit']), str(row['fills']),
+                                             str(row['submitted']), str(row['rejected'])])
+    widths = [max(len(line[i]) for line in lines) for i in range(len(header))]
+    return '\n'.join('  '.join(cell.rjust(width) for cell, width in zip(line, widths)) for line in lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank trading constants by backtested profit")
+    parser.add_argument('history', nargs='+', help="JSON lines files written by headless.py --record")
+    parser.add_argument('--param', action='append', default=[], metavar='NAME=VALUES',
+                        help="a,b,c to try each value or low:high to sample (with --samples)")
+    parser.add_argument('--samples', type=int, help="Random search with this many samples instead of a grid")
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--workers', type=int, help="Processes to use (default: every core)")
+    parser.add_argument('--top', type=int, default=20, help="Rows to show")
+    parser.add_argument('--config', help="config.ini with the trader settings (default: trade all)")
+    parser.add_argument('--tix', type=int, default=1000, help="Starting tickets")
+    parser.add_argument('--robux', type=int, default=100, help="Starting robux")
+    parser.add_argument('--latency', type=float, default=LATENCY)
+    parser.add_argument('--fill-ratio', type=float, default=FILL_RATIO)
+    args = parser.parse_args()
+
+    try:
+        params = dict(parse_param(text) for text in args.param)
+    except ValueError as e:
+        parser.error(str(e))
+    if not params:
+        parser.error("Give at least one --param")
+    if args.samples:
+        candidates = random_search(params, args.samples, args.seed)
+    elif any(isinstance(values, tuple) for values in params.values()):
+        parser.error("Ranges need --samples")
+    else:
+        candidates = grid(params)
+
+    start = time.perf_counter()
+    rows = run_sweep(candidates, args.history, {'Tickets': args.tix, 'Robux': args.robux},
+                     load_configs(args.config), args.workers, args.latency, args.fill_ratio)
+    wall = time.perf_counter() - start
+    print(format_table(rows, list(params), args.top))
+    print("{} configurations over {} histories in {:.1f} seconds ({:.1f} seconds of backtesting)".format(
+        len(rows), len(args.history), wall, sum(row['wall'] for row in rows)))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,13 @@
-from PySide.QtCore import Signal, QObject
-import time
-import datetime
+from .events import Signal, QObject
+from .clock import real_clock
+from .metrics import TRADES_ADDED, TRADES_COMPLETED, FILL_EVENTS
+from .units import to_float
+from collections import deque
 import logging
 
-logging.basicConfig(
-    level=logging.DEBUG, format="%(asctime)s -%(levelname)s %(funcName)s %(message)s  %(module)s: <Line %(lineno)s>")
-# For Debugging:
-# logging.disable(logging.CRITICAL)
+logger = logging.getLogger(__name__)
+
+FILL_HISTORY = 1000 # Fill events kept by a TradeLog
 
 
 def format_time(seconds):
@@ -35,20 +36,21 @@ class Trade(QObject):
 
     trade_updated = Signal(QObject)
 
-    def __init__(self, amount1, amount2, type1, type2, rate):
+    def __init__(self, amount1, amount2, type1, type2, rate, clock=real_clock):
         super().__init__()
-        self.time = time.time()
+        self.clock = clock
+        self.time = clock.time()
         self.amount1 = self.remaining1 = amount1
         self.amount2 = self.remaining2 = amount2
         self.type1 = type1
         self.type2 = type2
         self.start_rate = rate
         self.current_rate = rate
-        self.seconds_time = time.time()
-        self.start_time = datetime.datetime.now()
+        self.seconds_time = clock.time()
+        self.start_time = clock.now()
         self.complete_time = 'Incomplete'
         self.row = None  # The GUI display row
-        logging.info(str(self))
+        logger.info('%s', self) # Only formatted if INFO is enabled
 
     def update(self, remaining1, rate=None):
         self.remaining1 = remaining1
@@ -57,9 +59,9 @@ class Trade(QObject):
         self.trade_updated.emit(self)
 
     def __str__(self):
-        starttup = (self.amount1, self.type1, self.start_rate,
+        starttup = (self.amount1, self.type1, to_float(self.start_rate),
                     self.amount2, self.type2)
-        currenttup = (self.remaining1, self.type1, self.current_rate)
+        currenttup = (self.remaining1, self.type1, to_float(self.current_rate))
         s =    "\n" +\
                "Start: Trading {} {} @ {:.3f} for {} {}".format(*starttup) + "\n" +\
                "Current Status: Trading {} {} @ {:.3f}".format(*currenttup) + "\n" +\
@@ -73,19 +75,33 @@ class TradeLog(QObject):
 
     trade_added = Signal(QObject)
     trade_completed = Signal(QObject)
+    fill_event = Signal(object)
 
-    def __init__(self):
+    def __init__(self, clock=real_clock):
         super().__init__()
-        self.start_time = time.time()
+        self.start_time = clock.time()
         self.log = []
+        self.fills = deque(maxlen=FILL_HISTORY) # Latest events of rbxAPI.fills
+
+    def record_fill(self, event):
+        kind = type(event).__name__
+        FILL_EVENTS.labels(event.currency, kind).inc()
+        self.fills.append(event)
+        if kind in ('GhostBid', 'DuplicateBid', 'RejectedBid'):
+            logger.warning('%s', event)
+        else:
+            logger.info('%s', event)
+        self.fill_event.emit(event)
 
     def add_trade(self, trade):
+        TRADES_ADDED.labels(trade.type1).inc()
         self.trade_added.emit(trade)
 
     def complete_trade(self, trade):
-        trade.complete_time = datetime.datetime.now()
-        logging.info("Completed trade!")
-        logging.debug("Start amount1: {} \t Remaining amount1: {}".format(str(trade.amount1),str(trade.remaining1)))
+        trade.complete_time = trade.clock.now()
+        logger.info("Completed trade!")
+        logger.debug("Start amount1: %s \t Remaining amount1: %s", trade.amount1, trade.remaining1)
         self.log.append(trade)
+        TRADES_COMPLETED.labels(trade.type1).inc()
         self.trade_completed.emit(trade)
 
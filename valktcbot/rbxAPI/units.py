@@ -0,0 +1,63 @@
+"""Rates as whole numbers of RATE_SCALE units per 1.
+
+The page shows rates with four decimals and the strategy moves them in steps of .001,
+so every rate in rbxAPI is an int of millionths (10.5539 is 10553900). Gaps, steps and
+comparisons are exact, with no epsilons to cover float error. A rate we work out
+ourselves, such as to_trade/receive, is rounded to a unit in the direction that is worse
+for us. Floats are only used at the edges: JSON history, the GUI's spin boxes and what
+is shown to the user."""
+
+RATE_SCALE = 1000000 # Units per 1
+STEP = RATE_SCALE//1000 # .001, the step of better_rate and of rates rounded for display
+PAGE_STEP = RATE_SCALE//10000 # .0001, the precision of rates on the page
+
+
+def parse_rate(text):
+    """Units of a decimal string such as '10.5539' or '-0.05', without going through a float"""
+    text = text.strip()
+    negative = text.startswith('-')
+    whole, _, fraction = text.lstrip('+-').partition('.')
+    if not (whole or fraction) or not (whole + fraction).isdigit():
+        raise ValueError("Not a rate: {!r}".format(text))
+    digits = len(str(RATE_SCALE)) - 1
+    units = int(whole or '0')*RATE_SCALE + int(fraction[:digits].ljust(digits, '0'))
+    return -units if negative else units
+
+
+def to_units(value):
+    """Units of a float, such as a rate read from JSON or a spin box"""
+    return round(value*RATE_SCALE)
+
+
+def to_float(units):
+    return units/RATE_SCALE
+
+
+def floor_step(units):
+    """Rounded down to a STEP, like round_down for floats"""
+    return units//STEP*STEP
+
+
+def ceil_step(units):
+    """Rounded up to a STEP, like round_up for floats"""
+    return -(-units//STEP)*STEP
+
+
+def ratio_floor(numerator, denominator):
+    """numerator/denominator in units, rounded down"""
+    return numerator*RATE_SCALE//denominator
+
+
+def ratio_ceil(numerator, denominator):
+    """numerator/denominator in units, rounded up"""
+    return -(-numerator*RATE_SCALE//denominator)
+
+
+def ratio_round(numerator, denominator, step=PAGE_STEP):
+    """numerator/denominator in units, rounded half up to a multiple of step"""
+    return (2*numerator*RATE_SCALE + step*denominator)//(2*step*denominator)*step
+
+
+def display_rate(units):
+    """A rate as the GUI shows it, rounded down to .001"""
+    return to_float(floor_step(units))
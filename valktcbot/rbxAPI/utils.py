@@ -2,10 +2,31 @@
 import sys
 import os
 import math
-import cProfile
+import importlib
 
 from functools import wraps
 
+STARTUP_PROFILE_ENV = 'VALKTCBOT_PROFILE_STARTUP'
+
+
+class LazyModule:
+
+    """Stands in for a module and imports it on first attribute access.
+       Keeps heavy imports (requests, lxml) off the path to the login window."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        module = self._module
+        if module is None:
+            # import_module holds the import lock, so racing threads all get the fully loaded module
+            module = self._module = importlib.import_module(self._name)
+        return getattr(module, attr)
+
+cProfile = LazyModule('cProfile')
+
 def profile(func):
     """Prints out all calls and times per call in function."""
     pr = cProfile.Profile()
@@ -38,3 +59,30 @@ def find_data_file(filename):
         datadir = os.path.dirname(os.path.abspath(__file__))
 
     return os.path.join(datadir, filename)
+
+def parse_importtime(output):
+    """Parses `python -X importtime` output into (self us, cumulative us, depth, module) tuples"""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    return rows
+
+def profile_startup(script, args=(), top=20):
+    """Starts script again under -X importtime, stopping once it is ready, and prints the slowest imports."""
+    import subprocess
+    env = dict(os.environ)
+    env[STARTUP_PROFILE_ENV] = '1'
+    proc = subprocess.run([sys.executable, '-X', 'importtime', script] + list(args), env=env,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    rows = parse_importtime(proc.stderr)
+    top_level = [row for row in rows if row[2] == 0]
+    print("{:>10} {:>10}  {}".format('self ms', 'total ms', 'module'))
+    for self_us, cumulative_us, depth, name in sorted(top_level, key=lambda row: -row[1])[:top]:
+        print("{:>10.1f} {:>10.1f}  {}".format(self_us/1000, cumulative_us/1000, name))
+    print("{} modules imported in {:.1f} ms".format(len(rows), sum(row[1] for row in top_level)/1000))
+    print(proc.stdout.strip())
+    return proc.returncode
@@ -0,0 +1,54 @@
+"""A scripted trade currency page for the trader tests"""
+from rbxAPI.account import Account
+from rbxAPI.actions import TixTrader, RobuxTrader
+from rbxAPI.clock import SimClock
+from rbxAPI.exchange import AccountSnapshot
+from rbxAPI.market import MarketSnapshot, NUM_TRADES
+from rbxAPI.trade_log import TradeLog
+from rbxAPI.units import to_units
+
+TIX_RATE = to_units(10.5)
+ROBUX_RATE = to_units(10.6)
+
+
+def make_market():
+    tix_column = [(1000, TIX_RATE - i*to_units(.001)) for i in range(NUM_TRADES)]
+    robux_column = [(100, ROBUX_RATE + i*to_units(.001)) for i in range(NUM_TRADES)]
+    return MarketSnapshot(ROBUX_RATE - TIX_RATE, TIX_RATE, ROBUX_RATE, tix_column, robux_column, snapshot_time=0)
+
+
+class ScriptedExchange:
+
+    """Serves a fixed market with the balances and open bids a test sets, and records what the traders send"""
+
+    def __init__(self, balances=None):
+        self.market = make_market()
+        self.balances = dict(balances or {'Tickets': 10000, 'Robux': 1000})
+        self.bids = {'Tickets': [], 'Robux': []} # Remainders of our open bids, top row first
+        self.submits = [] # (currency, give, receive)
+        self.cancels = [] # (currency, index)
+        self.fetches = 0
+
+    def fetch(self):
+        self.fetches += 1
+        panel = AccountSnapshot(dict(self.balances), {currency: list(bids) for currency, bids in self.bids.items()},
+                                {currency: bool(bids) for currency, bids in self.bids.items()},
+                                'viewstate', 'eventvalidation')
+        return self.market, panel
+
+    def submit_trade(self, panel, currency, other_currency, amount_to_give, amount_to_receive, split_trades):
+        self.submits.append((currency, amount_to_give, amount_to_receive))
+
+    def cancel_bid(self, panel, currency, index):
+        self.cancels.append((currency, index))
+
+
+def make_traders(balances=None, start=1000.0):
+    """(account, tix trader, robux trader) trading on a ScriptedExchange in simulated time"""
+    clock = SimClock(start)
+    account = Account('test', clock=clock, exchange=ScriptedExchange(balances))
+    trade_log = TradeLog(clock)
+    tix_trader, robux_trader = TixTrader(trade_log, account), RobuxTrader(trade_log, account)
+    for trader in (tix_trader, robux_trader):
+        trader.started = True
+    return account, tix_trader, robux_trader
@@ -0,0 +1,35 @@
+"""The page kept for the traders' first refreshes"""
+from tests.fakes import make_traders
+
+
+def test_warm_snapshot_is_used_once_while_fresh():
+    account, tix_trader, robux_trader = make_traders()
+    market, panel = account.exchange.fetch()
+    market.time = account.clock.time() - .5
+    account.keep_snapshot(market, panel)
+    assert account.take_warm_snapshot('Tickets') == (market, panel)
+    assert account.take_warm_snapshot('Tickets') is None
+    account.clock.sleep(1)
+    assert account.take_warm_snapshot('Robux') is None
+
+
+def test_warm_snapshot_age_is_that_of_its_page():
+    account, tix_trader, robux_trader = make_traders()
+    market, panel = account.exchange.fetch()
+    market.time = account.clock.time() - 2 # Requested well before it was kept
+    account.keep_snapshot(market, panel)
+    assert account.take_warm_snapshot('Tickets') is None
+
+
+def test_traders_share_the_page_fetched_at_start():
+    account, tix_trader, robux_trader = make_traders()
+    exchange = account.exchange
+    exchange.market.time = account.clock.time()
+    account.fetch_warm_page().join()
+    assert account.warm_fetch is None
+    tix_trader.refresh()
+    robux_trader.refresh()
+    assert exchange.fetches == 1
+    assert tix_trader.market is robux_trader.market is exchange.market
+    tix_trader.refresh()
+    assert exchange.fetches == 2
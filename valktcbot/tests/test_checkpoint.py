@@ -0,0 +1,80 @@
+"""Restoring a checkpoint, and resuming or reconciling its trades against the first refresh"""
+from rbxAPI.checkpoint import Checkpointer, restore_state
+from rbxAPI.fills import FullFill
+from rbxAPI.kernel import Replace
+from rbxAPI.units import to_units
+
+from tests.fakes import make_traders
+
+RATE = to_units(10.6)
+
+
+def save_trading(path):
+    """Checkpoints a tix trader with 600 of a 1000 ticket bid left, and returns the trade"""
+    account, tix_trader, robux_trader = make_traders()
+    exchange, clock = account.exchange, account.clock
+    tix_trader.refresh()
+    tix_trader.do_trade(Replace(1000, 94, RATE))
+    clock.sleep(.5)
+    exchange.balances['Tickets'] -= 1000
+    exchange.bids['Tickets'] = [600]
+    tix_trader.refresh()
+    tix_trader.update_current_trade()
+    assert Checkpointer(account, path=str(path)).checkpoint()
+    return tix_trader.current_trade
+
+
+def restart(path, balance, bids):
+    """A new bot restored from path, whose first refresh shows balance tickets and our open bids"""
+    account, tix_trader, robux_trader = make_traders({'Tickets': balance, 'Robux': 1000})
+    account.exchange.bids['Tickets'] = bids
+    assert restore_state(account, str(path))
+    assert tix_trader.saved_trade['remaining1'] == 600
+    tix_trader.refresh()
+    tix_trader.resume_trade()
+    return account, tix_trader
+
+
+def test_restore_resumes_an_open_bid(tmp_path):
+    path = tmp_path / 'state.jsonl'
+    saved = save_trading(path)
+    account, tix_trader = restart(path, 9000, [600])
+    trade = tix_trader.current_trade
+    assert (trade.amount1, trade.remaining1, trade.start_rate) == (1000, 600, RATE)
+    assert trade.seconds_time == saved.seconds_time
+    assert tix_trader.fills.tracked == 600
+    assert account.rates.current_tix_rate == RATE
+    assert tix_trader.saved_trade is None
+
+
+def test_restore_completes_a_bid_filled_while_stopped(tmp_path):
+    path = tmp_path / 'state.jsonl'
+    save_trading(path)
+    account, tix_trader = restart(path, 9000, [])
+    assert tix_trader.current_trade is None
+    [trade] = tix_trader.trade_log.log
+    assert trade.remaining1 == 0
+    assert isinstance(tix_trader.trade_log.fills[-1], FullFill)
+    assert account.rates.last_tix_rate == RATE
+    assert account.rates.current_tix_rate == 0
+
+
+def test_restore_logs_a_bid_cancelled_while_stopped(tmp_path):
+    path = tmp_path / 'state.jsonl'
+    save_trading(path)
+    account, tix_trader = restart(path, 9600, [])
+    assert tix_trader.current_trade is None
+    [trade] = tix_trader.trade_log.log
+    assert trade.remaining1 == 600
+    assert not tix_trader.trade_log.fills
+    assert account.rates.last_tix_rate == 0 # A cancelled bid's rate is not remembered
+    assert account.rates.current_tix_rate == 0
+
+
+def test_restore_drops_a_trade_whose_bid_is_not_ours(tmp_path):
+    path = tmp_path / 'state.jsonl'
+    save_trading(path)
+    account, tix_trader = restart(path, 8800, [800])
+    assert tix_trader.current_trade is None
+    assert tix_trader.trade_log.log == []
+    assert account.rates.current_tix_rate == 0
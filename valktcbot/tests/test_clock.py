@@ -0,0 +1,93 @@
+"""SimClock, the Scheduler on it, and the backtest's clock"""
+from rbxAPI.backtest import Backtest
+from rbxAPI.clock import SimClock, Scheduler
+
+from tests.fakes import make_market
+
+import datetime
+
+
+def test_sim_clock_only_moves_when_told():
+    clock = SimClock(100)
+    assert clock.time() == 100
+    clock.sleep(2.5)
+    assert clock.time() == 102.5
+    clock.advance_to(110)
+    clock.advance_to(105) # Never backwards
+    assert clock.time() == 110
+    assert clock.now() == datetime.datetime.fromtimestamp(110)
+
+
+def test_timers_run_in_order_of_due_time_then_scheduling():
+    clock = SimClock(0)
+    scheduler = Scheduler(clock)
+    ran = []
+    record = lambda name: ran.append((name, clock.time()))
+    for due, name in [(5, 'a'), (3, 'b'), (5, 'c'), (3, 'd'), (0, 'e')]:
+        scheduler.call_at(due, record, name)
+    scheduler.call_at(4, record, 'cancelled').cancel()
+    assert scheduler.run_until(10) == 5
+    assert ran == [('e', 0), ('b', 3), ('d', 3), ('a', 5), ('c', 5)]
+    assert clock.time() == 10
+
+
+def test_timers_scheduled_by_timers():
+    clock = SimClock(0)
+    scheduler = Scheduler(clock)
+    ran = []
+
+    def tick():
+        ran.append(clock.time())
+        clock.sleep(.5) # The tick's own work takes time
+        scheduler.call_later(1, tick)
+    scheduler.call_at(0, tick)
+    scheduler.run_until(5)
+    assert ran == [0, 1.5, 3, 4.5]
+    assert clock.time() == 5
+    assert scheduler.next_due() == 6 # Left for a later run_until
+    assert len(scheduler) == 1
+
+
+def test_next_timer_moves_the_clock_and_ends_with_the_timers():
+    clock = SimClock(0)
+    scheduler = Scheduler(clock)
+    scheduler.call_later(7, lambda: None)
+    timer = scheduler.next_timer()
+    assert timer.due == 7 and clock.time() == 7
+    assert scheduler.next_timer() is None
+    assert clock.time() == 7
+
+
+def make_history(seconds, step):
+    history = []
+    for seq, t in enumerate(range(0, seconds + 1, step)):
+        market = make_market()
+        market.seq, market.time = seq, 1000 + t
+        history.append(market)
+    return history
+
+
+class TickTimes(Backtest):
+
+    """Records the clock time of each trader tick"""
+
+    def make_traders(self, account, trade_log):
+        traders = super().make_traders(account, trade_log)
+        self.tick_times = []
+        for trader in traders:
+            tick = trader.tick
+            trader.tick = lambda tick=tick: self.tick_times.append(account.clock.time()) or tick()
+        return traders
+
+
+def test_backtest_clock_stops_at_the_end_of_the_history():
+    history = make_history(600, 30)
+    backtest = TickTimes(history, {'Tickets': 1000, 'Robux': 100},
+                         configs={'Tickets': {'trade_all': True}, 'Robux': {'trade_all': True}})
+    result = backtest.run()
+    assert result.sim_seconds == 600
+    assert backtest.tick_times
+    assert backtest.tick_times[0] == history[0].time
+    rounds = backtest.tick_times[::2] # Each round of ticks starts with the tix trader's
+    assert max(rounds) <= history[-1].time
+    assert result.ticks*2 == len(backtest.tick_times)
@@ -0,0 +1,130 @@
+"""Checking [Engine] and [Retry], and when a reload reaches the traders"""
+from functools import partial
+from rbxAPI.config import new_config, apply_engine_config, engine_settings, retry_settings, ConfigWatcher
+from rbxAPI.market import NUM_TRADES
+
+from tests.fakes import make_traders
+
+import os
+
+import pytest
+
+TRADERS = '[TixTrader]\n[RobuxTrader]\n' # Sections read_config requires
+
+
+def make_config(**sections):
+    config = new_config()
+    for section, options in sections.items():
+        config[section] = {name: str(value) for name, value in options.items()}
+    return config
+
+
+def test_defaults_when_unset():
+    params, max_workers = engine_settings(make_config(Engine={}))
+    assert params.num_trades <= NUM_TRADES
+    policies, failure_threshold, cooldown = retry_settings(make_config())
+    assert 'refresh' in policies and 'submit' in policies
+
+
+@pytest.mark.parametrize('option, value', [
+    ('delay', 11),
+    ('delay', -1),
+    ('rgap', 0),
+    ('tgap', 2),
+    ('reset_time', .5),
+    ('deque_size', 0),
+    ('deque_size', 1.5), # Not a whole number
+    ('num_trades', NUM_TRADES + 1),
+    ('lag_quantile', 1.1),
+    ('max_workers', 65),
+    ('trade_lag_time', 'soon'),
+    ('speed', 1), # Unknown
+])
+def test_out_of_range_engine_value_is_rejected(option, value):
+    with pytest.raises(ValueError, match=r'\[Engine\] {}|Unknown option'.format(option)):
+        engine_settings(make_config(Engine={option: value}))
+
+
+def test_tolerance_base_above_max_is_rejected():
+    with pytest.raises(ValueError, match='tolerance_base is above tolerance_max'):
+        engine_settings(make_config(Engine={'tolerance_base': .5, 'tolerance_max': .1}))
+
+
+@pytest.mark.parametrize('option, value', [
+    ('refresh_deadline', 0),
+    ('submit_connect_timeout', 61),
+    ('cancel_read_timeout', 0),
+    ('refresh_backoff', -.1),
+    ('submit_max_attempts', 0),
+    ('submit_max_attempts', 2.5),
+    ('failure_threshold', 0),
+    ('cooldown', 3601),
+    ('refresh_retries', 3), # Unknown
+])
+def test_out_of_range_retry_value_is_rejected(option, value):
+    with pytest.raises(ValueError, match=r'\[Retry\] {}|Unknown option'.format(option)):
+        retry_settings(make_config(Retry={option: value}))
+
+
+def test_bad_value_changes_nothing():
+    account, tix_trader, robux_trader = make_traders()
+    before = account.params, account.max_workers, account.request_settings
+    with pytest.raises(ValueError):
+        apply_engine_config(account, make_config(Engine={'delay': 2}, Retry={'cooldown': -1}))
+    assert (account.params, account.max_workers, account.request_settings) == before
+    assert tix_trader.next_params is None
+
+
+def record_ticks(trader):
+    """Records the params and trader options each decision of trader is made with"""
+    seen = []
+    next_action = trader.next_action
+
+    def recording():
+        seen.append((trader.params, trader.config))
+        return next_action()
+    trader.next_action = recording
+    return seen
+
+
+def reload_during_next_refresh(account, reload):
+    """Calls reload() once, while the next refresh waits for the page, as another thread could"""
+    fetch = account.exchange.fetch
+
+    def fetching():
+        account.exchange.fetch = fetch
+        reload()
+        return fetch()
+    account.exchange.fetch = fetching
+
+
+def test_engine_reload_takes_effect_at_the_next_tick(tmp_path):
+    account, tix_trader, robux_trader = make_traders()
+    path = tmp_path / 'config.ini'
+    path.write_text(TRADERS + '[Engine]\ndelay = 1\n')
+    watcher = ConfigWatcher(partial(apply_engine_config, account), str(path))
+    old_params = tix_trader.params
+    seen = record_ticks(tix_trader)
+
+    def reload():
+        path.write_text(TRADERS + '[Engine]\ndelay = 2\ndeque_size = 5\n')
+        os.utime(path, (watcher.mtime + 1, watcher.mtime + 1))
+        assert watcher.check()
+    reload_during_next_refresh(account, reload)
+    tix_trader.tick()
+    assert seen[-1][0] is old_params # The whole tick ran with the params it started with
+    assert account.rates.past_tix_rates.maxlen != 5
+    tix_trader.tick()
+    assert seen[-1][0].delay == 2
+    assert account.rates.past_tix_rates.maxlen == 5
+
+
+def test_trader_options_take_effect_at_the_next_tick():
+    account, tix_trader, robux_trader = make_traders()
+    seen = record_ticks(tix_trader)
+    old_config = tix_trader.config
+    reload_during_next_refresh(account, lambda: tix_trader.set_configs({'amount': 500, 'early_cancel': False}))
+    tix_trader.tick()
+    assert seen[-1][1] is old_config
+    tix_trader.tick()
+    assert (seen[-1][1]['amount'], seen[-1][1]['early_cancel']) == (500, False)
@@ -0,0 +1,169 @@
+"""Fill events from open bid panels, and how the trader's current trade and rate memory follow them"""
+from rbxAPI.actions import RESULT_WAIT
+from rbxAPI.fills import (FillTracker, PartialFill, FullFill, CancelAcknowledged, RejectedBid, GhostBid,
+                          DuplicateBid)
+from rbxAPI.kernel import Replace
+from rbxAPI.units import to_units
+
+from tests.fakes import make_traders
+
+LAG = 1 # Seconds given as the trade lag to FillTracker.observe
+
+RATE = to_units(10.6)
+
+
+def test_partial_then_full_fill():
+    tracker = FillTracker('Tickets')
+    tracker.track(1000)
+    assert tracker.observe([1000], 0, 1, LAG) == []
+    assert tracker.observe([600], 0, 2, LAG) == [PartialFill('Tickets', 2, 400, 600)]
+    assert tracker.observe([], 0, 3, LAG) == [FullFill('Tickets', 3, 600)]
+    assert tracker.tracked is None
+
+
+def test_cancel_is_acknowledged_not_filled():
+    tracker = FillTracker('Tickets')
+    tracker.track(1000)
+    tracker.expect_cancel(1)
+    assert tracker.observe([1000], 0, 1.5, LAG) == [] # Not gone yet
+    assert tracker.observe([], 0, 2, LAG) == [CancelAcknowledged('Tickets', 2, 1000)]
+
+
+def test_submitted_bid_shows_then_fills():
+    tracker = FillTracker('Robux')
+    tracker.expect_bid(50, 0, 100)
+    assert tracker.observe([], 100, .5, LAG) == [] # Within the lag
+    assert tracker.observe([30], 50, .8, LAG) == [PartialFill('Robux', .8, 20, 30)]
+    assert tracker.tracked == 30
+
+
+def test_rejected_submit():
+    tracker = FillTracker('Robux')
+    tracker.expect_bid(50, 0, 100)
+    assert tracker.observe([], 100, .5, LAG) == []
+    assert tracker.observe([], 100, 1.5, LAG) == [RejectedBid('Robux', 1.5, 50)]
+    assert tracker.submitted is None
+
+
+def test_submit_filled_before_it_showed():
+    tracker = FillTracker('Robux')
+    tracker.expect_bid(50, 0, 100)
+    assert tracker.observe([], 50, 1.5, LAG) == [FullFill('Robux', 1.5, 50)]
+
+
+def test_same_amount_replacement_is_told_apart_by_time():
+    tracker = FillTracker('Tickets')
+    tracker.track(500)
+    tracker.expect_cancel(2)
+    tracker.expect_bid(500, 2, 1000)
+    # Within the lag the bid shown may still be the old one
+    assert tracker.observe([500], 500, 2.5, LAG) == []
+    assert tracker.submitted is not None
+    # After it, it is the new one: the old one was cancelled, and the new one is not
+    assert tracker.observe([500], 500, 3.5, LAG) == [CancelAcknowledged('Tickets', 3.5, 500)]
+    assert (tracker.tracked, tracker.submitted, tracker.cancelled) == (500, None, False)
+    assert tracker.observe([200], 500, 4, LAG) == [PartialFill('Tickets', 4, 300, 200)]
+    assert tracker.observe([], 500, 5, LAG) == [FullFill('Tickets', 5, 200)]
+
+
+def test_ghost_and_duplicate_bids():
+    tracker = FillTracker('Tickets')
+    assert tracker.observe([], 0, 0, LAG) == []
+    assert tracker.observe([300], 0, 1, LAG) == [GhostBid('Tickets', 1, 300)]
+    assert tracker.tracked == 300
+    assert tracker.observe([300, 200], 0, 2, LAG) == [DuplicateBid('Tickets', 2, [300, 200])]
+    assert tracker.observe([300, 200], 0, 3, LAG) == [] # Reported once
+
+
+def place(trader, give, receive, rate):
+    """Refreshes, then replaces the trader's bid as the kernel would, and moves the bid onto the page"""
+    exchange, clock = trader.exchange, trader.clock
+    trader.refresh()
+    trader.do_trade(Replace(give, receive, rate))
+    clock.sleep(.5)
+    exchange.balances[trader.currency] -= give
+    exchange.bids[trader.currency] = [give]
+    trader.refresh()
+    return trader.current_trade
+
+
+def events(trader):
+    return [event for event in trader.trade_log.fills if not isinstance(event, DuplicateBid)]
+
+
+def test_trader_follows_a_partial_then_full_fill():
+    account, tix_trader, robux_trader = make_traders()
+    exchange, clock = account.exchange, account.clock
+    trade = place(tix_trader, 1000, 94, RATE)
+    assert tix_trader.fills.tracked == 1000
+
+    clock.sleep(2) # Past the trade lag since the trader last traded
+    exchange.bids['Tickets'] = [600]
+    tix_trader.refresh()
+    tix_trader.update_current_trade()
+    assert trade.remaining1 == 600
+    assert list(account.rates.past_tix_rates) == [RATE]
+    assert account.rates.last_tix_rate == RATE
+
+    exchange.bids['Tickets'] = []
+    tix_trader.refresh()
+    assert isinstance(tix_trader.bid_result, FullFill)
+    assert tix_trader.fully_complete_trade()
+    assert tix_trader.current_trade is None
+    assert trade.remaining1 == 0
+    assert tix_trader.trade_log.log == [trade]
+    assert account.rates.current_tix_rate == 0
+    assert [type(event) for event in events(tix_trader)] == [PartialFill, FullFill]
+
+
+def test_trader_replacing_with_the_same_amount():
+    account, tix_trader, robux_trader = make_traders()
+    exchange, clock = account.exchange, account.clock
+    first = place(tix_trader, 500, 47, RATE)
+    clock.sleep(.5)
+    better = RATE + to_units(.001)
+    tix_trader.do_trade(Replace(500, 47, better)) # Cancels the first bid, the new one shows the same amount
+    assert exchange.cancels == [('Tickets', 1)]
+    second = tix_trader.current_trade
+    assert tix_trader.trade_log.log == [first] # Replaced, so logged as it was
+    tix_trader.refresh() # The page still shows 500
+    assert tix_trader.bid_result is None
+    clock.sleep(tix_trader.trade_lag_time + .1)
+    tix_trader.refresh()
+    exchange.bids['Tickets'] = []
+    tix_trader.refresh()
+    assert [type(event) for event in events(tix_trader)] == [CancelAcknowledged, FullFill]
+    assert tix_trader.fully_complete_trade()
+    assert second.remaining1 == 0
+    assert account.rates.last_tix_rate == better
+    assert tix_trader.trade_log.log == [first, second]
+
+
+def test_trader_completes_a_rejected_bid_without_a_fill():
+    account, tix_trader, robux_trader = make_traders()
+    exchange, clock = account.exchange, account.clock
+    tix_trader.refresh()
+    tix_trader.do_trade(Replace(1000, 94, RATE))
+    trade = tix_trader.current_trade
+    clock.sleep(tix_trader.trade_lag_time + .1)
+    tix_trader.refresh() # Never shown, and the balance never paid for it
+    assert isinstance(tix_trader.bid_result, RejectedBid)
+    assert tix_trader.fully_complete_trade()
+    assert trade.remaining1 == 1000
+    assert account.rates.last_tix_rate == RATE
+
+
+def test_trader_completes_a_trade_whose_result_never_came():
+    account, robux_trader = make_traders()[::2]
+    exchange, clock = account.exchange, account.clock
+    trade = place(robux_trader, 50, 530, RATE)
+    robux_trader.fills.expect_cancel(clock.time()) # A stale flag turns the fill into a CancelAcknowledged
+    exchange.bids['Robux'] = []
+    robux_trader.refresh()
+    assert robux_trader.bid_result is None
+    assert not robux_trader.fully_complete_trade()
+    clock.sleep(RESULT_WAIT*robux_trader.trade_lag_time)
+    assert robux_trader.fully_complete_trade()
+    assert robux_trader.current_trade is None
+    assert robux_trader.trade_log.log == [trade]
+    assert account.rates.last_robux_rate == RATE
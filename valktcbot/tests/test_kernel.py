@@ -0,0 +1,32 @@
+"""calculate_trade and compute_balance_amounts against the exact reference of rbxAPI.kernelcheck"""
+from rbxAPI.kernel import compute_balance_amounts
+from rbxAPI.kernelcheck import Reference, compare, random_market, same
+from rbxAPI.params import default_params
+from rbxAPI.units import RATE_SCALE
+
+from fractions import Fraction
+
+import random
+
+SEED = 1
+CASES = 300
+
+
+def test_calculate_trade_matches_exact_reference():
+    exact, inexact = compare(CASES, SEED)
+    assert exact == []
+
+
+def test_balance_amounts_match_exact_reference():
+    rng = random.Random(SEED)
+    reference = Reference(exact=True)
+    for _ in range(CASES):
+        market = random_market(rng)
+        currency = rng.choice(('Tickets', 'Robux'))
+        if currency == 'Tickets':
+            amount, rate = rng.randint(10, 20000), market.tix_rate
+        else:
+            amount, rate = rng.randint(2, 2000), market.robux_rate
+        expected = reference.balance_amounts(currency, amount, Fraction(rate, RATE_SCALE), default_params)
+        actual = compute_balance_amounts(currency, amount, rate, default_params)
+        assert same(expected, actual), (currency, amount, rate, expected, actual)
@@ -0,0 +1,29 @@
+"""Logging levels from the [Logging] section"""
+from rbxAPI.config import new_config
+from rbxAPI.log import levels_from_config, setup_logging, DEFAULT_LEVEL
+
+import logging
+
+import pytest
+
+
+def logging_config(**levels):
+    config = new_config()
+    config['Logging'] = levels
+    return config
+
+
+def test_levels_from_config():
+    assert levels_from_config(None) == (DEFAULT_LEVEL, {})
+    config = logging_config(level='info', **{'rbxAPI.actions': 'Debug'})
+    assert levels_from_config(config) == ('INFO', {'rbxAPI.actions': 'DEBUG'})
+
+
+@pytest.mark.parametrize('level', ['LOUD', '10', ''])
+def test_bad_level_is_rejected_before_any_change(level):
+    module_logger = logging.getLogger('rbxAPI.actions')
+    before = module_logger.level
+    config = logging_config(**{'rbxAPI.actions': 'ERROR', 'rbxAPI.fills': level})
+    with pytest.raises(ValueError, match=r"\[Logging\] rbxAPI.fills = .* is not one of .*DEBUG"):
+        setup_logging(config)
+    assert module_logger.level == before
@@ -0,0 +1,167 @@
+"""Request policies and the circuit breaker, on a SimClock and a scripted transport"""
+from rbxAPI.clock import SimClock
+from rbxAPI.errors import CircuitOpenError
+from rbxAPI.retry import CircuitBreaker, PolicySession, RequestPolicy
+
+import pytest
+import requests
+
+URL = 'http://standin/'
+
+
+class ScriptedAdapter(requests.adapters.BaseAdapter):
+
+    """Answers each attempt with the next of script: a status code, or an exception to raise.
+       Each attempt takes seconds of the clock, or its timeout if that is shorter."""
+
+    def __init__(self, clock, script, seconds=0):
+        super().__init__()
+        self.clock = clock
+        self.script = list(script)
+        self.seconds = seconds
+        self.timeouts = [] # (connect, read) timeout of each attempt
+        self.started = [] # Clock time each attempt started
+
+    def send(self, request, timeout=None, **kwargs):
+        self.timeouts.append(timeout)
+        self.started.append(self.clock.time())
+        self.clock.sleep(min(self.seconds, max(timeout)))
+        answer = self.script.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        response = requests.Response()
+        response.status_code = answer
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
+
+
+def make_http(script, seconds=0, policies=None, breaker=None):
+    clock = SimClock(1000)
+    session = requests.Session()
+    adapter = ScriptedAdapter(clock, script, seconds)
+    session.mount(URL, adapter)
+    policies = policies or {
+        'refresh': RequestPolicy(deadline=2, connect_timeout=1, read_timeout=1.5, backoff=.05),
+        'submit': RequestPolicy(deadline=3, connect_timeout=1, read_timeout=2.5, backoff=.1, retry_reads=False),
+    }
+    breaker = breaker or CircuitBreaker(failure_threshold=3, cooldown=10, clock=clock)
+    return PolicySession(session, policies, breaker, clock), adapter, clock
+
+
+def connect_timeout():
+    return requests.exceptions.ConnectTimeout("connect timed out")
+
+
+def test_breaker_opens_then_lets_one_trial_through_and_closes():
+    clock = SimClock(0)
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=10, clock=clock)
+    breaker.record_failure()
+    assert breaker.state == 'closed'
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+    clock.sleep(10)
+    assert breaker.state == 'half open'
+    breaker.before_request() # The trial
+    with pytest.raises(CircuitOpenError): # Only one at a time
+        breaker.before_request()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    assert breaker.times_opened == 1
+
+
+def test_failed_trial_opens_the_circuit_again():
+    clock = SimClock(0)
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=5, clock=clock)
+    breaker.record_failure()
+    clock.sleep(5)
+    breaker.before_request()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    clock.sleep(4)
+    assert breaker.state == 'open'
+    clock.sleep(1)
+    assert breaker.state == 'half open'
+
+
+def test_server_error_is_retried_then_succeeds():
+    http, adapter, clock = make_http([503, 502, 200])
+    r = http.request_now('refresh', 'GET', URL)
+    assert r.status_code == 200
+    stats = http.stats['refresh']
+    assert (stats.requests, stats.attempts, stats.retries, stats.failures) == (1, 3, 2, 0)
+    assert http.breaker.failures == 0
+    assert adapter.started == pytest.approx([1000, 1000.05, 1000.15]) # Backoff doubles
+
+
+@pytest.mark.parametrize('status', [500, 503, 429])
+def test_error_pages_fail_the_request_and_open_the_circuit(status):
+    http, adapter, clock = make_http([status]*100)
+    for _ in range(3):
+        with pytest.raises(requests.exceptions.ConnectionError):
+            http.request_now('refresh', 'GET', URL)
+    assert http.breaker.state == 'open'
+    assert http.stats['refresh'].failures == 3
+    with pytest.raises(CircuitOpenError):
+        http.request_now('refresh', 'GET', URL)
+    assert http.stats['refresh'].rejected == 1
+
+
+def test_client_error_is_not_a_failure():
+    http, adapter, clock = make_http([404])
+    assert http.request_now('refresh', 'GET', URL).status_code == 404
+    assert http.stats['refresh'].failures == 0
+
+
+def test_submit_is_not_sent_again_after_an_error_page():
+    http, adapter, clock = make_http([503, 200])
+    with pytest.raises(requests.exceptions.ConnectionError):
+        http.request_now('submit', 'POST', URL)
+    assert len(adapter.started) == 1
+    assert http.breaker.failures == 1
+
+
+def test_submit_is_not_sent_again_after_a_read_timeout():
+    http, adapter, clock = make_http([requests.exceptions.ReadTimeout("read timed out"), 200])
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        http.request_now('submit', 'POST', URL)
+    assert len(adapter.started) == 1
+
+
+def test_submit_is_retried_when_the_connection_was_never_made():
+    http, adapter, clock = make_http([connect_timeout(), 200])
+    assert http.request_now('submit', 'POST', URL).status_code == 200
+    assert len(adapter.started) == 2
+
+
+def test_no_attempt_runs_past_the_deadline():
+    # Each attempt takes .8 seconds of the 2 second refresh deadline
+    http, adapter, clock = make_http([connect_timeout()]*10, seconds=.8)
+    with pytest.raises(requests.exceptions.ConnectTimeout):
+        http.request_now('refresh', 'GET', URL)
+    deadline = 1002
+    assert len(adapter.started) == 3 # The third only gets what is left of the deadline
+    for started, (connect, read) in zip(adapter.started, adapter.timeouts):
+        assert started < deadline
+        assert started + max(connect, read) <= deadline + 1e-9
+    assert clock.time() <= deadline
+
+
+def test_request_waiting_past_its_deadline_is_not_sent():
+    http, adapter, clock = make_http([200])
+    with pytest.raises(requests.exceptions.Timeout):
+        http.request_now('refresh', 'GET', URL, deadline=clock.time() - 1)
+    assert adapter.started == []
+    assert http.stats['refresh'].failures == 1
+
+
+def test_max_attempts():
+    policies = {'refresh': RequestPolicy(deadline=100, connect_timeout=1, read_timeout=1, backoff=.01, max_attempts=3)}
+    http, adapter, clock = make_http([500]*10, policies=policies)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        http.request_now('refresh', 'GET', URL)
+    assert len(adapter.started) == 3
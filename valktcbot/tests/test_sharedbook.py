@@ -0,0 +1,98 @@
+"""The shared book between a writer process and readers"""
+from rbxAPI.account import Account
+from rbxAPI.clock import SimClock
+from rbxAPI.sharedbook import SharedBookReader, SharedBookWriter, BOOK_DEPTH, share_book
+from rbxAPI.market import MarketSnapshot
+
+import multiprocessing
+import os
+import time
+
+import pytest
+
+WRITES = 20000
+
+
+def numbered_market(i):
+    """A snapshot whose every field is i, with columns of a length that changes with i, so a snapshot
+       made of parts of two writes cannot pass for one"""
+    column = [(i, i)]*(1 + i % BOOK_DEPTH)
+    return MarketSnapshot(i, i, i, column, column[:-1] or [None], bool(i & 1), i, float(i))
+
+
+def check(snapshot):
+    i = snapshot.seq
+    assert (snapshot.time, snapshot.spread, snapshot.tix_rate, snapshot.robux_rate) == (i, i, i, i)
+    assert snapshot.robux_at_market == bool(i & 1)
+    assert snapshot.tix_column == [(i, i)]*(1 + i % BOOK_DEPTH)
+    assert snapshot.robux_column == ([(i, i)]*(i % BOOK_DEPTH) or [None])
+
+
+def write_numbered(name, ready, done):
+    writer = SharedBookWriter(name)
+    try:
+        for i in range(1, WRITES + 1):
+            writer.write(numbered_market(i))
+            if i == 1:
+                ready.set()
+        done.wait(60) # Keep the segment until the reader is done with it
+    finally:
+        writer.close()
+
+
+def book_name():
+    return 'valktc_test_{}'.format(os.getpid())
+
+
+def test_reader_never_sees_a_torn_snapshot():
+    context = multiprocessing.get_context('spawn')
+    ready, done = context.Event(), context.Event()
+    name = book_name()
+    process = context.Process(target=write_numbered, args=(name, ready, done))
+    process.start()
+    try:
+        assert ready.wait(60)
+        reader = SharedBookReader(name)
+        seen = set()
+        last = 0
+        deadline = time.monotonic() + 30
+        while last < WRITES and time.monotonic() < deadline:
+            snapshot = reader.read()
+            check(snapshot)
+            assert snapshot.seq >= last # Never an older write
+            last = snapshot.seq
+            seen.add(last)
+        reader.close()
+        assert last == WRITES
+        assert len(seen) > 1 # Read while the writer wrote
+    finally:
+        done.set()
+        process.join(60)
+    assert process.exitcode == 0
+
+
+def test_reader_of_a_missing_segment():
+    with pytest.raises(FileNotFoundError):
+        SharedBookReader(book_name() + '_missing')
+    account = Account('reader', clock=SimClock(0))
+    feed = account.feed
+    with pytest.raises(FileNotFoundError):
+        share_book(account, read=book_name() + '_missing')
+    assert account.feed is feed
+
+
+def test_reader_after_close():
+    writer = SharedBookWriter(book_name())
+    try:
+        reader = SharedBookReader(writer.name, SimClock(5))
+        assert reader.read() is None # Nothing written yet
+        writer.write(numbered_market(5))
+        check(reader.latest())
+        reader.close()
+        assert reader.read() is None
+        assert reader.latest() is None
+        assert reader.since(0) is None
+        reader.close() # Closing again does nothing
+        writer.write(numbered_market(6)) # The writer is not affected
+    finally:
+        writer.close()
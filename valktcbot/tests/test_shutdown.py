@@ -0,0 +1,68 @@
+"""Cancelling the bids at shutdown against a SimExchange that loses cancels"""
+from rbxAPI.account import Account
+from rbxAPI.actions import TixTrader, RobuxTrader
+from rbxAPI.backtest import SimExchange
+from rbxAPI.clock import SimClock
+from rbxAPI.shutdown import shutdown
+from rbxAPI.trade_log import TradeLog
+
+from tests.fakes import make_market
+
+BALANCES = {'Tickets': 10000, 'Robux': 1000}
+
+
+class LosingExchange(SimExchange):
+
+    """A SimExchange on which the first lost cancels never reach the page"""
+
+    def __init__(self, history, clock, balances, lost=0):
+        super().__init__(history, clock, balances)
+        self.lost = lost
+        self.cancels_sent = 0
+
+    def cancel_bid(self, panel, currency, index):
+        self.cancels_sent += 1
+        if self.lost:
+            self.lost -= 1
+            return
+        super().cancel_bid(panel, currency, index)
+
+
+def make_bidding(lost):
+    """Traders of an account with two open tix bids and one robux bid"""
+    clock = SimClock(1000)
+    market = make_market()
+    market.time = clock.time()
+    exchange = LosingExchange([market], clock, BALANCES, lost)
+    account = Account('test', clock=clock, exchange=exchange)
+    trade_log = TradeLog(clock)
+    traders = [TixTrader(trade_log, account), RobuxTrader(trade_log, account)]
+    exchange._place('Tickets', 500, 47, True)
+    exchange._place('Tickets', 300, 28, True)
+    exchange._place('Robux', 40, 420, True)
+    return traders, exchange, clock
+
+
+def test_bids_that_survive_the_first_cancel_are_cancelled_again():
+    traders, exchange, clock = make_bidding(lost=2)
+    report = shutdown(traders, deadline=8)
+    assert report.ok, str(report)
+    assert sorted(report.cancelled['Tickets']) == [300, 500]
+    assert report.cancelled['Robux'] == [40]
+    assert exchange.cancels_sent == 5 # 3, then the 2 that were lost again
+    assert exchange.balances == BALANCES
+    assert report.seconds < 8
+
+
+def test_report_at_the_deadline():
+    traders, exchange, clock = make_bidding(lost=1000)
+    start = clock.time()
+    report = shutdown(traders, deadline=3)
+    assert not report.ok
+    assert sorted(report.unconfirmed['Tickets']) == [300, 500]
+    assert report.unconfirmed['Robux'] == [40]
+    assert sorted(report.cancelled['Tickets']) == [300, 500]
+    assert exchange.cancels_sent > 3 # Tried again before the deadline
+    assert 3 <= report.seconds <= 3 + exchange.round_trip
+    assert clock.time() - start == report.seconds
+    assert "Could not confirm that these Tickets bids were cancelled" in str(report)
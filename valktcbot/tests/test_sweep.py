@@ -0,0 +1,29 @@
+"""Parsing the --param values of a sweep"""
+from rbxAPI.sweep import parse_param, random_search
+from rbxAPI.units import to_units
+
+import pytest
+
+
+def test_values_are_floats_unless_counts():
+    assert parse_param('reset_time=0.5,1.5') == ('reset_time', [.5, 1.5])
+    assert parse_param('trade_lag_time=1:3') == ('trade_lag_time', (1.0, 3.0))
+    name, values = parse_param('num_trades=3,5')
+    assert values == [3, 5] and all(type(value) is int for value in values)
+    assert parse_param('rgap=.003,.005') == ('rgap', [to_units(.003), to_units(.005)])
+
+
+def test_bad_params_are_rejected():
+    with pytest.raises(ValueError):
+        parse_param('num_trades=2.5')
+    with pytest.raises(ValueError, match='num_trades must be between'):
+        parse_param('num_trades=1:100')
+    with pytest.raises(ValueError, match='Unknown parameter'):
+        parse_param('speed=1')
+
+
+def test_random_search_keeps_the_types():
+    params = dict([parse_param('num_trades=2:9'), parse_param('reset_time=60:600')])
+    for changes in random_search(params, 50, seed=1):
+        assert type(changes['num_trades']) is int and 2 <= changes['num_trades'] <= 9
+        assert type(changes['reset_time']) is float and 60 <= changes['reset_time'] <= 600